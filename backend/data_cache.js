@@ -0,0 +1,87 @@
+const fs = require("fs");
+const path = require("path");
+
+// Editors and the Python tools (write to .tmp, then rename) fire several events per save.
+const RELOAD_DEBOUNCE_MS = 100;
+
+/**
+ * A JSON data file held in memory as `build(parsed)`, e.g. the list plus its indexes.
+ * Reads on the request path are just `.value`. The file's directory is watched (a
+ * rename over the file replaces its inode, which a watch on the file itself would
+ * miss) and the file is re-read off the request path when it changes; the new value
+ * is swapped in whole, so a request sees either the old snapshot or the new one.
+ * A file that fails to parse (half-written by a tool that does not rename) keeps the
+ * previous snapshot; a missing file gives `build(fallback)`.
+ */
+class WatchedJson {
+    constructor(file, build, fallback = null) {
+        this.file = file;
+        this.build = build;
+        this.fallback = fallback;
+        this.timer = null;
+        this.value = this.loadSync();
+        this.watch();
+    }
+
+    loadSync() {
+        try {
+            return this.build(JSON.parse(fs.readFileSync(this.file)));
+        } catch (e) {
+            if (e.code !== "ENOENT") console.error(`${this.file} not loaded:`, e.message);
+            return this.build(this.fallback);
+        }
+    }
+
+    async reload() {
+        let text;
+        try {
+            text = await fs.promises.readFile(this.file);
+        } catch (e) {
+            if (e.code === "ENOENT") this.value = this.build(this.fallback);
+            else console.error(`${this.file} not reloaded:`, e.message);
+            return;
+        }
+        try {
+            this.value = this.build(JSON.parse(text));
+        } catch (e) {
+            console.error(`${this.file} not reloaded, keeping the previous version:`, e.message);
+        }
+    }
+
+    watch() {
+        const base = path.basename(this.file);
+        try {
+            const watcher = fs.watch(path.dirname(this.file), (event, name) => {
+                if (name && name !== base) return;
+                clearTimeout(this.timer);
+                this.timer = setTimeout(() => this.reload(), RELOAD_DEBOUNCE_MS);
+            });
+            watcher.on("error", (e) => console.error(`watching ${this.file} stopped:`, e.message));
+            watcher.unref();
+        } catch (e) {
+            console.error(`${this.file} will not reload on change:`, e.message);
+        }
+    }
+
+    // Write the file (temp file + rename) and use the new contents right away.
+    save(data, indent = 2) {
+        const tmp = this.file + ".tmp";
+        fs.writeFileSync(tmp, JSON.stringify(data, null, indent));
+        fs.renameSync(tmp, this.file);
+        this.value = this.build(data);
+    }
+}
+
+// tokens.json: [{ annotatorId, token }]
+function tokenIndex(list) {
+    list = Array.isArray(list) ? list : [];
+    return { list, annotatorByToken: new Map(list.map((t) => [t.token, t.annotatorId])) };
+}
+
+// clip_pairs.json / gold_pairs.json: [{ pair_id, left_clip, right_clip, ... }]
+function pairIndex(list) {
+    list = Array.isArray(list) ? list : [];
+    return { list, byId: new Map(list.map((p) => [p.pair_id, p])) };
+}
+
+module.exports = { RELOAD_DEBOUNCE_MS, WatchedJson, tokenIndex, pairIndex };
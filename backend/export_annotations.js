@@ -4,6 +4,28 @@ const dotenv = require('dotenv');
 dotenv.config({ path: __dirname + '/.env' });
 
 const Annotation = require('./models/Annotation');
+const { streamDocs } = require('./export_stream');
+
+// node export_annotations.js [--ndjson]
+//   default:  annotations_export.json, one indented JSON array
+//   --ndjson: annotations_export.ndjson, one annotation per line
+// Annotations are streamed from a cursor to the file, never all held in memory.
+const ndjson = process.argv.includes('--ndjson');
+const outPath = ndjson ? 'annotations_export.ndjson' : 'annotations_export.json';
+
+function toRecord(entry) {
+  return {
+    annotator_id: entry.annotatorId,
+    pair_id: entry.pairId,
+    response: entry.response,
+    is_gold: entry.isGold || false,
+    is_repeat: entry.isRepeat || false,
+    timestamp: entry.timestamp,
+    left_url: entry.left?.url,
+    right_url: entry.right?.url,
+    attention: entry.attention // pause-sampling points: scripts/attention_frames.py
+  };
+}
 
 async function exportData() {
   await mongoose.connect(process.env.MONGO_URI, {
@@ -11,16 +33,13 @@ async function exportData() {
     useUnifiedTopology: true
   });
 
-  const annotations = await Annotation.find({});
-  const output = annotations.map(entry => ({
-    annotator_id: entry.annotatorId,
-    pair_id: entry.pairId,
-    response: entry.response,
-    timestamp: entry.timestamp
-  }));
-
-  fs.writeFileSync('annotations_export.json', JSON.stringify(output, null, 2));
-  console.log(`Exported ${output.length} annotations to annotations_export.json`);
+  const tmpPath = outPath + '.tmp';
+  const out = fs.createWriteStream(tmpPath);
+  const cursor = Annotation.find({}).sort({ _id: 1 }).lean().cursor();
+  const n = await streamDocs(cursor, out, { format: ndjson ? 'ndjson' : 'json', map: toRecord, indent: 2 });
+  await new Promise((resolve, reject) => out.end(resolve).on('error', reject));
+  fs.renameSync(tmpPath, outPath);
+  console.log(`Exported ${n} annotations to ${outPath}`);
 
   mongoose.disconnect();
 }
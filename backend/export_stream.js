@@ -0,0 +1,60 @@
+const { once } = require("events");
+const mongoose = require("mongoose");
+
+// Documents whose _id is younger than this are left for the next incremental page, so a
+// page never advances the watermark past an insert that is still in flight.
+const SETTLE_MS = 5000;
+
+// _id filter for an incremental page: after a given _id (hex), or from an ISO time.
+function exportFilter({ after, since } = {}, now = Date.now()) {
+    const { ObjectId } = mongoose.Types;
+    const bound = { $lt: ObjectId.createFromTime(Math.floor((now - SETTLE_MS) / 1000)) };
+    if (after) {
+        bound.$gt = new ObjectId(String(after));
+    } else if (since) {
+        const t = new Date(String(since)).getTime();
+        if (!Number.isFinite(t)) throw new Error(`invalid since: ${since}`);
+        bound.$gte = ObjectId.createFromTime(Math.floor(t / 1000));
+    }
+    return { _id: bound };
+}
+
+// Wait until `out` can take more data; false if it was closed (client went away).
+async function drained(out) {
+    if (out.destroyed) return false;
+    await Promise.race([once(out, "drain"), once(out, "close")]);
+    return !out.destroyed;
+}
+
+/**
+ * Write the documents of a query cursor to a writable stream (HTTP response or file)
+ * without holding them in memory, honouring backpressure.
+ *   format "ndjson": one JSON document per line
+ *   format "json":   one JSON array (indent > 0 lays it out like JSON.stringify(array, null, indent))
+ * `map` transforms each document first. Returns the number of documents written.
+ */
+async function streamDocs(cursor, out, { format = "ndjson", map = (d) => d, indent = 0 } = {}) {
+    const pad = " ".repeat(indent);
+    let n = 0;
+    try {
+        for await (const doc of cursor) {
+            let chunk;
+            if (format === "ndjson") {
+                chunk = JSON.stringify(map(doc)) + "\n";
+            } else if (indent) {
+                const item = JSON.stringify(map(doc), null, indent).replace(/^/gm, pad);
+                chunk = (n === 0 ? "[\n" : ",\n") + item;
+            } else {
+                chunk = (n === 0 ? "[" : ",") + JSON.stringify(map(doc));
+            }
+            n += 1;
+            if (!out.write(chunk) && !(await drained(out))) return n;
+        }
+        if (format === "json") out.write(n === 0 ? "[]" : indent ? "\n]" : "]");
+    } finally {
+        await cursor.close();
+    }
+    return n;
+}
+
+module.exports = { SETTLE_MS, exportFilter, streamDocs };
@@ -0,0 +1,32 @@
+// The API with in-memory models instead of MongoDB, for scripts/load_test.py.
+//   DATA_DIR=/tmp/scratch PORT=3100 node loadtest_server.js
+// Serves /api and /healthz like server.js, from DATA_DIR (default: data/, which
+// /admin/add-annotator writes to, so point it at a copy). Annotations live in memory only.
+const Module = require("module");
+const path = require("path");
+const express = require("express");
+const { models } = require("./memory_db");
+
+process.env.ADMIN_PASSWORD = process.env.ADMIN_PASSWORD || "loadtest";
+process.env.ADMIN_TOKEN = process.env.ADMIN_TOKEN || "loadtest";
+
+// routes/api.js requires ../models/<Name>; hand it the in-memory models instead
+for (const [name, exported] of Object.entries(models)) {
+    const file = require.resolve(path.join(__dirname, "models", name));
+    const mod = new Module(file, module);
+    mod.filename = file;
+    mod.loaded = true;
+    mod.exports = exported;
+    require.cache[file] = mod;
+}
+
+const apiRoutes = require("./routes/api");
+const app = express();
+app.use(express.json());
+app.use("/api", apiRoutes);
+app.get("/healthz", (req, res) => res.send("ok"));
+
+const PORT = process.env.PORT || 3100;
+app.listen(PORT, "127.0.0.1", () =>
+    console.log(`Load-test server (in-memory db) on http://127.0.0.1:${PORT}, data ${process.env.DATA_DIR || "data/"}`)
+);
@@ -0,0 +1,118 @@
+// In-memory stand-ins for the Annotator and Annotation models, covering the calls the API
+// makes (findOne/find/create/deleteMany, doc.save, and find().sort().limit().lean().cursor()
+// for the exports). Used by loadtest_server.js to run the API with no MongoDB; nothing is
+// persisted.
+
+let seq = 0;
+
+// 24-hex ids that sort like ObjectIds: seconds since the epoch, then a counter.
+function newId() {
+    seq += 1;
+    const secs = Math.floor(Date.now() / 1000).toString(16).padStart(8, "0");
+    return secs + seq.toString(16).padStart(16, "0");
+}
+
+function matches(doc, filter) {
+    for (const [key, cond] of Object.entries(filter || {})) {
+        const v = doc[key];
+        if (cond && typeof cond === "object" && !Array.isArray(cond) && !(cond instanceof Date)) {
+            const s = String(v);
+            if ("$gt" in cond && !(s > String(cond.$gt))) return false;
+            if ("$gte" in cond && !(s >= String(cond.$gte))) return false;
+            if ("$lt" in cond && !(s < String(cond.$lt))) return false;
+            if ("$ne" in cond && v === cond.$ne) return false;
+        } else if (v !== cond) {
+            return false;
+        }
+    }
+    return true;
+}
+
+class Query {
+    constructor(docs) {
+        this.docs = docs;
+    }
+
+    sort(spec) {
+        const [[key, dir]] = Object.entries(spec);
+        this.docs = [...this.docs].sort((a, b) => (a[key] < b[key] ? -dir : a[key] > b[key] ? dir : 0));
+        return this;
+    }
+
+    limit(n) {
+        this.docs = this.docs.slice(0, n);
+        return this;
+    }
+
+    lean() {
+        this.docs = this.docs.map((d) => ({ ...d }));
+        return this;
+    }
+
+    cursor() {
+        const docs = this.docs;
+        return {
+            async *[Symbol.asyncIterator]() {
+                yield* docs;
+            },
+            async close() {},
+        };
+    }
+
+    then(resolve, reject) {
+        return Promise.resolve(this.docs).then(resolve, reject);
+    }
+}
+
+function model(defaults, { unique } = {}) {
+    const docs = [];
+    const keys = new Set(); // unique index keys, like AnnotationSchema's partial index
+    const save = async function () {
+        return this;
+    };
+    return {
+        docs,
+        async findOne(filter) {
+            return docs.find((d) => matches(d, filter)) || null;
+        },
+        find(filter) {
+            return new Query(docs.filter((d) => matches(d, filter)));
+        },
+        async create(fields) {
+            const doc = { _id: newId(), ...defaults(), ...fields };
+            const key = unique && unique(doc);
+            if (key !== undefined && key !== null) {
+                if (keys.has(key)) {
+                    const err = new Error("E11000 duplicate key error");
+                    err.code = 11000;
+                    throw err;
+                }
+                keys.add(key);
+            }
+            Object.defineProperty(doc, "save", { value: save });
+            docs.push(doc);
+            return doc;
+        },
+        async deleteMany() {
+            const deletedCount = docs.length;
+            docs.length = 0;
+            keys.clear();
+            return { deletedCount };
+        },
+    };
+}
+
+const Annotator = model(() => ({
+    completedPairs: [],
+    completedCount: 0,
+    seenGold: [],
+    repeatQueue: [],
+    planId: null,
+    planCursor: 0,
+}));
+
+const Annotation = model(() => ({ isGold: false, isRepeat: false, timestamp: new Date() }), {
+    unique: (d) => (d.isGold || d.isRepeat ? null : `${d.annotatorId}\n${d.pairId}`),
+});
+
+module.exports = { models: { Annotator, Annotation } };
@@ -10,7 +10,9 @@ const AnnotatorSchema = new mongoose.Schema({
   completedPairs: [String],
   completedCount: { type: Number, default: 0 },
   seenGold: [String],
-  repeatQueue: [RepeatItem]
+  repeatQueue: [RepeatItem],
+  planId: String, // plan_id of the plan.json planCursor points into
+  planCursor: { type: Number, default: 0 } // next slot of this annotator's plan (backend/plan.js)
 });
 
 module.exports = mongoose.model('Annotator', AnnotatorSchema);
\ No newline at end of file
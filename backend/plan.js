@@ -0,0 +1,78 @@
+const crypto = require("crypto");
+
+// Slot kinds of a plan written by scripts/plan_assignments.py:
+//   slot = index << 3 | kind << 1 | swapped
+const NEW = 0;
+const REPEAT = 1;
+const GOLD = 2;
+
+/**
+ * A parsed plan file as served from memory, or null for no plan. Each annotator's slots
+ * become an Int32Array, so serving is a cursor lookup. `total` counts the new-pair slots
+ * (the progress total shown to that annotator). `id` is the file's plan_id (a content hash
+ * for files written without one); cursors are stored with it.
+ */
+function buildPlan(doc) {
+    if (!doc) return null;
+    const slots = new Map();
+    const total = new Map();
+    for (const [annotatorId, list] of Object.entries(doc.annotators || {})) {
+        const arr = Int32Array.from(list);
+        slots.set(annotatorId, arr);
+        total.set(annotatorId, arr.reduce((n, s) => n + (((s >> 1) & 3) === NEW ? 1 : 0), 0));
+    }
+    const id = doc.plan_id || crypto.createHash("sha256").update(JSON.stringify(doc)).digest("hex").slice(0, 16);
+    return { id, pairs: doc.pairs || [], gold: doc.gold || [], slots, total };
+}
+
+// The pair at an annotator's cursor: { pair, kind, swapped }, or null when the plan is done.
+function slotAt(plan, annotatorId, cursor) {
+    const slots = plan.slots.get(annotatorId);
+    if (!slots || cursor >= slots.length) return null;
+    const s = slots[cursor];
+    const kind = (s >> 1) & 3;
+    const pair = kind === GOLD ? plan.gold[s >> 3] : plan.pairs[s >> 3];
+    return pair ? { pair, kind, swapped: (s & 1) === 1 } : null;
+}
+
+// Bring an annotator's cursor in line with the current plan. A cursor kept for another
+// plan (plan.json was regenerated) means nothing in this one: the annotator starts over at
+// the first new-pair slot they have not answered, passing the golds and repeats before it.
+// New-pair slots whose pair is already in completedPairs are always passed over, so pairs
+// answered before the plan (or under an older one) are not served again as new.
+// With a current cursor only the slot(s) at the cursor are checked, one id lookup each (in
+// practice one per request); the completedPairs set is built only for a stale-plan rescan.
+// Returns true if planId/planCursor changed and the annotator needs saving.
+function syncCursor(plan, annotator) {
+    const { annotatorId } = annotator;
+    const stale = annotator.planId !== plan.id;
+    let cursor = stale ? 0 : annotator.planCursor || 0;
+    let answered;
+    if (stale) {
+        const done = new Set(annotator.completedPairs);
+        answered = (pairId) => done.has(pairId);
+    } else {
+        answered = (pairId) => annotator.completedPairs.includes(pairId);
+    }
+    for (let slot = slotAt(plan, annotatorId, cursor); slot; slot = slotAt(plan, annotatorId, ++cursor)) {
+        if (slot.kind === NEW ? !answered(slot.pair.pair_id) : !stale) break;
+    }
+    if (!stale && cursor === annotator.planCursor) return false;
+    annotator.planId = plan.id;
+    annotator.planCursor = cursor;
+    return true;
+}
+
+// A pair record as shown: with left and right exchanged (clips and left_/right_ media) when swapped.
+function presentPair(pair, swapped) {
+    if (!swapped) return pair;
+    const out = {};
+    for (const [k, v] of Object.entries(pair)) {
+        if (k.startsWith("left_")) out["right_" + k.slice(5)] = v;
+        else if (k.startsWith("right_")) out["left_" + k.slice(6)] = v;
+        else out[k] = v;
+    }
+    return out;
+}
+
+module.exports = { NEW, REPEAT, GOLD, buildPlan, slotAt, syncCursor, presentPair };
@@ -1,19 +1,37 @@
 const express = require("express");
 const router = express.Router();
-const fs = require("fs");
 const path = require("path");
 const Annotator = require("../models/Annotator");
 const Annotation = require("../models/Annotation");
-
-const clipPairsPath = path.join(__dirname, "../data/clip_pairs.json");
-const tokenPath = path.join(__dirname, "../data/tokens.json");
-const goldPairsPath = path.join(__dirname, "../data/gold_pairs.json");
+const { exportFilter, streamDocs } = require("../export_stream");
+const { REPEAT, GOLD, buildPlan, slotAt, syncCursor, presentPair } = require("../plan");
+const { WatchedJson, tokenIndex, pairIndex } = require("../data_cache");
+
+// DATA_DIR points the API at another data directory (loadtest_server.js runs on a scratch copy)
+const dataDir = process.env.DATA_DIR || path.join(__dirname, "../data");
+const clipPairsPath = path.join(dataDir, "clip_pairs.json");
+const tokenPath = path.join(dataDir, "tokens.json");
+const goldPairsPath = path.join(dataDir, "gold_pairs.json");
+const servingOrderPath = path.join(dataDir, "serving_order.json");
+const planPath = path.join(dataDir, "plan.json");
 
 const GOLD_RATE = 0.07; // 7% of trials are gold
 const REPEAT_GAP = 10; // schedule a repeat 10 trials after first seen
 const REPEAT_RATE = 0.05; // enqueue repeats for 5% of seen items
 const MAX_REPEAT_QUEUE = 5; // cap queue size
 const ATTENTION_RATE = 1.0;
+const EXPORT_MAX_LIMIT = 100000; // largest export.ndjson page (scripts/sync_annotations.py MAX_PAGE_SIZE)
+
+// Data files, parsed and indexed once and reloaded when they change on disk (data_cache.js)
+const tokensFile = new WatchedJson(tokenPath, tokenIndex, []);
+const clipPairsFile = new WatchedJson(clipPairsPath, pairIndex, []);
+const goldPairsFile = new WatchedJson(goldPairsPath, pairIndex, []);
+// serving_order.json from scripts/schedule_pairs.py (null: clip_pairs.json order)
+const servingOrderFile = new WatchedJson(servingOrderPath, (doc) =>
+    doc && Array.isArray(doc.order) ? doc.order : null
+);
+// assignment plan from scripts/plan_assignments.py (null: no plan)
+const planFile = new WatchedJson(planPath, buildPlan);
 
 function coerceSurprise(val) {
     const n = Number(val);
@@ -35,21 +53,44 @@ function coerceStageDurations(obj) {
 }
 
 function getAnnotatorIdFromToken(token) {
-    const tokens = loadTokens();
-    const found = tokens.find((t) => t.token === token);
-    return found ? found.annotatorId : null;
+    return tokensFile.value.annotatorByToken.get(token) ?? null;
 }
 
 function loadTokens() {
-    try {
-        return JSON.parse(fs.readFileSync(tokenPath));
-    } catch (e) {
-        return [];
-    }
+    return [...tokensFile.value.list];
 }
 
 function saveTokens(tokens) {
-    fs.writeFileSync(tokenPath, JSON.stringify(tokens, null, 2));
+    tokensFile.save(tokens);
+}
+
+function getPlan() {
+    return planFile.value;
+}
+
+// New pairs in serving order: serving_order.json lists pair_ids most informative first;
+// pairs it does not list follow in clip_pairs.json order. Rebuilt only after either file
+// has been reloaded.
+let servingQueue = { pairs: null, order: null, queue: [] };
+function servingOrder() {
+    const pairs = clipPairsFile.value;
+    const order = servingOrderFile.value;
+    if (servingQueue.pairs === pairs && servingQueue.order === order) return servingQueue.queue;
+    let queue = pairs.list;
+    if (order) {
+        const listed = new Set();
+        queue = [];
+        for (const id of order) {
+            const p = pairs.byId.get(id);
+            if (p && !listed.has(id)) {
+                listed.add(id);
+                queue.push(p);
+            }
+        }
+        for (const p of pairs.list) if (!listed.has(p.pair_id)) queue.push(p);
+    }
+    servingQueue = { pairs, order, queue };
+    return queue;
 }
 
 const ADMIN_PASSWORD = process.env.ADMIN_PASSWORD;
@@ -74,7 +115,7 @@ router.post("/admin/login", (req, res) => {
 });
 
 router.get("/admin/progress", requireAdmin, async (req, res) => {
-    const clipPairs = JSON.parse(fs.readFileSync(clipPairsPath));
+    const clipPairs = clipPairsFile.value.list;
     const annotators = await Annotator.find({});
     const result = annotators.map((a) => ({
         annotatorId: a.annotatorId,
@@ -88,10 +129,21 @@ router.get("/admin/tokens", requireAdmin, (req, res) => {
     res.json(loadTokens());
 });
 
+// Send a query's lean docs straight from a cursor; headers go out before the first document.
+async function sendStream(res, query, format) {
+    res.type(format === "ndjson" ? "application/x-ndjson" : "application/json");
+    try {
+        await streamDocs(query.lean().cursor(), res, { format });
+        res.end();
+    } catch (e) {
+        console.error("export failed:", e);
+        res.destroy(e); // mid-stream: the client sees a truncated body, not a valid document
+    }
+}
+
 router.get("/admin/export", requireAdmin, async (req, res) => {
-    // Always use lean docs for predictable JSON
-    const docs = await Annotation.find({}).lean();
-    return res.json(docs);
+    // Always use lean docs for predictable JSON; the array is streamed, never built in memory
+    return sendStream(res, Annotation.find({}).sort({ _id: 1 }), "json");
     // const annotations = await Annotation.find({});
     // const output = annotations.map((a) => {
     //     const att = a.attention || {};
@@ -134,6 +186,21 @@ router.get("/admin/export", requireAdmin, async (req, res) => {
     // res.json(output);
 });
 
+// Incremental export for scripts/sync_annotations.py: NDJSON, in _id order, one page per request.
+//   ?after=<_id of the last record held> (or ?since=<ISO time> for a first sync), &limit=<page size>
+// Records from the last few seconds are held back (export_stream.SETTLE_MS) so that the
+// client's watermark never skips an insert that had not committed yet.
+router.get("/admin/export.ndjson", requireAdmin, async (req, res) => {
+    const limit = Math.min(Math.max(parseInt(req.query.limit, 10) || 10000, 1), EXPORT_MAX_LIMIT);
+    let filter;
+    try {
+        filter = exportFilter(req.query);
+    } catch (e) {
+        return res.status(400).json({ error: "Invalid after/since" });
+    }
+    return sendStream(res, Annotation.find(filter).sort({ _id: 1 }).limit(limit), "ndjson");
+});
+
 router.post("/admin/flush", requireAdmin, async (req, res) => {
     await Annotation.deleteMany({});
     await Annotator.deleteMany({});
@@ -178,8 +245,6 @@ router.get("/clip-pairs", async (req, res) => {
     const annotatorId = getAnnotatorIdFromToken(token);
     if (!annotatorId) return res.status(403).json({ error: "Invalid token" });
 
-    const clipPairs = JSON.parse(fs.readFileSync(clipPairsPath));
-    const goldPairs = JSON.parse(fs.readFileSync(goldPairsPath));
     let annotator = await Annotator.findOne({ annotatorId });
     if (!annotator)
         annotator = await Annotator.create({
@@ -190,6 +255,17 @@ router.get("/clip-pairs", async (req, res) => {
             repeatQueue: [],
         });
 
+    // Planned annotators: the slot at their cursor, golds and repeats included
+    const plan = getPlan();
+    if (plan && plan.slots.has(annotatorId)) {
+        if (syncCursor(plan, annotator)) await annotator.save();
+        return servePlanned(res, plan, annotator);
+    }
+
+    const clipPairs = clipPairsFile.value.list;
+    const goldPairs = goldPairsFile.value.list;
+    const done = new Set(annotator.completedPairs);
+
     // 1) Serve due repeat if any
     const dueIdx = annotator.repeatQueue.findIndex(
         (item) => annotator.completedCount >= item.targetAtCount
@@ -197,7 +273,7 @@ router.get("/clip-pairs", async (req, res) => {
     if (dueIdx >= 0) {
         const { pairId } = annotator.repeatQueue.splice(dueIdx, 1)[0];
         await annotator.save();
-        const base = clipPairs.find((p) => p.pair_id === pairId);
+        const base = clipPairsFile.value.byId.get(pairId);
         if (base) {
             const progress = {
                 annotatorId: annotator.annotatorId,
@@ -224,7 +300,9 @@ router.get("/clip-pairs", async (req, res) => {
     }
 
     // 3) Serve next new pair
-    const nextPair = clipPairs.find((p) => !annotator.completedPairs.includes(p.pair_id));
+    const queue = servingOrder();
+    const nextIdx = queue.findIndex((p) => !done.has(p.pair_id));
+    const nextPair = nextIdx >= 0 ? queue[nextIdx] : null;
     const progress = {
         annotatorId: annotator.annotatorId,
         completed: annotator.completedCount,
@@ -233,9 +311,60 @@ router.get("/clip-pairs", async (req, res) => {
     // res.json(nextPair ? { ...nextPair, progress } : null);
     if (!nextPair) return res.json(null);
     const requireRegion = Math.random() < ATTENTION_RATE;
-    res.json({ ...nextPair, progress, _meta: { requireRegion } });
+    // the pair likely to follow, so the player can prefetch its clips while this one is judged
+    let following = null;
+    for (let i = nextIdx + 1; i < queue.length; i++) {
+        if (!done.has(queue[i].pair_id)) {
+            following = queue[i];
+            break;
+        }
+    }
+    const _next = following
+        ? {
+              pair_id: following.pair_id,
+              left_clip: following.left_clip,
+              right_clip: following.right_clip,
+              left_renditions: following.left_renditions,
+              right_renditions: following.right_renditions,
+              left_poster: following.left_poster,
+              right_poster: following.right_poster,
+          }
+        : null;
+    res.json({ ...nextPair, progress, _meta: { requireRegion }, _next });
 });
 
+// Serve the slot at the annotator's plan cursor (synced by the caller); /annotate moves the cursor on.
+function servePlanned(res, plan, annotator) {
+    const { annotatorId } = annotator;
+    const progress = {
+        annotatorId,
+        completed: annotator.completedCount,
+        total: plan.total.get(annotatorId),
+    };
+    const slot = slotAt(plan, annotatorId, annotator.planCursor);
+    if (!slot) return res.json(null);
+    const { pair, kind, swapped } = slot;
+    let _meta;
+    if (kind === GOLD) _meta = { isGold: true, expected: pair.expected };
+    else if (kind === REPEAT) _meta = { isRepeat: true, repeatOf: pair.pair_id };
+    else _meta = { requireRegion: Math.random() < ATTENTION_RATE };
+    const following = slotAt(plan, annotatorId, annotator.planCursor + 1);
+    let _next = null;
+    if (following) {
+        const f = presentPair(following.pair, following.swapped);
+        _next = {
+            pair_id: f.pair_id,
+            left_clip: f.left_clip,
+            right_clip: f.right_clip,
+            left_renditions: f.left_renditions,
+            right_renditions: f.right_renditions,
+            left_poster: f.left_poster,
+            right_poster: f.right_poster,
+        };
+    }
+    res.json({ ...presentPair(pair, swapped), progress, _meta, _next });
+}
+
 router.post("/annotate", async (req, res) => {
     const token = req.body.token;
     const annotatorId = getAnnotatorIdFromToken(token);
@@ -308,13 +437,22 @@ router.post("/annotate", async (req, res) => {
         // cant_tell: missing surprises/attention is allowed.
     }
 
-    const goldPairs = JSON.parse(fs.readFileSync(goldPairsPath));
-    const isGold = !!goldPairs.find((g) => g.pair_id === pairId);
+    const gold = goldPairsFile.value.byId.get(pairId);
+    const isGold = !!gold;
 
     const annotator = await Annotator.findOne({ annotatorId });
     const isRepeat = !isGold && annotator.completedPairs.includes(pairId);
     const repeatOf = isRepeat ? pairId : undefined;
 
+    // Answering the slot at the plan cursor moves the cursor on (even if the answer is a duplicate)
+    const plan = getPlan();
+    const planned = !!(plan && plan.slots.has(annotatorId));
+    const synced = planned && syncCursor(plan, annotator);
+    const slot = planned ? slotAt(plan, annotatorId, annotator.planCursor) : null;
+    const advanced = !!slot && slot.pair.pair_id === pairId;
+    if (advanced) annotator.planCursor += 1;
+    const cursorMoved = synced || advanced;
+
     let computedRt;
     if (presentedTime) {
         const p = new Date(presentedTime).getTime();
@@ -324,8 +462,7 @@ router.post("/annotate", async (req, res) => {
     // For golds, compute correctness
     let goldExpected, goldCorrect;
     if (isGold) {
-        const g = goldPairs.find((g) => g.pair_id === pairId);
-        goldExpected = g?.expected;
+        goldExpected = gold.expected;
         goldCorrect = response === goldExpected;
     }
     try {
@@ -349,6 +486,7 @@ router.post("/annotate", async (req, res) => {
         });
     } catch (err) {
         if (err && err.code === 11000) {
+            if (cursorMoved) await annotator.save();
             return res.status(409).json({ error: "Already annotated this original pair" });
         }
         throw err;
@@ -359,7 +497,8 @@ router.post("/annotate", async (req, res) => {
         if (!annotator.completedPairs.includes(pairId)) {
             annotator.completedPairs.push(pairId);
             annotator.completedCount += 1;
-            if (Math.random() < REPEAT_RATE && annotator.repeatQueue.length < MAX_REPEAT_QUEUE) {
+            // planned annotators have their repeats in the plan
+            if (!planned && Math.random() < REPEAT_RATE && annotator.repeatQueue.length < MAX_REPEAT_QUEUE) {
                 annotator.repeatQueue.push({
                     pairId,
                     targetAtCount: annotator.completedCount + REPEAT_GAP,
@@ -367,6 +506,8 @@ router.post("/annotate", async (req, res) => {
             }
         }
         await annotator.save();
+    } else if (cursorMoved) {
+        await annotator.save();
     }
     res.sendStatus(200);
 });
@@ -10,6 +10,8 @@ localStorage.setItem("token", token);
 const ATTN_TIMEOUT = 10000; // 10s
 // Pause-sampling config: default 1000 ms; override via ?ps=NNN
 const PAUSE_SAMPLE_MS = Math.max(200, Number(urlParams.get("ps") || 1000)); // clamp min 200ms
+// Rendition override: ?q=480p (or ?q=source) forces one rendition label when a pair has it
+const QUALITY = urlParams.get("q");
 
 function logout() {
     localStorage.removeItem("token");
@@ -373,6 +375,100 @@ function showStartOverlay(onStart) {
     window.addEventListener("keydown", onKey, { once: true });
 }
 
+// Bandwidth estimate (kbps) for choosing renditions: starts from the browser's hint and is
+// refined by an EWMA of measured prefetch throughput.
+let bandwidthKbps = (navigator.connection?.downlink || 0) * 1000 || null;
+const prefetched = new Set();
+
+function pickRendition(pair, side) {
+    const fallback = pair[`${side}_clip`];
+    const options = (pair[`${side}_renditions`] || []).filter((r) => r.path);
+    if (!options.length) return fallback;
+    if (QUALITY) {
+        const forced = options.find((r) => r.label === QUALITY);
+        if (forced) return forced.path;
+    }
+    if (!bandwidthKbps) return fallback;
+    // both clips play at once; keep each under 40% of the link
+    const budget = (bandwidthKbps * 0.8) / 2;
+    const fitting = options
+        .filter((r) => r.bitrate_kbps && r.bitrate_kbps <= budget)
+        .sort((a, b) => b.bitrate_kbps - a.bitrate_kbps);
+    if (fitting.length) return fitting[0].path;
+    const lowest = options
+        .filter((r) => r.bitrate_kbps)
+        .sort((a, b) => a.bitrate_kbps - b.bitrate_kbps)[0];
+    return lowest ? lowest.path : fallback;
+}
+
+async function prefetchClip(url) {
+    if (!url || prefetched.has(url)) return;
+    prefetched.add(url);
+    try {
+        const t0 = performance.now();
+        const res = await fetch(url, { priority: "low" });
+        const bytes = (await res.arrayBuffer()).byteLength;
+        const ms = performance.now() - t0;
+        if (res.ok && bytes > 64 * 1024 && ms > 0) {
+            const kbps = (bytes * 8) / ms; // bits per ms == kbit/s
+            bandwidthKbps = bandwidthKbps ? 0.7 * bandwidthKbps + 0.3 * kbps : kbps;
+        }
+    } catch (_) {
+        prefetched.delete(url);
+    }
+}
+
+function prefetchNext(next) {
+    if (!next) return;
+    for (const poster of [next.left_poster, next.right_poster]) if (poster) new Image().src = poster;
+    // pick with the current estimate so the prefetched files are the ones renderPair will request
+    prefetchClip(pickRendition(next, "left")).then(() => prefetchClip(pickRendition(next, "right")));
+}
+
+function setPoster(video, url) {
+    if (url) video.poster = url;
+    else video.removeAttribute("poster");
+}
+
+// Scrub preview from the pair's sprite sheet (thumbnails.py): hovering the bottom strip of a
+// video (its progress bar) shows the thumbnail for that point in the clip.
+function attachSpritePreview(video, sprite) {
+    const container = video.parentElement;
+    container.querySelector(".sprite-preview")?.remove();
+    container.onmousemove = null;
+    container.onmouseleave = null;
+    if (!sprite?.path) return;
+
+    const preview = document.createElement("div");
+    preview.className = "sprite-preview";
+    container.appendChild(preview);
+    const sheet = new Image();
+    sheet.src = sprite.path;
+
+    container.onmousemove = (e) => {
+        const rect = container.getBoundingClientRect();
+        if (!sheet.naturalWidth || e.clientY < rect.bottom - 40) {
+            preview.style.display = "none";
+            return;
+        }
+        const frac = Math.min(0.999, Math.max(0, (e.clientX - rect.left) / rect.width));
+        const i = Math.floor(frac * sprite.count);
+        const w = sheet.naturalWidth / sprite.cols;
+        const h = sheet.naturalHeight / sprite.rows;
+        Object.assign(preview.style, {
+            display: "block",
+            width: `${w}px`,
+            height: `${h}px`,
+            backgroundImage: `url("${sprite.path}")`,
+            backgroundPosition: `-${(i % sprite.cols) * w}px -${Math.floor(i / sprite.cols) * h}px`,
+            left: `${Math.min(Math.max(0, e.clientX - rect.left - w / 2), rect.width - w)}px`,
+        });
+    };
+    container.onmouseleave = () => {
+        preview.style.display = "none";
+    };
+}
+
 function renderPair(pair) {
     currentPair = pair;
     annotatorId = pair.progress?.annotatorId || "anonymous";
@@ -402,8 +498,14 @@ function renderPair(pair) {
     leftVideo.preload = "auto";
     rightVideo.preload = "auto";
 
-    leftVideo.src = pair.left_clip;
-    rightVideo.src = pair.right_clip;
+    // poster first so something is on screen while the clips buffer
+    setPoster(leftVideo, pair.left_poster);
+    setPoster(rightVideo, pair.right_poster);
+    attachSpritePreview(leftVideo, pair.left_sprite);
+    attachSpritePreview(rightVideo, pair.right_sprite);
+
+    leftVideo.src = pickRendition(pair, "left");
+    rightVideo.src = pickRendition(pair, "right");
 
     leftVideo.load();
     rightVideo.load();
@@ -427,6 +529,16 @@ function renderPair(pair) {
             rightVideo.removeEventListener("canplay", maybeStart);
         }
     };
+    // once both current clips are buffered, warm the cache with the next pair's clips
+    const maybePrefetch = () => {
+        if (leftVideo.readyState >= 4 && rightVideo.readyState >= 4) {
+            leftVideo.removeEventListener("canplaythrough", maybePrefetch);
+            rightVideo.removeEventListener("canplaythrough", maybePrefetch);
+            prefetchNext(pair._next);
+        }
+    };
+    leftVideo.addEventListener("canplaythrough", maybePrefetch);
+    rightVideo.addEventListener("canplaythrough", maybePrefetch);
     leftVideo.addEventListener("canplay", maybeStart);
     rightVideo.addEventListener("canplay", maybeStart);
 
@@ -1,2 +1,3 @@
+# One seek+decode per frame; attention_frames.py extracts every sampled frame/crop of a video in one pass.
 # Extract nearest frame to t (seconds) and crop region
 ffmpeg -ss 12.345 -i input.mp4 -frames:v 1 -vf "crop=w_p:h_p:x_p:y_p" -y out.png
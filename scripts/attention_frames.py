@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Extract the frames (and crops around the clicked points) behind pause-sampling annotations.
+
+Batched replacement for attention_frame_crop.sh, which seeks and decodes once per frame.
+Every attention.samples[].tsMs of every "pause-sampling" annotation in the export is
+grouped by video URL; each video is then decoded once, by one ffmpeg process that keeps
+only the needed frames (select filter) and streams them as raw RGB, and all of its frames
+and crops are written from that single pass. Videos are spread over --jobs worker processes.
+
+The frame for tsMs is the one on screen at that time: floor(tsMs * fps / 1000), with fps
+the average rate over the stts sample durations (as ffprobe's avg_frame_rate).
+Crops are --crop WxH pixels centred on each point (clamped to the frame); identical crops
+are written once. Images are PNG, under --out mirroring the video's path:
+  <out>/<video path without .mp4>/f00012.png               (--frames)
+  <out>/<video path without .mp4>/f00012_x0340_y0120.png   (crops)
+and <out>/index.jsonl has one record per sampled point:
+  {"annotator_id", "pair_id", "side", "url", "ts_ms", "frame", "x", "y", "crop", "frame_path"}
+
+Input is export_annotations.js output (JSON array or JSONL) or a raw dump of the
+annotations collection; the side's URL (left_url / left.url) is mapped to a file by
+dropping its scheme/host and --strip-prefix and joining it to --video-root.
+
+Usage:
+  python attention_frames.py --annotations annotations_export.json --video-root frontend --out attention
+  python attention_frames.py --annotations export.jsonl --video-root video --strip-prefix video/ --frames --no-crops
+"""
+
+import argparse
+import json
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+import zlib
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Iterable, Optional
+from urllib.parse import unquote, urlparse
+
+from json_io import iter_records, write_jsonl
+from mp4_header import probe_mp4
+
+def write_png(path: Path, width: int, height: int, rgb: bytes) -> None:
+    """Write 8-bit RGB pixels (rows top to bottom, no padding) as a PNG."""
+    stride = width * 3
+    raw = b"".join(b"\x00" + rgb[y * stride:(y + 1) * stride] for y in range(height))
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    tmp = path.with_name(f".{path.name}.part")
+    with tmp.open("wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(raw, 6)))
+        f.write(chunk(b"IEND", b""))
+    os.replace(tmp, path)
+
+def crop_rgb(frame: bytes, width: int, box: tuple[int, int, int, int]) -> bytes:
+    x0, y0, w, h = box
+    stride = width * 3
+    return b"".join(frame[y * stride + x0 * 3:y * stride + (x0 + w) * 3] for y in range(y0, y0 + h))
+
+def crop_box(x: float, y: float, width: int, height: int, cw: int, ch: int) -> tuple[int, int, int, int]:
+    """cw x ch box centred on normalised (x, y), shifted to stay inside the frame."""
+    cw, ch = min(cw, width), min(ch, height)
+    x0 = min(max(0, round(x * width - cw / 2)), width - cw)
+    y0 = min(max(0, round(y * height - ch / 2)), height - ch)
+    return (x0, y0, cw, ch)
+
+def probe_size(path: Path) -> Optional[tuple[int, int]]:
+    info = probe_mp4(path)
+    if info is not None and info.width and info.height:
+        return info.width, info.height
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=width,height",
+           "-of", "json", str(path)]
+    try:
+        s = json.loads(subprocess.check_output(cmd, stderr=subprocess.DEVNULL, text=True))["streams"][0]
+        return int(s["width"]), int(s["height"])
+    except Exception:
+        return None
+
+def collect(records: Iterable[dict]) -> dict[str, list[dict]]:
+    """url -> sampled points of pause-sampling annotations on that video."""
+    by_url = defaultdict(list)
+    for rec in records:
+        att = rec.get("attention") or {}
+        if att.get("type") != "pause-sampling" or att.get("side") not in ("left", "right"):
+            continue
+        side = att["side"]
+        url = rec.get(f"{side}_url") or (rec.get(side) or {}).get("url")
+        if not url:
+            continue
+        for sample in att.get("samples") or []:
+            for p in sample.get("points") or []:
+                by_url[url].append({
+                    "annotator_id": rec.get("annotator_id", rec.get("annotatorId")),
+                    "pair_id": rec.get("pair_id", rec.get("pairId")),
+                    "side": side,
+                    "url": url,
+                    "ts_ms": sample["tsMs"],
+                    "x": p["x"],
+                    "y": p["y"],
+                })
+    return by_url
+
+def url_to_rel(url: str, strip_prefix: str) -> str:
+    rel = unquote(urlparse(url).path).lstrip("/")
+    if strip_prefix and rel.startswith(strip_prefix):
+        rel = rel[len(strip_prefix):]
+    return rel
+
+def extract_video(job: tuple) -> tuple:
+    """
+    Worker: decode one video once and write its frames/crops.
+    Returns (url, index records, error or None).
+    """
+    url, src, out_dir, points, crop, want_frames, threads = job
+    info = probe_mp4(src)
+    size = probe_size(src)
+    if info is None or size is None or info.fps <= 0:
+        return url, [], "cannot read video header"
+    width, height = size
+    last = max(0, info.frames - 1)
+    for p in points:
+        # multiply before dividing: for whole-number rates ts_ms * fps is exact, so frame
+        # boundaries (e.g. 1100 ms at 10 fps) do not round down to the previous frame
+        p["frame"] = min(last, int(p["ts_ms"] * info.fps / 1000))
+    frames = sorted({p["frame"] for p in points})
+
+    select = "+".join(f"eq(n\\,{n})" for n in frames)
+    cmd = ["ffmpeg", "-v", "error", "-threads", str(threads), "-i", str(src),
+           "-vf", f"select={select}", "-vsync", "0",
+           "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:"]
+    out_dir.mkdir(parents=True, exist_ok=True)
+    frame_bytes = width * height * 3
+    by_frame = defaultdict(list)
+    for p in points:
+        by_frame[p["frame"]].append(p)
+    written = set()
+    # stderr goes to a file, not a pipe: only stdout is read here, so a full stderr pipe
+    # would block ffmpeg (and with it this loop)
+    errf = tempfile.TemporaryFile()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=errf)
+    try:
+        for n in frames:
+            buf = proc.stdout.read(frame_bytes)
+            if len(buf) < frame_bytes:
+                break
+            frame_path = out_dir / f"f{n:05d}.png"
+            if want_frames:
+                write_png(frame_path, width, height, buf)
+            for p in by_frame.pop(n):
+                p["frame_path"] = str(frame_path) if want_frames else None
+                p["crop"] = None
+                if crop:
+                    box = crop_box(p["x"], p["y"], width, height, *crop)
+                    path = out_dir / f"f{n:05d}_x{box[0]:04d}_y{box[1]:04d}.png"
+                    if path not in written:
+                        write_png(path, box[2], box[3], crop_rgb(buf, width, box))
+                        written.add(path)
+                    p["crop"] = str(path)
+        proc.stdout.close()
+        proc.wait()
+        errf.seek(0)
+        err = errf.read().decode(errors="replace").strip()
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        errf.close()
+    if proc.returncode != 0:
+        return url, [], (err.splitlines() or [f"ffmpeg exited with {proc.returncode}"])[-1]
+    if by_frame:
+        return url, [], f"video ended before frame {min(by_frame)}"
+    return url, points, None
+
+def parse_size(spec: str) -> tuple[int, int]:
+    w, _, h = spec.lower().partition("x")
+    return int(w), int(h or w)
+
+def main():
+    ap = argparse.ArgumentParser(description="Extract pause-sampling attention frames/crops, one decode per video")
+    ap.add_argument("--annotations", type=Path, default=Path("annotations_export.json"),
+                    help="export_annotations.js output (JSON array or JSONL)")
+    ap.add_argument("--video-root", type=Path, default=Path("frontend"), help="Directory the video URLs resolve against")
+    ap.add_argument("--strip-prefix", default="", help="URL path prefix to drop before joining to --video-root")
+    ap.add_argument("--out", type=Path, default=Path("attention_frames"))
+    ap.add_argument("--crop", type=parse_size, default=(128, 128), help="Crop size around each point, WxH pixels")
+    ap.add_argument("--no-crops", action="store_true", help="Do not write crops")
+    ap.add_argument("--frames", action="store_true", help="Also write the full frames")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Videos decoded in parallel")
+    args = ap.parse_args()
+
+    if not args.annotations.exists():
+        print(f"[ERROR] Annotations not found: {args.annotations}", file=sys.stderr)
+        sys.exit(1)
+    if args.no_crops and not args.frames:
+        ap.error("nothing to write: --no-crops without --frames")
+    by_url = collect(iter_records(args.annotations))
+    crop = None if args.no_crops else args.crop
+    threads = max(1, (os.cpu_count() or 1) // max(1, args.jobs))
+
+    jobs = []
+    for url, points in by_url.items():
+        rel = url_to_rel(url, args.strip_prefix)
+        src = args.video_root / rel
+        if not src.is_file():
+            print(f"[SKIP] {url}: not found at {src}", file=sys.stderr)
+            continue
+        jobs.append((url, src, args.out / Path(rel).with_suffix(""), points, crop, args.frames, threads))
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    results = {}
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        # largest videos first so one long decode does not finish last
+        futures = [pool.submit(extract_video, job) for job in sorted(jobs, key=lambda j: -len(j[3]))]
+        for fut in as_completed(futures):
+            try:
+                url, records, err = fut.result()
+            except OSError as e:
+                print(f"[ERROR] {e}", file=sys.stderr)
+                failed += 1
+                continue
+            if err:
+                print(f"[ERROR] {url}: {err}", file=sys.stderr)
+                failed += 1
+                continue
+            results[url] = records
+
+    n_points = write_jsonl((rec for url in sorted(results) for rec in results[url]), args.out / "index.jsonl")
+    print(f"{n_points} points from {len(jobs) - failed}/{len(by_url)} videos ({failed} failed) -> {args.out}")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Per-clip attention heatmaps from the annotations export. Requires NumPy.
+
+Every normalised attention point -- the single x/y of point/grid/box attention (at
+decisionAtMs) and each samples[].points entry of pause-sampling attention (at its tsMs)
+-- is loaded into flat arrays (clip index, time bin, x, y) and binned with vectorised
+2D histograms into
+  <out>/counts.npy     uint32  (clips, time_bins, grid_h, grid_w)
+  <out>/smoothed.npy   float32 same shape, Gaussian-smoothed counts (--sigma > 0)
+  <out>/meta.json      clip URLs (row order of the arrays), settings, update state
+Time bins are --bin-ms wide; later points fall into the last bin. Points in pixel
+coordinates or without a timestamp are skipped (and counted).
+
+Both arrays are .npy files opened as memory maps, so slices load only what they touch:
+  import attention_heatmap
+  hm = attention_heatmap.Heatmaps("heatmaps")
+  hm.clip("video/scen/v1/agentA/1/clip_001.mp4")          # (time_bins, grid_h, grid_w) view
+  hm.smoothed[:, 3].sum(axis=(1, 2))                        # attention mass per clip in bin 3
+
+Re-running against a newer export is incremental: only annotations with a timestamp
+after the last one already counted are added (annotations exactly at that timestamp are
+told apart by annotator/pair), new clips grow the arrays, and only the clips that
+received points are re-smoothed. --rebuild starts over, e.g. after changing --grid.
+
+Usage:
+  python attention_heatmap.py --annotations annotations_export.json --out heatmaps
+  python attention_heatmap.py --annotations annotations_export.json --out heatmaps --grid 96x54 --sigma 2 --rebuild
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+from array import array
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+from json_io import atomic_write, iter_records
+
+# Output is processed in blocks of clips of about this many grid cells, bounding memory.
+BLOCK_CELLS = 1 << 24
+
+def iter_points(rec: dict) -> Iterator[tuple]:
+    """(clip url, time in ms or None, x, y, normalised?) for each attention point of an annotation."""
+    att = rec.get("attention") or {}
+    side = att.get("side")
+    if side not in ("left", "right"):
+        return
+    url = rec.get(f"{side}_url") or (rec.get(side) or {}).get("url")
+    if not url:
+        return
+    normalised = att.get("coordSpace", "normalised") == "normalised"
+    if att.get("x") is not None and att.get("y") is not None:
+        yield url, att.get("decisionAtMs"), att["x"], att["y"], normalised
+    for sample in att.get("samples") or []:
+        for p in sample.get("points") or []:
+            yield url, sample.get("tsMs"), p["x"], p["y"], True
+
+def record_key(rec: dict) -> str:
+    return f'{rec.get("annotator_id", rec.get("annotatorId"))}|{rec.get("pair_id", rec.get("pairId"))}'
+
+class AttentionPoints:
+    """
+    Flat point arrays: clip (index into the clip list), t_ms (NaN if unknown), x, y.
+    Built with typed arrays, so loading costs one small tuple per point, not one object.
+    """
+
+    def __init__(self, clip_index: dict[str, int]):
+        self.clip_index = clip_index
+        self._clip = array("I")
+        self._t = array("d")
+        self._x = array("d")
+        self._y = array("d")
+        self.skipped_pixel = 0
+        self.annotations = 0
+
+    def add(self, rec: dict) -> None:
+        n = len(self._clip)
+        for url, t, x, y, normalised in iter_points(rec):
+            if not normalised:
+                self.skipped_pixel += 1
+                continue
+            self._clip.append(self.clip_index.setdefault(url, len(self.clip_index)))
+            self._t.append(float("nan") if t is None else t)
+            self._x.append(x)
+            self._y.append(y)
+        self.annotations += len(self._clip) > n
+
+    def arrays(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        return (np.frombuffer(self._clip, dtype=np.uint32).astype(np.int64), np.frombuffer(self._t, dtype=np.float64),
+                np.frombuffer(self._x, dtype=np.float64), np.frombuffer(self._y, dtype=np.float64))
+
+def new_records(records: Iterable[dict], after: Optional[str], seen_at: set) -> Iterator[dict]:
+    """Records not counted yet: timestamp after `after`, or at it and not in seen_at (record_key)."""
+    for rec in records:
+        ts = rec.get("timestamp")
+        if after is not None:
+            if ts is None or ts < after or (ts == after and record_key(rec) in seen_at):
+                continue
+        yield rec
+
+def cell_index(t: np.ndarray, x: np.ndarray, y: np.ndarray, bin_ms: float, time_bins: int,
+               grid_h: int, grid_w: int) -> np.ndarray:
+    """Flat (time bin, row, column) index of each point within its clip's block."""
+    tb = np.clip(np.floor(t / bin_ms), 0, time_bins - 1).astype(np.int64)
+    ix = np.clip((x * grid_w).astype(np.int64), 0, grid_w - 1)
+    iy = np.clip((y * grid_h).astype(np.int64), 0, grid_h - 1)
+    return (tb * grid_h + iy) * grid_w + ix
+
+def accumulate(counts: np.ndarray, clip: np.ndarray, cell: np.ndarray) -> None:
+    """counts[clip].flat[cell] += 1 for every point, one bincount per block of clips."""
+    per_clip = int(np.prod(counts.shape[1:]))
+    order = np.argsort(clip, kind="stable")
+    clip, cell = clip[order], cell[order]
+    step = max(1, BLOCK_CELLS // per_clip)
+    lo = 0
+    while lo < len(clip):
+        c0 = int(clip[lo])
+        hi = int(np.searchsorted(clip, c0 + step))
+        n = int(clip[hi - 1]) - c0 + 1
+        hist = np.bincount((clip[lo:hi] - c0) * per_clip + cell[lo:hi], minlength=n * per_clip)
+        counts[c0:c0 + n] += hist.reshape((n,) + counts.shape[1:]).astype(counts.dtype)
+        lo = hi
+
+def gaussian_matrix(n: int, sigma: float) -> np.ndarray:
+    """n x n blur operator; each column sums to 1, so smoothing keeps every point's mass in the grid."""
+    i = np.arange(n, dtype=np.float64)
+    k = np.exp(-0.5 * ((i[:, None] - i[None, :]) / sigma) ** 2)
+    return (k / k.sum(axis=0, keepdims=True)).astype(np.float32)
+
+def smooth(counts: np.ndarray, smoothed: np.ndarray, clips: np.ndarray, sigma: float) -> None:
+    """smoothed[c] = Gy @ counts[c] @ Gx.T (separable Gaussian) for the given clips, in blocks."""
+    grid_h, grid_w = counts.shape[2:]
+    gy, gxt = gaussian_matrix(grid_h, sigma), gaussian_matrix(grid_w, sigma).T
+    step = max(1, BLOCK_CELLS // int(np.prod(counts.shape[1:])))
+    for i in range(0, len(clips), step):
+        idx = clips[i:i + step]
+        smoothed[idx] = gy @ counts[idx].astype(np.float32) @ gxt
+
+def grow(path: Path, rows: int, dtype) -> np.ndarray:
+    """Open path (an .npy memmap) for update with at least `rows` rows, growing it by copy if needed."""
+    arr = np.lib.format.open_memmap(path, mode="r+")
+    if arr.shape[0] >= rows:
+        return arr
+    capacity = max(rows, arr.shape[0] * 3 // 2)
+    tmp = path.with_name(path.name + ".tmp")
+    new = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=(capacity,) + arr.shape[1:])
+    step = max(1, BLOCK_CELLS // int(np.prod(arr.shape[1:])))
+    for i in range(0, arr.shape[0], step):
+        j = min(i + step, arr.shape[0])
+        new[i:j] = arr[i:j]
+    new.flush()
+    del arr, new
+    os.replace(tmp, path)
+    return np.lib.format.open_memmap(path, mode="r+")
+
+class Heatmaps:
+    """Read-only view of an output directory; arrays are memory-mapped and trimmed to the clip count."""
+
+    def __init__(self, out_dir):
+        out_dir = Path(out_dir)
+        with (out_dir / "meta.json").open("r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.clips: list[str] = self.meta["clips"]
+        self.index = {url: i for i, url in enumerate(self.clips)}
+        n = len(self.clips)
+        self.counts = np.load(out_dir / "counts.npy", mmap_mode="r")[:n]
+        smoothed = out_dir / "smoothed.npy"
+        self.smoothed = np.load(smoothed, mmap_mode="r")[:n] if smoothed.exists() else None
+
+    def clip(self, url: str, smoothed: bool = True) -> np.ndarray:
+        arr = self.smoothed if smoothed and self.smoothed is not None else self.counts
+        return arr[self.index[url]]
+
+def parse_grid(spec: str) -> tuple[int, int]:
+    w, _, h = spec.lower().partition("x")
+    return int(w), int(h or w)
+
+def main():
+    ap = argparse.ArgumentParser(description="Build or update per-clip attention heatmaps (NumPy, memory-mapped)")
+    ap.add_argument("--annotations", type=Path, default=Path("annotations_export.json"),
+                    help="export_annotations.js output (JSON array or JSONL)")
+    ap.add_argument("--out", type=Path, default=Path("heatmaps"))
+    ap.add_argument("--grid", type=parse_grid, default=(64, 36), help="Histogram size WxH (cells)")
+    ap.add_argument("--bin-ms", type=float, default=500.0, help="Time bin width in ms")
+    ap.add_argument("--time-bins", type=int, default=10, help="Number of time bins (the last one is open-ended)")
+    ap.add_argument("--sigma", type=float, default=1.5, help="Gaussian smoothing in cells (0: no smoothed.npy)")
+    ap.add_argument("--rebuild", action="store_true", help="Discard existing heatmaps and rebuild from the export")
+    args = ap.parse_args()
+
+    if not args.annotations.exists():
+        print(f"[ERROR] Annotations not found: {args.annotations}", file=sys.stderr)
+        sys.exit(1)
+    grid_w, grid_h = args.grid
+    settings = {"grid_w": grid_w, "grid_h": grid_h, "bin_ms": args.bin_ms, "time_bins": args.time_bins,
+                "sigma": args.sigma}
+    meta_path = args.out / "meta.json"
+    if args.rebuild and args.out.exists():
+        shutil.rmtree(args.out)
+    meta = None
+    if meta_path.exists():
+        with meta_path.open("r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["settings"] != settings:
+            print(f"[ERROR] {args.out} was built with {meta['settings']}; use --rebuild to change settings",
+                  file=sys.stderr)
+            sys.exit(1)
+    args.out.mkdir(parents=True, exist_ok=True)
+
+    clips = meta["clips"] if meta else []
+    clip_index = {url: i for i, url in enumerate(clips)}
+    after = meta["last_timestamp"] if meta else None
+    seen_at = set(meta["keys_at_last_timestamp"]) if meta else set()
+
+    points = AttentionPoints(clip_index)
+    last, keys_at_last, untimed_records = after, set(seen_at), 0
+    for rec in new_records(iter_records(args.annotations), after, seen_at):
+        points.add(rec)
+        ts = rec.get("timestamp")
+        if ts is None:
+            untimed_records += 1
+        elif last is None or ts > last:
+            last, keys_at_last = ts, {record_key(rec)}
+        elif ts == last:
+            keys_at_last.add(record_key(rec))
+
+    clip, t, x, y = points.arrays()
+    timed = ~np.isnan(t)
+    clip, t, x, y = clip[timed], t[timed], x[timed], y[timed]
+    shape = (args.time_bins, grid_h, grid_w)
+    n_clips = len(clip_index)
+
+    counts_path, smoothed_path = args.out / "counts.npy", args.out / "smoothed.npy"
+    if not counts_path.exists():
+        np.lib.format.open_memmap(counts_path, mode="w+", dtype=np.uint32, shape=(max(1, n_clips),) + shape).flush()
+        if args.sigma > 0:
+            np.lib.format.open_memmap(smoothed_path, mode="w+", dtype=np.float32,
+                                      shape=(max(1, n_clips),) + shape).flush()
+    counts = grow(counts_path, n_clips, np.uint32)
+    accumulate(counts, clip, cell_index(t, x, y, args.bin_ms, args.time_bins, grid_h, grid_w))
+    counts.flush()
+    touched = np.unique(clip)
+    if args.sigma > 0:
+        smoothed = grow(smoothed_path, n_clips, np.float32)
+        smooth(counts, smoothed, touched, args.sigma)
+        smoothed.flush()
+
+    meta = {
+        "settings": settings,
+        "shape": [n_clips, *shape],
+        "clips": sorted(clip_index, key=clip_index.get),
+        "last_timestamp": last,
+        "keys_at_last_timestamp": sorted(keys_at_last),
+        "points": (meta["points"] if meta else 0) + int(len(clip)),
+    }
+    atomic_write(meta_path, lambda f: json.dump(meta, f, indent=2))
+
+    skipped = int((~timed).sum())
+    print(f"Added {len(clip)} points from {points.annotations} annotations to {len(touched)} clips"
+          f" ({n_clips} clips, {meta['points']} points total) -> {args.out}")
+    if skipped or points.skipped_pixel:
+        print(f"[SKIP] {skipped} points without a timestamp, {points.skipped_pixel} in pixel coordinates",
+              file=sys.stderr)
+    if untimed_records:
+        print(f"[WARN] {untimed_records} annotations have no timestamp; a later update cannot tell them"
+              " apart and skips them", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
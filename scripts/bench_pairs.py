@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark gen_pair.py's dict engine against the columnar engine (pair_engine.py).
+
+Builds a synthetic, sorted catalogue in memory (synth_dataset.synthetic_catalogue):
+  scenarios x variants x agents x routes x clips   (with --density of the clips present)
+then, for each strategy, times pair generation + left/right ordering + dedupe + building
+the output records (no file I/O) with both engines and checks that they produce identical
+records. For the columnar engine the time is also split into encoding the catalogue,
+the vectorised core (grouping, pair indices, ordering, dedupe) and materialising records.
+
+Usage:
+  python bench_pairs.py --agents 20 --routes 50 --clips 20
+  python bench_pairs.py --strategies A D --repeat 3
+"""
+
+import argparse
+import random
+import time
+
+import gen_pair
+import pair_engine
+from synth_dataset import synthetic_catalogue
+
+def run_dict(rows, strategy, pivot_map, k, seed, prefix):
+    factory = gen_pair.ClipFactory(prefix)
+    clips = gen_pair.assign_order([factory.make(r) for r in rows])
+    pairs = gen_pair.build_pairs(clips, strategy, pivot_map, k, random.Random(seed))
+    return list(gen_pair.pair_records(pairs, 6))
+
+def run_columnar(rows, strategy, pivot_map, k, seed, prefix):
+    t0 = time.perf_counter()
+    factory = gen_pair.ClipFactory(prefix)
+    table = pair_engine.ClipTable([factory.make(r) for r in rows])
+    t1 = time.perf_counter()
+    r1, r2 = pair_engine.build_pairs(table, strategy, pivot_map, k, random.Random(seed))
+    lp, rp, sc = pair_engine.ordered_pairs(table, r1, r2)
+    t2 = time.perf_counter()
+    out = list(pair_engine.pair_records(table, lp, rp, sc, 6))
+    t3 = time.perf_counter()
+    return out, {"encode": t1 - t0, "core": t2 - t1, "records": t3 - t2}
+
+def timed(repeat, fn, *args):
+    """Best-of-N wall time of fn(*args) and its last result."""
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark dict vs columnar pair generation")
+    ap.add_argument("--scenarios", type=int, default=2)
+    ap.add_argument("--variants", type=int, default=3)
+    ap.add_argument("--agents", type=int, default=12)
+    ap.add_argument("--routes", type=int, default=40)
+    ap.add_argument("--clips", type=int, default=20)
+    ap.add_argument("--density", type=float, default=0.9, help="Fraction of clips present (sparse folders)")
+    ap.add_argument("--strategies", nargs="+", choices=list("ABCD"), default=list("ABCD"))
+    ap.add_argument("--k", type=int, default=4)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--repeat", type=int, default=1, help="Report the best of N runs")
+    args = ap.parse_args()
+
+    rows = synthetic_catalogue(args.scenarios, args.variants, args.agents, args.routes, args.clips,
+                               args.density, args.seed)
+    print(f"Catalogue: {len(rows)} clips")
+    print(f"{'strategy':>8} {'pairs':>9} {'dict s':>8} {'columnar s':>10} {'speedup':>8}"
+          f" | {'encode':>7} {'core':>7} {'records':>7}  identical")
+    for strategy in args.strategies:
+        t_dict, out_dict = timed(args.repeat, run_dict, rows, strategy, None, args.k, args.seed, "video")
+        t_col, (out_col, ph) = timed(args.repeat, run_columnar, rows, strategy, None, args.k, args.seed, "video")
+        print(f"{strategy:>8} {len(out_dict):>9} {t_dict:>8.3f} {t_col:>10.3f} {t_dict / t_col:>7.1f}x"
+              f" | {ph['encode']:>7.3f} {ph['core']:>7.3f} {ph['records']:>7.3f}"
+              f"  {out_dict == out_col}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Benchmark the catalogue and pairing scripts end to end on synthetic datasets, and keep
+the results so runs at different commits can be compared.
+
+For each --scales entry (clip counts, e.g. 1e3 1e4 1e5 1e6) a dataset is generated once
+under --data-dir with synth_dataset.py (tree layout for gen_catalogue.py, flat layout for
+gen_pair2.py; zero-byte hard-linked clips unless --file says otherwise) and reused while
+its parameters match. Each stage then runs as its own process, exactly as from the
+command line, and is measured from outside: wall time, CPU time (user + system) and peak
+RSS of that process (os.wait4), plus the item count it reports and its output size.
+
+Stages:
+  scan              gen_catalogue.scan() over the tree, nothing written
+  catalogue         gen_catalogue.py --format json
+  catalogue-jsonl   gen_catalogue.py --format jsonl
+  catalogue-sqlite  gen_catalogue.py --format sqlite
+  pairs-A..pairs-D  gen_pair.py --strategy A..D on the json catalogue (--engine dict|columnar)
+  pair2             gen_pair2.py over the flat layout
+A pairs stage whose catalogue stage is not selected builds the catalogue first, untimed.
+
+Every run appends one JSON line per stage and scale to --results:
+  {"run": "<UTC time>", "commit": "<short sha>", "dirty": false, "stage": "pairs-A",
+   "scale": 100000, "wall_s": ..., "cpu_s": ..., "peak_rss_mb": ..., "items": ..., "out_bytes": ...}
+--compare REF prints this run against the latest run recorded at commit REF and flags
+stages that got slower or bigger than --threshold (exit status 1 with --fail-on-regression).
+
+Usage:
+  python bench_suite.py --scales 1e3 1e4 1e5
+  python bench_suite.py --scales 1e6 --stages catalogue pairs-A pairs-D --data-dir /data/synth
+  python bench_suite.py --compare HEAD~1 --scales 1e5 --fail-on-regression
+  python bench_suite.py --compare-only HEAD~1
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional
+
+import synth_dataset
+
+SCRIPTS = Path(__file__).resolve().parent
+SCAN_SNIPPET = "import sys, gen_catalogue; print(sum(1 for _ in gen_catalogue.scan(sys.argv[1])), 'clips')"
+
+class Stage(NamedTuple):
+    argv: Callable[[dict], list]  # paths -> command line
+    output: Optional[str]         # key of paths holding the output file
+    items: str                    # regex for the item count on stdout
+    needs: Optional[str] = None   # stage whose output this one reads
+
+def _pairs(strategy: str) -> Stage:
+    return Stage(lambda p: [sys.executable, SCRIPTS / "gen_pair.py", "--catalogue", p["catalogue"],
+                            "--out", p[f"pairs-{strategy}"], "--strategy", strategy, "--engine", p["engine"]],
+                 f"pairs-{strategy}", r"Wrote (\d+) pairs", needs="catalogue")
+
+STAGES = {
+    "scan": Stage(lambda p: [sys.executable, "-c", SCAN_SNIPPET, p["tree"]], None, r"(\d+) clips"),
+    "catalogue": Stage(lambda p: [sys.executable, SCRIPTS / "gen_catalogue.py", "--root", p["tree"],
+                                  "--out", p["catalogue"]], "catalogue", r"Wrote (\d+) entries"),
+    "catalogue-jsonl": Stage(lambda p: [sys.executable, SCRIPTS / "gen_catalogue.py", "--root", p["tree"],
+                                        "--format", "jsonl", "--out", p["catalogue-jsonl"]],
+                             "catalogue-jsonl", r"Wrote (\d+) entries"),
+    "catalogue-sqlite": Stage(lambda p: [sys.executable, SCRIPTS / "gen_catalogue.py", "--root", p["tree"],
+                                         "--format", "sqlite", "--out", p["catalogue-sqlite"]],
+                              "catalogue-sqlite", r"Wrote (\d+) entries"),
+    **{f"pairs-{s}": _pairs(s) for s in "ABCD"},
+    "pair2": Stage(lambda p: [sys.executable, SCRIPTS / "gen_pair2.py", p["flat"], "--out", p["pair2"]],
+                   "pair2", r"Pairs: (\d+)"),
+}
+
+def run_measured(argv: list, cwd: Path) -> dict:
+    """Run argv to completion; wall/CPU time and peak RSS of that process alone, and its stdout."""
+    with tempfile.TemporaryFile("w+") as out, tempfile.TemporaryFile("w+") as err:
+        t0 = time.perf_counter()
+        proc = subprocess.Popen([str(a) for a in argv], cwd=cwd, stdout=out, stderr=err, text=True)
+        _pid, status, usage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - t0
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        out.seek(0)
+        err.seek(0)
+        stdout, stderr = out.read(), err.read()
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(map(str, argv))} exited with {proc.returncode}:\n{stderr[-2000:]}")
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    rss_mb = usage.ru_maxrss / (1 << 20 if sys.platform == "darwin" else 1 << 10)
+    return {"wall_s": wall, "cpu_s": usage.ru_utime + usage.ru_stime, "peak_rss_mb": rss_mb, "stdout": stdout}
+
+def prepare_dataset(data_dir: Path, scale: int, args) -> dict:
+    """Generate (or reuse) the tree and flat datasets for one scale; returns the paths used by stages."""
+    base = data_dir / f"clips-{scale}"
+    params = {"clips": scale, "scenarios": args.scenarios, "variants": args.variants, "agents": args.agents,
+              "clips_per_route": args.clips_per_route, "density": args.density, "file": args.file, "seed": args.seed}
+    marker = base / "params.json"
+    if not (marker.exists() and json.loads(marker.read_text(encoding="utf-8")) == params):
+        shutil.rmtree(base, ignore_errors=True)
+        base.mkdir(parents=True)
+        t0 = time.perf_counter()
+        for layout in ("tree", "flat"):
+            synth_dataset.generate(base / layout, layout, scale, args.scenarios, args.variants, args.agents,
+                                   args.clips_per_route, args.density, args.seed, args.file, 1 << 20,
+                                   link=True, duration_s=4.0, fps=10.0, width=1280, height=720)
+        marker.write_text(json.dumps(params), encoding="utf-8")
+        print(f"[{scale}] generated dataset in {time.perf_counter() - t0:.1f}s ({base})")
+    out = base / "out"
+    out.mkdir(exist_ok=True)
+    return {
+        "tree": base / "tree", "flat": base / "flat", "engine": args.engine,
+        "catalogue": out / "catalogue.json", "catalogue-jsonl": out / "catalogue.jsonl",
+        "catalogue-sqlite": out / "catalogue.sqlite", "pair2": out / "pairs2.json",
+        **{f"pairs-{s}": out / f"pairs-{s}.json" for s in "ABCD"},
+    }
+
+def git_state() -> tuple[Optional[str], bool]:
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPTS, text=True,
+                                         stderr=subprocess.DEVNULL).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"],
+                                             cwd=SCRIPTS, text=True, stderr=subprocess.DEVNULL).strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+
+def resolve_commit(ref: str) -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", ref], cwd=SCRIPTS, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ref  # not a git ref here: take it as a recorded commit id
+
+def load_results(path: Path) -> list[dict]:
+    if not path.exists():
+        return []
+    with path.open("r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def latest_run(records: list[dict], commit: Optional[str] = None, before: Optional[str] = None) -> dict:
+    """
+    (stage, scale, engine) -> its most recent record, optionally only those at commit and
+    from runs earlier than run id before. Without filters: the records of the latest run.
+    """
+    if commit is None and before is None:
+        last = max((r["run"] for r in records), default=None)
+        records = [r for r in records if r["run"] == last]
+    latest = {}
+    for r in records:
+        if (commit is None or r.get("commit") == commit) and (before is None or r["run"] < before):
+            key = (r["stage"], r["scale"], r.get("engine"))
+            if key not in latest or r["run"] >= latest[key]["run"]:
+                latest[key] = r
+    return latest
+
+def compare(base: dict, current: dict, threshold: float) -> int:
+    """Print current vs base; returns the number of regressions."""
+    regressions = 0
+    print(f"{'stage':<17} {'scale':>8} {'wall s':>17} {'ratio':>6} {'peak RSS MB':>19} {'ratio':>6}")
+    for key in sorted(current, key=lambda k: (k[1], k[0], k[2] or "")):
+        if key not in base:
+            continue
+        b, c = base[key], current[key]
+        t_ratio = c["wall_s"] / b["wall_s"] if b["wall_s"] else float("inf")
+        m_ratio = c["peak_rss_mb"] / b["peak_rss_mb"] if b["peak_rss_mb"] else float("inf")
+        flag = ""
+        if t_ratio > 1 + threshold or m_ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        label = f"{key[0]}/{key[2]}" if key[2] else key[0]
+        print(f"{label:<17} {key[1]:>8} {b['wall_s']:>8.2f} -> {c['wall_s']:>5.2f} {t_ratio:>5.2f}x"
+              f" {b['peak_rss_mb']:>8.1f} -> {c['peak_rss_mb']:>7.1f} {m_ratio:>5.2f}x{flag}")
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark catalogue building and pairing on synthetic datasets")
+    ap.add_argument("--scales", nargs="+", default=["1e3", "1e4", "1e5"], help="Clip counts, e.g. 1e3 1e6")
+    ap.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    ap.add_argument("--engine", choices=["dict", "columnar"], default="dict", help="gen_pair.py --engine")
+    ap.add_argument("--repeat", type=int, default=1, help="Keep the fastest of N runs per stage")
+    ap.add_argument("--data-dir", type=Path, help="Where datasets are generated and kept (default: a temp dir)")
+    ap.add_argument("--results", type=Path, default=Path("bench_results.jsonl"))
+    ap.add_argument("--scenarios", type=int, default=4)
+    ap.add_argument("--variants", type=int, default=3)
+    ap.add_argument("--agents", type=int, default=8)
+    ap.add_argument("--clips-per-route", type=int, default=20)
+    ap.add_argument("--density", type=float, default=0.9)
+    ap.add_argument("--file", choices=["empty", "sparse", "mp4"], default="empty")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--compare", metavar="REF", help="After running, compare with the latest run at this commit")
+    ap.add_argument("--compare-only", metavar="REF", help="Compare the latest recorded run with REF; run nothing")
+    ap.add_argument("--threshold", type=float, default=0.2, help="Slowdown/growth counted as a regression (0.2 = 20%%)")
+    ap.add_argument("--fail-on-regression", action="store_true")
+    args = ap.parse_args()
+
+    ref = args.compare_only or args.compare
+    if not args.compare_only:
+        scales = [int(float(s)) for s in args.scales]
+        commit, dirty = git_state()
+        run_id = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        env = {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()}
+        tmp = None
+        data_dir = args.data_dir.resolve() if args.data_dir else None  # stages run from this directory
+        if data_dir is None:
+            tmp = tempfile.TemporaryDirectory(prefix="bench-suite-")
+            data_dir = Path(tmp.name)
+        try:
+            print(f"{'stage':<17} {'scale':>8} {'items':>10} {'wall s':>8} {'cpu s':>8} {'RSS MB':>8} {'out MB':>8}")
+            for scale in scales:
+                paths = prepare_dataset(data_dir, scale, args)
+                built = set()
+                for name in args.stages:
+                    stage = STAGES[name]
+                    if stage.needs and stage.needs not in args.stages and stage.needs not in built:
+                        run_measured(STAGES[stage.needs].argv(paths), SCRIPTS)  # input only, untimed
+                        built.add(stage.needs)
+                    best = min((run_measured(stage.argv(paths), SCRIPTS) for _ in range(max(1, args.repeat))),
+                               key=lambda m: m["wall_s"])
+                    m = re.search(stage.items, best["stdout"])
+                    out_path = paths.get(stage.output) if stage.output else None
+                    rec = {
+                        "run": run_id, "commit": commit, "dirty": dirty, **env,
+                        "engine": args.engine if name.startswith("pairs-") else None,
+                        "stage": name, "scale": scale, "wall_s": round(best["wall_s"], 4),
+                        "cpu_s": round(best["cpu_s"], 4), "peak_rss_mb": round(best["peak_rss_mb"], 1),
+                        "items": int(m.group(1)) if m else None,
+                        "out_bytes": out_path.stat().st_size if out_path and out_path.exists() else None,
+                    }
+                    with args.results.open("a", encoding="utf-8") as f:
+                        f.write(json.dumps(rec) + "\n")
+                    out_mb = f"{rec['out_bytes'] / 1e6:.1f}" if rec["out_bytes"] is not None else "-"
+                    print(f"{name:<17} {scale:>8} {rec['items'] or '-':>10} {rec['wall_s']:>8.2f} "
+                          f"{rec['cpu_s']:>8.2f} {rec['peak_rss_mb']:>8.1f} {out_mb:>8}")
+        except RuntimeError as e:
+            print(f"[ERROR] {e}", file=sys.stderr)
+            sys.exit(1)
+        finally:
+            if tmp is not None:
+                tmp.cleanup()
+        print(f"Results appended to {args.results} (run {run_id}, commit {commit or '?'}{' +dirty' if dirty else ''})")
+
+    if ref:
+        records = load_results(args.results)
+        current = latest_run(records)
+        run_id = next(iter(current.values()))["run"] if current else None
+        base = latest_run(records, resolve_commit(ref), before=run_id)
+        if not base:
+            print(f"[ERROR] No earlier recorded run at {ref} in {args.results}", file=sys.stderr)
+            sys.exit(1)
+        regressions = compare(base, current, args.threshold)
+        print(f"{regressions} regression(s) beyond {args.threshold:.0%} against {ref}")
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+SQLite catalogue store shared by gen_catalogue.py (--format sqlite) and gen_pair.py.
+
+One row per clip in catalogue order (rowid), with indexes on
+  (scenario, variant, route_id, clip_idx)   -- strategies A, C, D
+  (scenario, agent, route_id, clip_idx)     -- strategy B
+so subsets (--scenario, ...) are found without scanning the table, and pairing reads one
+group at a time from a single query (SQLite does the grouping sorts, in its own bounded
+temp store) instead of regrouping the whole catalogue in Python.
+Entry keys other than the fixed columns are kept as JSON in `extra`.
+
+Usage:
+  python catalogue_db.py catalogue.sqlite [--scenario car_following] [--out subset.jsonl]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+COLUMNS = ("id", "scenario", "variant", "agent", "route_id", "clip_idx", "rel_path", "duration_s", "fps")
+
+SCHEMA = """
+CREATE TABLE clips (
+  id TEXT,
+  scenario TEXT NOT NULL,
+  variant TEXT NOT NULL,
+  agent TEXT NOT NULL,
+  route_id INTEGER NOT NULL,
+  clip_idx INTEGER NOT NULL,
+  rel_path TEXT NOT NULL,
+  duration_s REAL,
+  fps REAL,
+  extra TEXT
+);
+"""
+
+INDEXES = """
+CREATE INDEX clips_variant_group ON clips (scenario, variant, route_id, clip_idx);
+CREATE INDEX clips_agent_group ON clips (scenario, agent, route_id, clip_idx);
+"""
+
+SQLITE_MAGIC = b"SQLite format 3\x00"
+
+def is_catalogue_db(path: Path) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
+    except OSError:
+        return False
+
+def write_db(entries: Iterable[dict], out: Path, batch: int = 10_000) -> int:
+    """
+    Write entries (in catalogue order) to a fresh database at out; replaces out atomically
+    (as json_io.atomic_write: on error out is left as it was and the temporary file removed).
+    """
+    tmp = out.with_name(out.name + ".tmp")
+    tmp.unlink(missing_ok=True)
+    try:
+        n = _fill_db(entries, tmp, batch)
+        os.replace(tmp, out)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return n
+
+def _fill_db(entries: Iterable[dict], path: Path, batch: int) -> int:
+    con = sqlite3.connect(path)
+    n = 0
+    try:
+        con.execute("PRAGMA journal_mode = OFF")
+        con.execute("PRAGMA synchronous = OFF")
+        con.executescript(SCHEMA)
+        sql = f"INSERT INTO clips ({', '.join(COLUMNS)}, extra) VALUES ({', '.join('?' * (len(COLUMNS) + 1))})"
+        rows = []
+        for e in entries:
+            extra = {k: v for k, v in e.items() if k not in COLUMNS}
+            rows.append(tuple(e.get(c) for c in COLUMNS) + (json.dumps(extra) if extra else None,))
+            n += 1
+            if len(rows) >= batch:
+                con.executemany(sql, rows)
+                rows.clear()
+        con.executemany(sql, rows)
+        con.executescript(INDEXES)  # built once after the bulk insert
+        con.commit()
+    finally:
+        con.close()
+    return n
+
+class ClipFilter:
+    """Subset selection shared by the SQL and in-memory paths. Empty lists mean 'any'."""
+
+    def __init__(self, scenarios=None, variants=None, agents=None,
+                 route_min: Optional[int] = None, route_max: Optional[int] = None):
+        self.scenarios = list(scenarios or [])
+        self.variants = list(variants or [])
+        self.agents = list(agents or [])
+        self.route_min = route_min
+        self.route_max = route_max
+
+    def __bool__(self) -> bool:
+        return bool(self.scenarios or self.variants or self.agents
+                    or self.route_min is not None or self.route_max is not None)
+
+    def where(self) -> tuple[str, list]:
+        """SQL WHERE clause (or '') and its parameters."""
+        terms, params = [], []
+        for col, values in (("scenario", self.scenarios), ("variant", self.variants), ("agent", self.agents)):
+            if values:
+                terms.append(f"{col} IN ({', '.join('?' * len(values))})")
+                params += values
+        if self.route_min is not None:
+            terms.append("route_id >= ?")
+            params.append(self.route_min)
+        if self.route_max is not None:
+            terms.append("route_id <= ?")
+            params.append(self.route_max)
+        return (" WHERE " + " AND ".join(terms) if terms else ""), params
+
+    def match(self, e: dict) -> bool:
+        return ((not self.scenarios or e["scenario"] in self.scenarios)
+                and (not self.variants or e["variant"] in self.variants)
+                and (not self.agents or e["agent"] in self.agents)
+                and (self.route_min is None or e["route_id"] >= self.route_min)
+                and (self.route_max is None or e["route_id"] <= self.route_max))
+
+def _connect(path: Path) -> sqlite3.Connection:
+    con = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    con.row_factory = sqlite3.Row
+    return con
+
+def _entry(row: sqlite3.Row) -> dict:
+    e = {c: row[c] for c in COLUMNS}
+    if row["extra"]:
+        e.update(json.loads(row["extra"]))
+    return e
+
+def iter_entries(path: Path, where: Optional[ClipFilter] = None) -> Iterator[dict]:
+    """Catalogue entries in catalogue order."""
+    clause, params = (where or ClipFilter()).where()
+    con = _connect(path)
+    try:
+        for row in con.execute(f"SELECT * FROM clips{clause} ORDER BY rowid", params):
+            yield _entry(row)
+    finally:
+        con.close()
+
+def iter_groups(path: Path, fields: tuple, where: Optional[ClipFilter] = None) -> Iterator[list[dict]]:
+    """
+    Rows grouped by `fields`, groups in order of first appearance in the catalogue and rows
+    within a group in catalogue order -- the order gen_pair.py's dict strategies see them in.
+    Each row also carries `order`, its dense rank by gen_pair's left/right key
+    (variant, agent, route_id, clip_idx, rel_path) within the selection.
+
+    The group index serves the PARTITION BY (and a --scenario filter), but the rank and
+    the first-appearance order are not index orders: SQLite sorts the selection for them
+    in temporary B-trees. The cost is a sort inside SQLite, which spills to disk, while
+    Python holds one group at a time.
+    """
+    clause, params = (where or ClipFilter()).where()
+    cols = ", ".join(fields)
+    sql = (
+        f"SELECT *, MIN(rowid) OVER (PARTITION BY {cols}) AS grp,"
+        f" DENSE_RANK() OVER (ORDER BY variant, agent, route_id, clip_idx, rel_path) - 1 AS ord"
+        f" FROM clips{clause} ORDER BY grp, rowid"
+    )
+    con = _connect(path)
+    try:
+        group, grp = [], None
+        for row in con.execute(sql, params):
+            if row["grp"] != grp and group:
+                yield group
+                group = []
+            grp = row["grp"]
+            e = _entry(row)
+            e["order"] = row["ord"]
+            group.append(e)
+        if group:
+            yield group
+    finally:
+        con.close()
+
+def agents_by_scenario_variant(path: Path, where: Optional[ClipFilter] = None) -> dict:
+    """(scenario, variant) -> {agents} for the selection."""
+    clause, params = (where or ClipFilter()).where()
+    con = _connect(path)
+    try:
+        out = {}
+        for s, v, a in con.execute(f"SELECT DISTINCT scenario, variant, agent FROM clips{clause}", params):
+            out.setdefault((s, v), set()).add(a)
+        return out
+    finally:
+        con.close()
+
+def add_filter_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--scenario", action="append", help="Only clips of this scenario (repeatable)")
+    ap.add_argument("--variant", action="append", help="Only clips of this variant (repeatable)")
+    ap.add_argument("--agent", action="append", help="Only clips of this agent (repeatable)")
+    ap.add_argument("--route-min", type=int, help="Only clips with route_id >= this")
+    ap.add_argument("--route-max", type=int, help="Only clips with route_id <= this")
+
+def filter_from_args(args: argparse.Namespace) -> ClipFilter:
+    return ClipFilter(args.scenario, args.variant, args.agent, args.route_min, args.route_max)
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect or export a SQLite catalogue")
+    ap.add_argument("db", type=Path)
+    ap.add_argument("--out", type=Path, help="Write the selected entries as JSONL (default: print counts)")
+    add_filter_args(ap)
+    args = ap.parse_args()
+
+    if not is_catalogue_db(args.db):
+        print(f"[ERROR] Not a SQLite catalogue: {args.db}", file=sys.stderr)
+        sys.exit(1)
+    where = filter_from_args(args)
+    if args.out:
+        n = 0
+        with args.out.open("w", encoding="utf-8") as f:
+            for e in iter_entries(args.db, where):
+                f.write(json.dumps(e) + "\n")
+                n += 1
+        print(f"Wrote {n} entries to {args.out}")
+        return
+    clause, params = where.where()
+    con = _connect(args.db)
+    try:
+        for s, v, clips, agents in con.execute(
+            f"SELECT scenario, variant, COUNT(*), COUNT(DISTINCT agent) FROM clips{clause}"
+            " GROUP BY scenario, variant ORDER BY scenario, variant", params):
+            print(f"{s}/{v}: {clips} clips, {agents} agents")
+    finally:
+        con.close()
+
+if __name__ == "__main__":
+    main()
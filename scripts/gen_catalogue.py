@@ -24,47 +24,91 @@ By default, writes:
   ]
 
 Options:
-  --probe uses ffprobe (if available) to read true duration/FPS (OpenCV fallback).
+  --probe reads true duration/FPS from the MP4 headers (mp4_header.py), falling back
+          to ffprobe (if available) and then OpenCV for files it cannot parse.
+          Each clip is probed once (duration and frame rate in a single call),
+          on --jobs worker threads; output order does not depend on --jobs.
+          Probe results are cached next to --out (<out>.probecache.jsonl) keyed by
+          rel_path, size and mtime, so rebuilds only re-probe new or modified clips.
+          Use --refresh-probe-cache to force a full re-probe, --no-probe-cache to disable.
   Otherwise, uses --default-duration and --default-fps.
+  --format jsonl writes one entry per line instead of a JSON array. Either way the
+          directory walk is streamed and entries are written as they are built, already
+          in (scenario, variant, agent, route_id, clip_idx) order.
+  --renditions 720,480,360 also encodes lower-bitrate renditions of each clip (ffmpeg, via
+          transcode.py) under <root>/renditions/<height>p-<settings>/<rel_path>, where
+          <settings> hashes the encode settings (kbps, --preset, ffmpeg version) as in
+          transcode.py's manifest, so changing the ladder or preset encodes new files
+          instead of reusing old ones. Renditions newer than their source with the same
+          settings are reused. Each entry records them with byte size, resolution and
+          bitrate, so gen_pair.py can pass them on to the player:
+            "renditions": [{"label": "source", "rel_path": ..., "width": 1280, "height": 720,
+                            "bytes": 1843200, "bitrate_kbps": 3686}, {"label": "480p", ...}, ...]
+  --format sqlite writes an indexed SQLite catalogue (catalogue_db.py) that gen_pair.py
+          reads group by group, optionally filtered to a subset of scenarios/routes.
+  --stats / --stats-json FILE / --profile FILE report wall/CPU time, entries and peak RSS
+          for the scan, build (probing, renditions) and write phases (instrument.py).
 """
 
 import argparse
+import heapq
+import itertools
 import json
 import os
 import re
 import subprocess
 import sys
+import tempfile
+import threading
 import uuid
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Callable, Iterable, Iterator, Optional, Tuple, TypeVar
+
+import catalogue_db
+import instrument
+from json_io import atomic_write, write_json_array, write_jsonl
+from mp4_header import Mp4Info, probe_mp4
+from transcode import ffmpeg_version, rendition_args, settings_hash, transcode
 
 CLIP_RE = re.compile(r"^clip_(\d{3,}).mp4$", re.IGNORECASE)
 
+# Generated media under the dataset root; scan() never treats these as scenarios.
+RENDITIONS_DIR = "renditions"  # <root>/renditions/<height>p-<settings hash>/<rel_path>
+THUMBNAILS_DIR = "thumbnails"  # thumbnails.py: <root>/thumbnails/<xx>/<clip hash>-<settings>.{poster,sprite}.jpg
+DEFAULT_KBPS = {1080: 4500, 720: 2500, 540: 1500, 480: 1000, 360: 600, 240: 300}
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+def parse_frame_rate(rate: str) -> float:
+    """Parse an ffprobe rate such as '30000/1001' or '10' into a float."""
+    if "/" in rate and rate != "0/0":
+        num, den = rate.split("/")
+        return (float(num) / float(den)) if float(den) else 0.0
+    return float(rate)
+
+def probe_with_mp4_header(path: Path) -> Optional[Tuple[float, float]]:
+    """Read duration/FPS from the MP4 box tree (no subprocess, no decoding)."""
+    info = probe_mp4(path)
+    if info is None or info.duration_s <= 0 or not (0.1 <= info.fps <= 1000):
+        return None
+    return (info.duration_s, info.fps)
+
 def probe_with_ffprobe(path: Path) -> Optional[Tuple[float, float]]:
+    """Read duration and avg_frame_rate with a single ffprobe invocation."""
     try:
-        cmd_dur = [
-            "ffprobe", "-v", "error",
-            "-select_streams", "v:0",
-            "-show_entries", "format=duration",
-            "-of", "default=noprint_wrappers=1:nokey=1",
-            str(path)
-        ]
-        dur_out = subprocess.check_output(cmd_dur, stderr=subprocess.STDOUT, text=True).strip()
-        duration = float(dur_out)
-
-        cmd_fps = [
+        cmd = [
             "ffprobe", "-v", "error",
             "-select_streams", "v:0",
-            "-show_entries", "stream=avg_frame_rate",
-            "-of", "default=noprint_wrappers=1:nokey=1",
+            "-show_entries", "format=duration:stream=avg_frame_rate",
+            "-of", "json",
             str(path)
         ]
-        fps_out = subprocess.check_output(cmd_fps, stderr=subprocess.STDOUT, text=True).strip()
-        if "/" in fps_out and fps_out != "0/0":
-            num, den = fps_out.split("/")
-            fps = (float(num) / float(den)) if float(den) else 0.0
-        else:
-            fps = float(fps_out)
+        out = json.loads(subprocess.check_output(cmd, stderr=subprocess.DEVNULL, text=True))
+        duration = float(out["format"]["duration"])
+        fps = parse_frame_rate(out["streams"][0]["avg_frame_rate"])
         if not (0.1 <= fps <= 1000):
             fps = None
         if duration <= 0:
@@ -96,21 +140,154 @@ def probe_with_opencv(path: Path) -> Optional[Tuple[float, float]]:
         cap.release()
         return None
 
-def get_duration_fps(path: Path, use_probe: bool, default_duration: float, default_fps: float) -> Tuple[float, float]:
+class ProbeCache:
+    """
+    Sidecar JSONL cache of probe results, one record per clip:
+      {"rel_path": "...", "size": <bytes>, "mtime_ns": <int>, "duration_s": <float>, "fps": <float>}
+    A record is reused only while the file's size and mtime are unchanged. save() keeps
+    only the records looked up or stored during this run, so deleted clips drop out.
+    """
+
+    def __init__(self, path: Path, refresh: bool = False):
+        self.path = path
+        self.records: dict[str, dict] = {}
+        self.live: dict[str, dict] = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if refresh or not path.exists():
+            return
+        with path.open("r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                    self.records[rec["rel_path"]] = rec
+                except (ValueError, KeyError):
+                    continue  # tolerate a truncated/corrupt line; that clip is just re-probed
+
+    @staticmethod
+    def signature(path: Path) -> Tuple[int, int]:
+        st = path.stat()
+        return (st.st_size, st.st_mtime_ns)
+
+    def get(self, rel_path: str, sig: Tuple[int, int]) -> Optional[Tuple[float, float]]:
+        rec = self.records.get(rel_path)
+        with self._lock:
+            if rec is None or (rec["size"], rec["mtime_ns"]) != sig:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.live[rel_path] = rec
+        return (rec["duration_s"], rec["fps"])
+
+    def put(self, rel_path: str, sig: Tuple[int, int], meta: Tuple[float, float]) -> None:
+        rec = {"rel_path": rel_path, "size": sig[0], "mtime_ns": sig[1], "duration_s": meta[0], "fps": meta[1]}
+        with self._lock:
+            self.live[rel_path] = rec
+
+    def save(self) -> None:
+        atomic_write(self.path, lambda f: f.writelines(json.dumps(self.live[key], separators=(",", ":")) + "\n"
+                                                       for key in sorted(self.live)))
+
+def get_duration_fps(path: Path, use_probe: bool, default_duration: float, default_fps: float,
+                     cache: Optional[ProbeCache] = None, cache_key: Optional[str] = None) -> Tuple[float, float]:
     if not use_probe:
         return (float(default_duration), float(default_fps))
-    meta = probe_with_ffprobe(path)
+    meta = None
+    sig = None
+    if cache is not None and cache_key is not None:
+        sig = ProbeCache.signature(path)
+        meta = cache.get(cache_key, sig)
     if meta is None:
-        meta = probe_with_opencv(path)
+        meta = probe_with_mp4_header(path)
+        if meta is None:
+            meta = probe_with_ffprobe(path)
+        if meta is None:
+            meta = probe_with_opencv(path)
+        if meta is not None and sig is not None:
+            cache.put(cache_key, sig, meta)
     if meta is None:
         return (float(default_duration), float(default_fps))
     return meta
 
+def parse_ladder(spec: str) -> list[tuple[int, int]]:
+    """'720,480:800,360' -> [(720, 2500), (480, 800), (360, 600)]: (height, kbps), highest first."""
+    ladder = []
+    for item in spec.split(","):
+        height, _, kbps = item.strip().lower().removesuffix("p").partition(":")
+        h = int(height)
+        if kbps:
+            ladder.append((h, int(kbps.removesuffix("k"))))
+        elif h in DEFAULT_KBPS:
+            ladder.append((h, DEFAULT_KBPS[h]))
+        else:
+            raise ValueError(f"No default bitrate for {h}p; use {h}:<kbps>")
+    return sorted(set(ladder), reverse=True)
+
+class RenditionLadder:
+    """
+    Encodes (or reuses) the lower-bitrate renditions of a clip and describes them:
+      [{"label": "source"|"<h>p", "rel_path", "width", "height", "bytes", "bitrate_kbps"}, ...]
+    source first, then the ladder from highest to lowest. Heights at or above the source's
+    are skipped (no upscaling). Each rung's directory is tagged with the hash of its encode
+    settings, so an existing rendition is reused only if it was encoded with the same
+    kbps, preset and ffmpeg and is newer than its source.
+    """
+
+    def __init__(self, root: Path, ladder: list[tuple[int, int]], preset: str = "veryfast", threads: int = 1):
+        self.root = root
+        self.ladder = ladder
+        self.preset = preset
+        self.threads = threads
+        version = ffmpeg_version()
+        self.dirs = {}
+        for height, kbps in ladder:
+            tag = settings_hash(rendition_args(height, kbps, preset, threads), version)[:8]
+            self.dirs[height, kbps] = f"{RENDITIONS_DIR}/{height}p-{tag}"
+
+    @staticmethod
+    def describe(label: str, rel_path: str, path: Path, info: Optional[Mp4Info]) -> dict:
+        size = path.stat().st_size
+        duration = info.duration_s if info else 0.0
+        return {
+            "label": label,
+            "rel_path": rel_path,
+            "width": (info.width or None) if info else None,
+            "height": (info.height or None) if info else None,
+            "bytes": size,
+            "bitrate_kbps": round(size * 8 / duration / 1000) if duration > 0 else None,
+        }
+
+    def build(self, rel_path: str, src: Path) -> list[dict]:
+        info = probe_mp4(src)
+        out = [self.describe("source", rel_path, src, info)]
+        src_mtime = src.stat().st_mtime_ns
+        for height, kbps in self.ladder:
+            if info is not None and info.height and height >= info.height:
+                continue
+            rel = f"{self.dirs[height, kbps]}/{rel_path}"
+            dst = self.root / rel
+            dst_info = probe_mp4(dst) if dst.exists() and dst.stat().st_mtime_ns >= src_mtime else None
+            if dst_info is None:
+                err = transcode(src, dst, rendition_args(height, kbps, self.preset, self.threads))
+                if err:
+                    print(f"[WARN] {rel}: {err}", file=sys.stderr)
+                    continue
+                dst_info = probe_mp4(dst)
+            out.append(self.describe(f"{height}p", rel, dst, dst_info))
+        return out
+
 def stable_uuid_for(rel_path: str) -> str:
     return str(uuid.uuid5(uuid.NAMESPACE_URL, rel_path))
 
-def build_entry(rel_path: Path, default_duration: float, default_fps: float, use_probe: bool):
+def build_entry(rel_path: Path, default_duration: float, default_fps: float, use_probe: bool,
+                root: Optional[Path] = None, cache: Optional[ProbeCache] = None,
+                renditions: Optional[RenditionLadder] = None):
     # rel_path: <scenario>/<variant>/<agent>/<route_id>/clip_###.mp4
+    # root: dataset root the file is probed under (defaults to the current directory)
     parts = rel_path.parts
     if len(parts) < 5:
         raise ValueError(f"Unexpected path layout: {rel_path}")
@@ -127,38 +304,167 @@ def build_entry(rel_path: Path, default_duration: float, default_fps: float, use
         raise ValueError(f"Filename does not match clip_###.mp4: {rel_path}")
     clip_idx = int(m.group(1))
 
-    duration_s, fps = get_duration_fps(rel_path, use_probe, default_duration, default_fps)
+    rel_str = str(rel_path).replace(os.sep, "/")
+    abs_path = root / rel_path if root is not None else rel_path
+    duration_s, fps = get_duration_fps(abs_path, use_probe, default_duration, default_fps,
+                                       cache=cache, cache_key=rel_str)
 
-    return {
-        "id": stable_uuid_for(str(rel_path).replace(os.sep, "/")),
+    entry = {
+        "id": stable_uuid_for(rel_str),
         "scenario": scenario,
         "variant": variant,
         "agent": agent,
         "route_id": route_id,
         "clip_idx": clip_idx,
-        "rel_path": str(rel_path).replace(os.sep, "/"),
+        "rel_path": rel_str,
         "duration_s": round(float(duration_s), 6),
         "fps": float(fps),
     }
+    if renditions is not None:
+        entry["renditions"] = renditions.build(rel_str, abs_path)
+    return entry
+
+def sort_key(e: dict) -> tuple:
+    return (e["scenario"], e["variant"], e["agent"], e["route_id"], e["clip_idx"])
+
+def _subdirs(path: str) -> list[str]:
+    with os.scandir(path) as it:
+        return sorted(e.name for e in it if e.is_dir())
+
+def _route_int(name: str) -> Optional[int]:
+    try:
+        return int(name)
+    except ValueError:
+        return None
+
+def scan(root: Path) -> Iterator[Path]:
+    """
+    Yield all .mp4 files under: <scenario>/<variant>/<agent>/<route_id>/clip_*.mp4
+
+    Walks with os.scandir one directory at a time and yields paths in catalogue
+    order (see sort_key): route folders numerically, clips by index, ties broken by
+    name exactly as a stable sort of the lexicographic listing would.
+    """
+    for scen in _subdirs(root):
+        if scen in (RENDITIONS_DIR, THUMBNAILS_DIR):
+            continue
+        scen_path = os.path.join(root, scen)
+        for variant in _subdirs(scen_path):
+            variant_path = os.path.join(scen_path, variant)
+            for agent in _subdirs(variant_path):
+                agent_path = os.path.join(variant_path, agent)
+                # Routes whose names parse to the same integer ("3", "03") interleave by clip index.
+                by_route = defaultdict(list)
+                for route in _subdirs(agent_path):
+                    by_route[_route_int(route)].append(route)
+                for route_id in sorted(by_route, key=lambda r: (r is None, r or 0)):
+                    clips = []
+                    for route in by_route[route_id]:
+                        with os.scandir(os.path.join(agent_path, route)) as it:
+                            for e in it:
+                                if e.name.startswith("clip_") and e.name.endswith(".mp4"):
+                                    m = CLIP_RE.match(e.name)
+                                    clips.append((int(m.group(1)) if m else -1, route, e.name))
+                    for _idx, route, name in sorted(clips):
+                        yield Path(scen, variant, agent, route, name)
+
+def ordered_map(fn: Callable[[T], R], items: Iterable[T], jobs: int) -> Iterator[R]:
+    """
+    Like map(fn, items) but runs up to `jobs` calls concurrently on a thread pool.
+    Results are yielded in input order; at most a few windows of work are in flight.
+    """
+    if jobs <= 1:
+        yield from map(fn, items)
+        return
+    window = jobs * 4
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=jobs) as ex:
+        for item in items:
+            pending.append(ex.submit(fn, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
 
-def scan(root: Path) -> list[Path]:
-    """Return all .mp4 files under: <scenario>/<variant>/<agent>/<route_id>/clip_*.mp4"""
-    paths = []
-    for scen_dir in sorted([p for p in root.iterdir() if p.is_dir()]):
-        for variant_dir in sorted([p for p in scen_dir.iterdir() if p.is_dir()]):
-            for agent_dir in sorted([p for p in variant_dir.iterdir() if p.is_dir()]):
-                for route_dir in sorted([p for p in agent_dir.iterdir() if p.is_dir()]):
-                    for clip in sorted(route_dir.glob("clip_*.mp4")):
-                        paths.append(clip.relative_to(root))
-    return paths
+def build_entries(rel_paths: Iterable[Path], root: Path, default_duration: float, default_fps: float,
+                  use_probe: bool, jobs: int = 1, cache: Optional[ProbeCache] = None,
+                  renditions: Optional[RenditionLadder] = None) -> Iterator[dict]:
+    """Build catalogue entries (probing/encoding in parallel when jobs > 1), printing [SKIP] for failures."""
+    def work(rp: Path):
+        try:
+            entry = build_entry(rp, default_duration, default_fps, use_probe, root=root, cache=cache,
+                                renditions=renditions)
+            return rp, entry, None
+        except Exception as e:
+            return rp, None, e
+
+    for rp, entry, err in ordered_map(work, rel_paths, jobs):
+        if err is not None:
+            print(f"[SKIP] {rp}: {err}", file=sys.stderr)
+            continue
+        yield entry
+
+def read_jsonl(path: Path) -> Iterator[dict]:
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def external_sort(entries: Iterable[dict], key: Callable[[dict], tuple], tmp_dir: Path,
+                  run_size: int = 100_000) -> Iterator[dict]:
+    """Sort entries with bounded memory: sorted runs of run_size spilled to JSONL, then k-way merged."""
+    it = iter(entries)
+    runs = []
+    try:
+        while True:
+            chunk = list(itertools.islice(it, run_size))
+            if not chunk:
+                break
+            chunk.sort(key=key)
+            fd, name = tempfile.mkstemp(prefix="catalogue-run-", suffix=".jsonl", dir=tmp_dir)
+            os.close(fd)
+            run = Path(name)
+            write_jsonl(chunk, run)
+            runs.append(run)
+        yield from heapq.merge(*(read_jsonl(r) for r in runs), key=key)
+    finally:
+        for r in runs:
+            r.unlink(missing_ok=True)
+
+class OrderCheck:
+    """Pass entries through while noting whether they arrive in sort_key order."""
+
+    def __init__(self, entries: Iterable[dict]):
+        self.entries = entries
+        self.sorted = True
+
+    def __iter__(self) -> Iterator[dict]:
+        prev = None
+        for e in self.entries:
+            k = sort_key(e)
+            if prev is not None and k < prev:
+                self.sorted = False
+            prev = k
+            yield e
 
 def main():
     ap = argparse.ArgumentParser(description="Generate master catalogue clip_paris.json")
     ap.add_argument("--root", type=Path, default=Path("video"), help="Dataset root containing scenario/variant/agent/route directories")
     ap.add_argument("--out", type=Path, default=Path("clip_paris.json"), help="Output JSON file")
+    ap.add_argument("--format", choices=["json", "jsonl", "sqlite"], default="json",
+                    help="json: one indented array; jsonl: one entry per line, written as entries are built;"
+                         " sqlite: indexed catalogue store for gen_pair.py")
     ap.add_argument("--default-duration", type=float, default=4.0, help="Fallback duration (s) when not probing")
     ap.add_argument("--default-fps", type=float, default=10.0, help="Fallback FPS when not probing")
     ap.add_argument("--probe", action="store_true", help="Probe video files for true duration/FPS")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Parallel probe workers (with --probe)")
+    ap.add_argument("--probe-cache", type=Path, help="Probe cache file (default: <out>.probecache.jsonl)")
+    ap.add_argument("--no-probe-cache", action="store_true", help="Do not read or write the probe cache")
+    ap.add_argument("--refresh-probe-cache", action="store_true", help="Ignore cached probe results and re-probe every clip")
+    ap.add_argument("--renditions", type=str,
+                    help="Rendition ladder to encode and record, e.g. '720,480,360' or '480:800,360:500' (height[:kbps])")
+    ap.add_argument("--preset", default="veryfast", help="x264 preset for --renditions")
+    instrument.add_stats_args(ap)
     args = ap.parse_args()
 
     root = args.root.resolve()
@@ -166,27 +472,57 @@ def main():
         print(f"[ERROR] Root not found: {root}", file=sys.stderr)
         sys.exit(1)
 
-    rel_paths = scan(root)
-    if not rel_paths:
-        print(f"[WARN] No clips found under {root}", file=sys.stderr)
+    cache = None
+    if args.probe and not args.no_probe_cache:
+        cache_path = args.probe_cache or args.out.with_name(args.out.name + ".probecache.jsonl")
+        cache = ProbeCache(cache_path, refresh=args.refresh_probe_cache)
 
-    entries = []
-    for rp in rel_paths:
+    renditions = None
+    if args.renditions:
         try:
-            entry = build_entry(
-                rp,
-                default_duration=args.default_duration,
-                default_fps=args.default_fps,
-                use_probe=args.probe,
-            )
-            entries.append(entry)
-        except Exception as e:
-            print(f"[SKIP] {rp}: {e}", file=sys.stderr)
+            ladder = parse_ladder(args.renditions)
+        except ValueError as e:
+            ap.error(f"--renditions: {e}")
+        renditions = RenditionLadder(root, ladder, args.preset, threads=max(1, (os.cpu_count() or 1) // args.jobs))
+
+    with instrument.Stats.from_args("gen_catalogue.py", args) as stats:
+        entries = OrderCheck(stats.iter("build", build_entries(
+            stats.iter("scan", scan(root)),
+            root,
+            default_duration=args.default_duration,
+            default_fps=args.default_fps,
+            use_probe=args.probe,
+            jobs=args.jobs if args.probe or renditions else 1,
+            cache=cache,
+            renditions=renditions,
+        )))
+        writer = {"jsonl": write_jsonl, "sqlite": catalogue_db.write_db}.get(args.format, write_json_array)
+        with stats.phase("write") as ph:
+            count = ph.items = writer(entries, args.out)
+        if cache is not None:
+            with stats.phase("cache-save"):
+                cache.save()
+            stats.count("probe_cache_hits", cache.hits)
+            stats.count("probe_cache_misses", cache.misses)
+            print(f"Probe cache: {cache.hits} hits, {cache.misses} probed ({cache.path})")
+        if not count:
+            print(f"[WARN] No clips found under {root}", file=sys.stderr)
 
-    entries.sort(key=lambda e: (e["scenario"], e["variant"], e["agent"], e["route_id"], e["clip_idx"]))
+        # scan() yields in catalogue order, so this only runs if the walk order and sort key disagree.
+        if not entries.sorted:
+            print("[WARN] Entries were not in catalogue order; sorting output", file=sys.stderr)
+            with stats.phase("sort"):
+                # every writer replaces args.out only once complete, so it can stream from it
+                if args.format == "jsonl":
+                    write_jsonl(external_sort(read_jsonl(args.out), sort_key, args.out.parent), args.out)
+                elif args.format == "sqlite":
+                    catalogue_db.write_db(external_sort(catalogue_db.iter_entries(args.out), sort_key, args.out.parent),
+                                          args.out)
+                else:
+                    data = json.loads(args.out.read_text(encoding="utf-8"))
+                    write_json_array(sorted(data, key=sort_key), args.out)
 
-    args.out.write_text(json.dumps(entries, indent=2) + "\n", encoding="utf-8")
-    print(f"Wrote {len(entries)} entries to {args.out}")
+    print(f"Wrote {count} entries to {args.out}")
 
 if __name__ == "__main__":
     main()
@@ -17,7 +17,40 @@ Pairing strategies (choose with --strategy):
 Notes:
 - Only clips that actually exist in both sides of a key are paired (sparse folders safe).
 - Description is placeholder = scenario label (you can post-process later).
+- Entries with "renditions" (gen_catalogue.py --renditions) add left_renditions and
+  right_renditions to their pairs: [{"label", "path", "width", "height", "bitrate_kbps",
+  "bytes"}, ...], paths with --path-prefix applied, for the player to pick by bandwidth.
+  Likewise "poster" and "sprite" (thumbnails.py) add left_poster/right_poster and
+  left_sprite/right_sprite ({"path", "cols", "rows", "count", "interval_s"}).
+- Pairs are deduplicated by path only; near_duplicates.py flags or drops pairs whose two
+  clips look the same (perceptual hashes) before clip_pairs.json is published.
 - Use --path-prefix to prepend e.g. "video/" to each rel_path in the output.
+- Pairs are written as they are produced (--format json for one array, jsonl for one per line).
+- --stream reads the catalogue incrementally (JSONL from `gen_catalogue.py --format jsonl`
+  is never fully loaded) and groups one (scenario, variant) block at a time, one scenario
+  for B, so memory is bounded by the largest block. The catalogue must be sorted as
+  gen_catalogue.py writes it; output is identical to the non-streaming run.
+- --engine columnar runs the same strategies on integer-coded NumPy columns
+  (pair_engine.py); output is identical to the default dict engine.
+  bench_pairs.py compares the two.
+- --catalogue may also be a SQLite store (gen_catalogue.py --format sqlite). By default
+  each strategy then reads one group at a time from a single grouped query (SQLite sorts
+  the selection; Python never regroups the whole catalogue in memory); output matches
+  the JSON catalogue.
+  --scenario/--variant/--agent (repeatable) and --route-min/--route-max pair only a
+  subset, and work with every catalogue format and mode.
+
+  python gen_pair.py --catalogue catalogue.sqlite --strategy B --scenario car_following --route-max 10
+- --stats, --stats-json FILE and --profile FILE report time, items and peak RSS per phase
+  (load, pair, records = dedupe and pair_ids, write), see instrument.py.
+- --previous clip_pairs.json extends an existing pair list for a grown catalogue: its pairs
+  and pair_ids are kept as they are, and only pairs involving clips it does not reference
+  yet are generated and appended (numbered after the largest existing pair_id), so
+  annotations keyed by pairId stay valid. Removed clips' pairs are kept; prune them
+  separately if needed.
+
+  python gen_pair.py --catalogue catalogue.json --previous clip_pairs.json \
+    --out clip_pairs.json --strategy A --path-prefix video
 
 Usage:
 
@@ -69,16 +102,156 @@ from collections import defaultdict
 import random
 import sys
 
-def load_catalogue(path: Path):
-    with path.open("r", encoding="utf-8") as f:
-        data = json.load(f)
-    # minimal validation
-    required = {"scenario","variant","agent","route_id","clip_idx","rel_path"}
-    for i, e in enumerate(data):
-        missing = required - set(e)
-        if missing:
-            raise ValueError(f"Entry {i} missing fields: {missing}")
-    return data
+import catalogue_db
+import instrument
+from json_io import iter_records, write_json_array, write_jsonl
+
+REQUIRED_FIELDS = {"scenario","variant","agent","route_id","clip_idx","rel_path"}
+# Optional per-clip player media, passed on as left_<field>/right_<field> (ClipFactory.media)
+MEDIA_FIELDS = ("renditions", "poster", "sprite")
+
+def validate_row(i: int, e: dict) -> dict:
+    missing = REQUIRED_FIELDS - set(e)
+    if missing:
+        raise ValueError(f"Entry {i} missing fields: {missing}")
+    return e
+
+class Clip:
+    """
+    Catalogue row reduced to the fields pairing needs. Strings are interned; `pid` is an
+    integer id for the output path and `order` an integer rank by the left/right
+    tiebreak key, so dedupe and ordering never compare path strings or build tuples.
+    """
+    __slots__ = ("scenario", "sid", "variant", "agent", "route_id", "clip_idx", "rel_path", "path", "pid", "order",
+                 "media")
+
+    def order_key(self) -> tuple:
+        # Priority: (variant, agent, route_id, clip_idx, rel_path)
+        return (self.variant, self.agent, self.route_id, self.clip_idx, self.rel_path)
+
+class ClipFactory:
+    """
+    Builds Clip records from catalogue dicts, interning strings and numbering output
+    paths and scenarios. With scoped=True the path numbering restarts whenever the
+    scenario changes; path ids then stay small while streaming, and remain unique
+    wherever they are compared (dedupe signatures include the scenario).
+    """
+
+    def __init__(self, path_prefix: str | None, scoped: bool = False):
+        self.path_prefix = path_prefix
+        self.scoped = scoped
+        self.paths: dict[str, int] = {}
+        self.scenarios: dict[str, int] = {}
+        self.last_scenario = None
+
+    def make(self, e: dict) -> Clip:
+        c = Clip()
+        c.scenario = sys.intern(e["scenario"])
+        c.variant = sys.intern(e["variant"])
+        c.agent = sys.intern(e["agent"])
+        c.route_id = e["route_id"]
+        c.clip_idx = e["clip_idx"]
+        c.rel_path = e["rel_path"]
+        c.path = self.output_path(c.rel_path)
+        if self.scoped and c.scenario != self.last_scenario:
+            self.paths.clear()
+            self.last_scenario = c.scenario
+        c.pid = self.paths.setdefault(c.path, len(self.paths))
+        c.sid = self.scenarios.setdefault(c.scenario, len(self.scenarios))
+        c.order = 0
+        c.media = self.media(e)
+        return c
+
+    def output_path(self, rel_path: str) -> str:
+        return norm_path(rel_path, self.path_prefix) if self.path_prefix is not None else rel_path
+
+    def media(self, e: dict) -> dict | None:
+        """
+        The entry's player media (MEDIA_FIELDS) with output paths: renditions from
+        gen_catalogue.py --renditions, poster and sprite from thumbnails.py.
+        """
+        media = {}
+        if e.get("renditions"):
+            media["renditions"] = [
+                {"label": r["label"], "path": self.output_path(r["rel_path"]), "width": r.get("width"),
+                 "height": r.get("height"), "bitrate_kbps": r.get("bitrate_kbps"), "bytes": r.get("bytes")}
+                for r in e["renditions"]
+            ]
+        if e.get("poster"):
+            media["poster"] = self.output_path(e["poster"])
+        if e.get("sprite"):
+            sprite = {k: v for k, v in e["sprite"].items() if k != "rel_path"}
+            media["sprite"] = {"path": self.output_path(e["sprite"]["rel_path"]), **sprite}
+        return media or None
+
+def assign_order(clips: list) -> list:
+    """Set each clip's `order` to its dense rank by Clip.order_key within `clips`."""
+    ranked = sorted(clips, key=Clip.order_key)
+    rank, prev = -1, None
+    for c in ranked:
+        key = c.order_key()
+        if key != prev:
+            rank, prev = rank + 1, key
+        c.order = rank
+    return clips
+
+def load_catalogue(path: Path, factory: ClipFactory, where: catalogue_db.ClipFilter | None = None) -> list:
+    """Load the whole catalogue (or the rows matching `where`) as Clip records with `order` assigned."""
+    return assign_order([factory.make(e) for e in iter_catalogue(path, where)])
+
+def iter_catalogue(path: Path, where: catalogue_db.ClipFilter | None = None):
+    """
+    Yield validated catalogue rows one at a time, in catalogue order, from a JSON array,
+    JSONL or SQLite catalogue (gen_catalogue.py --format json|jsonl|sqlite). `where`
+    selects a subset; the SQLite store applies it as an indexed query.
+    """
+    if catalogue_db.is_catalogue_db(path):
+        yield from catalogue_db.iter_entries(path, where)
+        return
+    for i, e in enumerate(iter_records(path)):
+        validate_row(i, e)
+        if not where or where.match(e):
+            yield e
+
+def db_pairs(path: Path, factory: ClipFactory, where: catalogue_db.ClipFilter, strategy: str,
+             pivot_map: dict | None, k: int, rng: random.Random):
+    """
+    Pairs from a SQLite catalogue (catalogue_db.py): the store hands over one group at a time
+    via an indexed query, in the same order the in-memory strategies visit groups, so the
+    output matches a run on the equivalent JSON catalogue.
+    """
+    agents_per_sv = catalogue_db.agents_by_scenario_variant(path, where) if strategy == "C" else None
+    for group in catalogue_db.iter_groups(path, GROUP_FIELDS[strategy], where):
+        clips = []
+        for e in group:
+            c = factory.make(e)
+            c.order = e["order"]
+            clips.append(c)
+        yield from build_pairs(clips, strategy, pivot_map, k, rng, agents_per_sv=agents_per_sv)
+
+def iter_blocks(rows, fields: tuple):
+    """
+    Split a stream of Clip records into contiguous blocks sharing the values of `fields`
+    (e.g. one (scenario, variant) at a time). Requires the catalogue to be sorted by those
+    fields, as gen_catalogue.py writes it; raises ValueError if a block (or a scenario)
+    reappears after it was closed.
+    """
+    closed_blocks, closed_scenarios = set(), set()
+    block_key, block = None, []
+    for r in rows:
+        key = tuple(getattr(r, f) for f in fields)
+        if key != block_key:
+            if block:
+                yield block
+                closed_blocks.add(block_key)
+                if key[0] != block_key[0]:
+                    closed_scenarios.add(block_key[0])
+            if key in closed_blocks or key[0] in closed_scenarios:
+                raise ValueError(f"Catalogue is not sorted by {fields}: {key} reappears; rerun without --stream")
+            block_key, block = key, []
+        block.append(r)
+    if block:
+        yield block
 
 def norm_path(rel_path: str, prefix: str | None) -> str:
     if not prefix:
@@ -100,52 +273,55 @@ def build_pairs_strategy_A(rows):
     """Cross-agent within same variant."""
     groups = defaultdict(list)  # key -> list of rows
     for r in rows:
-        key = (r["scenario"], r["variant"], r["route_id"], r["clip_idx"])
+        key = (r.scenario, r.variant, r.route_id, r.clip_idx)
         groups[key].append(r)
-    pairs = []
     for key, group in groups.items():
         # group by agent; ensure single clip per agent per key
         by_agent = {}
         for r in group:
-            by_agent[r["agent"]] = r
+            by_agent[r.agent] = r
         # unordered agent pairs
         agent_pairs = pairwise_combinations(list(by_agent.keys()))
         for a1, a2 in agent_pairs:
-            pairs.append((by_agent[a1], by_agent[a2]))
-    return pairs
+            yield (by_agent[a1], by_agent[a2])
 
 def build_pairs_strategy_B(rows):
     """Cross-variant for same agent."""
     groups = defaultdict(list)  # key -> rows
     for r in rows:
-        key = (r["scenario"], r["agent"], r["route_id"], r["clip_idx"])
+        key = (r.scenario, r.agent, r.route_id, r.clip_idx)
         groups[key].append(r)
-    pairs = []
     for key, group in groups.items():
         # by variant
         by_variant = {}
         for r in group:
-            by_variant[r["variant"]] = r
+            by_variant[r.variant] = r
         variant_pairs = pairwise_combinations(list(by_variant.keys()))
         for v1, v2 in variant_pairs:
-            pairs.append((by_variant[v1], by_variant[v2]))
-    return pairs
+            yield (by_variant[v1], by_variant[v2])
+
+def agents_by_scenario_variant(rows) -> dict:
+    agents_per_sv = defaultdict(set)  # (scenario, variant) -> {agents}
+    for r in rows:
+        agents_per_sv[(r.scenario, r.variant)].add(r.agent)
+    return agents_per_sv
 
-def build_pairs_strategy_C(rows, pivot_map: dict | None):
+def build_pairs_strategy_C(rows, pivot_map: dict | None, agents_per_sv: dict | None = None):
     """
     Baseline vs challenger (per variant).
     pivot_map: optional dict mapping variant -> baseline agent.
     If unspecified, pick lexicographically smallest agent present for that (scenario, variant).
+    agents_per_sv: agents present per (scenario, variant), when rows is only part of the
+    catalogue (incremental mode); computed from rows otherwise.
     """
     # index rows per (scenario, variant, route_id, clip_idx, agent)
     index = defaultdict(dict)  # key -> agent -> row
-    agents_per_sv = defaultdict(set)  # (scenario, variant) -> {agents}
     for r in rows:
-        k = (r["scenario"], r["variant"], r["route_id"], r["clip_idx"])
-        index[k][r["agent"]] = r
-        agents_per_sv[(r["scenario"], r["variant"])].add(r["agent"])
+        k = (r.scenario, r.variant, r.route_id, r.clip_idx)
+        index[k][r.agent] = r
+    if agents_per_sv is None:
+        agents_per_sv = agents_by_scenario_variant(rows)
 
-    pairs = []
     for k, by_agent in index.items():
         scen, variant, route_id, clip_idx = k
         # pick pivot agent
@@ -164,20 +340,18 @@ def build_pairs_strategy_C(rows, pivot_map: dict | None):
                 continue
             # pair baseline with every other agent that has this clip
             # keep deterministic order: (baseline, challenger)
-            pairs.append((base_row, row))
-    return pairs
+            yield (base_row, row)
 
 def build_pairs_strategy_D(rows, k: int, rng: random.Random):
     """Tournament sampling: within each (scenario, variant, route_id, clip_idx), sample k agents then pair all among them."""
     groups = defaultdict(list)
     for r in rows:
-        key = (r["scenario"], r["variant"], r["route_id"], r["clip_idx"])
+        key = (r.scenario, r.variant, r.route_id, r.clip_idx)
         groups[key].append(r)
-    pairs = []
     for key, group in groups.items():
         by_agent = {}
         for r in group:
-            by_agent[r["agent"]] = r
+            by_agent[r.agent] = r
         agents = list(by_agent.keys())
         if len(agents) < 2:
             continue
@@ -185,8 +359,108 @@ def build_pairs_strategy_D(rows, k: int, rng: random.Random):
             agents = rng.sample(agents, k)
         # all pairs among the sampled agents
         for a1, a2 in pairwise_combinations(sorted(agents)):
-            pairs.append((by_agent[a1], by_agent[a2]))
-    return pairs
+            yield (by_agent[a1], by_agent[a2])
+
+# Contiguous catalogue blocks that contain every group a strategy pairs within.
+BLOCK_FIELDS = {"A": ("scenario", "variant"), "B": ("scenario",), "C": ("scenario", "variant"), "D": ("scenario", "variant")}
+
+# Fields of the group key each strategy pairs within.
+GROUP_FIELDS = {
+    "A": ("scenario", "variant", "route_id", "clip_idx"),
+    "B": ("scenario", "agent", "route_id", "clip_idx"),
+    "C": ("scenario", "variant", "route_id", "clip_idx"),
+    "D": ("scenario", "variant", "route_id", "clip_idx"),
+}
+
+def build_pairs(rows, strategy: str, pivot_map: dict | None, k: int, rng: random.Random,
+                agents_per_sv: dict | None = None):
+    if strategy == "A":
+        return build_pairs_strategy_A(rows)
+    if strategy == "B":
+        return build_pairs_strategy_B(rows)
+    if strategy == "C":
+        return build_pairs_strategy_C(rows, pivot_map, agents_per_sv)
+    if strategy == "D":
+        return build_pairs_strategy_D(rows, k=k, rng=rng)
+    raise ValueError(f"Unknown strategy: {strategy}")
+
+def pair_records(pairs, id_width: int, scoped_dedupe: bool = False, start: int = 1):
+    """
+    Turn (Clip, Clip) pairs into clip_pairs.json records with deterministic left/right order,
+    dropping duplicates. With scoped_dedupe the seen-set is cleared whenever the scenario
+    changes, which is exact when pairs arrive grouped by scenario (the signature includes it).
+    start continues the numbering after an existing pair list (incremental mode).
+    """
+    # Deduplicate pairs across groups by using (left_path, right_path, scenario) as a key,
+    # packed into one int from the interned path/scenario ids.
+    # Use deterministic left/right ordering (Clip.order is the rank of the tiebreak key):
+    seen = set()
+    scenario = None
+    counter = start
+    for r1, r2 in pairs:
+        left, right = (r1, r2) if r1.order <= r2.order else (r2, r1)
+
+        if scoped_dedupe and left.sid != scenario:
+            seen.clear()
+            scenario = left.sid
+
+        # dedupe key
+        sig = (left.pid << 64) | (right.pid << 32) | left.sid
+        if sig in seen:
+            continue
+        seen.add(sig)
+
+        rec = {
+            "pair_id": next_pair_id(counter, width=id_width),
+            "left_clip": left.path,
+            "right_clip": right.path,
+            "description": left.scenario,  # placeholder per your note
+        }
+        if left.media or right.media:
+            add_media(rec, left.media, right.media)
+        yield rec
+        counter += 1
+
+def add_media(rec: dict, left: dict | None, right: dict | None) -> None:
+    """Add left_<field>/right_<field> for each media field either clip has (None for the other)."""
+    left, right = left or {}, right or {}
+    for field in MEDIA_FIELDS:
+        if field in left or field in right:
+            rec[f"left_{field}"] = left.get(field)
+            rec[f"right_{field}"] = right.get(field)
+
+class PreviousPairs:
+    """
+    An existing clip_pairs.json (JSON array or JSONL) that incremental mode extends.
+    Its records are kept verbatim, in order; new pair_ids continue after the largest
+    numeric pair_id.
+    """
+
+    def __init__(self, path: Path):
+        self.records = list(iter_records(path))
+        self.paths = set()
+        self.next_id = 1
+        for rec in self.records:
+            self.paths.add(rec["left_clip"])
+            self.paths.add(rec["right_clip"])
+            if str(rec.get("pair_id", "")).isdigit():
+                self.next_id = max(self.next_id, int(rec["pair_id"]) + 1)
+
+def incremental_pairs(clips: list, previous: PreviousPairs, strategy: str, pivot_map: dict | None,
+                      k: int, rng: random.Random):
+    """
+    Pairs that involve at least one clip not referenced by the previous pair list. Only the
+    groups containing such a clip are regrouped, so the work scales with the new clips.
+    Strategy D re-samples those groups; C still picks pivots from the full catalogue.
+    """
+    fields = GROUP_FIELDS[strategy]
+    new = {c.pid for c in clips if c.path not in previous.paths}
+    dirty = {tuple(getattr(c, f) for f in fields) for c in clips if c.pid in new}
+    rows = [c for c in clips if tuple(getattr(c, f) for f in fields) in dirty]
+    agents_per_sv = agents_by_scenario_variant(clips) if strategy == "C" else None
+    for r1, r2 in build_pairs(rows, strategy, pivot_map, k, rng, agents_per_sv=agents_per_sv):
+        if r1.pid in new or r2.pid in new:
+            yield r1, r2
 
 def main():
     ap = argparse.ArgumentParser(description="Generate clip_pairs.json from catalogue.json")
@@ -201,60 +475,81 @@ def main():
     ap.add_argument("--seed", type=int, default=42, help="Random seed (strategy D)")
     # Misc
     ap.add_argument("--id-width", type=int, default=6, help="Zero-pad width for pair_id")
+    ap.add_argument("--format", choices=["json", "jsonl"], default="json", help="Output as a JSON array or one pair per line")
+    ap.add_argument("--engine", choices=["dict", "columnar"], default="dict",
+                    help="dict: pure-Python grouping; columnar: NumPy engine in pair_engine.py (same output, much faster)")
+    ap.add_argument("--previous", type=Path,
+                    help="Existing clip_pairs.json to extend: keep its pairs and pair_ids, append pairs involving new clips")
+    ap.add_argument("--stream", action="store_true",
+                    help="Group the catalogue one block at a time (needs a catalogue sorted as gen_catalogue.py writes it)")
+    catalogue_db.add_filter_args(ap)
+    instrument.add_stats_args(ap)
     args = ap.parse_args()
-
-    rows = load_catalogue(args.catalogue)
-
-    # build pairs according to strategy
-    if args.strategy == "A":
-        pairs = build_pairs_strategy_A(rows)
-    elif args.strategy == "B":
-        pairs = build_pairs_strategy_B(rows)
-    elif args.strategy == "C":
-        pivot_map = None
-        if args.pivot_json:
-            with args.pivot_json.open("r", encoding="utf-8") as f:
-                pivot_map = json.load(f)
-        pairs = build_pairs_strategy_C(rows, pivot_map)
-    elif args.strategy == "D":
-        rng = random.Random(args.seed)
-        pairs = build_pairs_strategy_D(rows, k=args.k, rng=rng)
-    else:
-        print(f"Unknown strategy: {args.strategy}", file=sys.stderr)
-        sys.exit(2)
-
-    # Deduplicate pairs across groups by using (left_rel,right_rel,scenario) as a key.
-    # Use deterministic left/right ordering:
-    out_pairs = []
-    seen = set()
-    counter = 1
-    for r1, r2 in pairs:
-        # decide left/right with a stable tiebreaker
-        # Priority: (variant, agent, route_id, clip_idx, rel_path)
-        key1 = (r1["variant"], r1["agent"], r1["route_id"], r1["clip_idx"], r1["rel_path"])
-        key2 = (r2["variant"], r2["agent"], r2["route_id"], r2["clip_idx"], r2["rel_path"])
-        left, right = (r1, r2) if key1 <= key2 else (r2, r1)
-
-        left_path  = norm_path(left["rel_path"], args.path_prefix) if args.path_prefix is not None else left["rel_path"]
-        right_path = norm_path(right["rel_path"], args.path_prefix) if args.path_prefix is not None else right["rel_path"]
-
-        # dedupe key
-        sig = (left_path, right_path, left["scenario"])
-        if sig in seen:
-            continue
-        seen.add(sig)
-
-        out_pairs.append({
-            "pair_id": next_pair_id(counter, width=args.id_width),
-            "left_clip": left_path,
-            "right_clip": right_path,
-            "description": left["scenario"],  # placeholder per your note
-        })
-        counter += 1
-
-    # Write output
-    args.out.write_text(json.dumps(out_pairs, indent=2) + "\n", encoding="utf-8")
-    print(f"Wrote {len(out_pairs)} pairs to {args.out}")
+    where = catalogue_db.filter_from_args(args)
+
+    pivot_map = None
+    if args.strategy == "C" and args.pivot_json:
+        with args.pivot_json.open("r", encoding="utf-8") as f:
+            pivot_map = json.load(f)
+    rng = random.Random(args.seed)
+
+    if args.previous and (args.stream or args.engine != "dict"):
+        ap.error("--previous works with the default dict engine and without --stream")
+    if args.engine == "columnar":
+        if args.stream:
+            ap.error("--engine columnar works on the whole catalogue; drop --stream")
+        try:
+            import pair_engine
+        except ImportError as e:
+            ap.error(f"--engine columnar requires NumPy ({e})")
+
+    with instrument.Stats.from_args("gen_pair.py", args) as stats:
+        if args.previous:
+            with stats.phase("load") as ph:
+                previous = PreviousPairs(args.previous)
+                clips = load_catalogue(args.catalogue, ClipFactory(args.path_prefix), where)
+                ph.items = len(clips)
+            pairs = stats.iter("pair", incremental_pairs(clips, previous, args.strategy, pivot_map, args.k, rng))
+            records = itertools.chain(
+                previous.records,
+                stats.iter("records", pair_records(pairs, args.id_width, start=previous.next_id)),
+            )
+            print(f"Keeping {len(previous.records)} pairs from {args.previous}")
+        elif args.engine == "columnar":
+            with stats.phase("load") as ph:
+                clips = load_catalogue(args.catalogue, ClipFactory(args.path_prefix), where)
+                table = pair_engine.ClipTable(clips)
+                ph.items = len(clips)
+            with stats.phase("pair") as ph:
+                r1, r2 = pair_engine.build_pairs(table, args.strategy, pivot_map, args.k, rng)
+                ph.items = len(r1)
+            with stats.phase("order"):
+                ordered = pair_engine.ordered_pairs(table, r1, r2)
+            records = stats.iter("records", pair_engine.pair_records(table, *ordered, args.id_width))
+        elif args.stream:
+            # one (scenario, variant) block at a time (one scenario for B); dedupe is per scenario
+            factory = ClipFactory(args.path_prefix, scoped=True)
+            rows = stats.iter("load", (factory.make(e) for e in iter_catalogue(args.catalogue, where)))
+            pairs = itertools.chain.from_iterable(
+                build_pairs(assign_order(block), args.strategy, pivot_map, args.k, rng)
+                for block in iter_blocks(rows, BLOCK_FIELDS[args.strategy])
+            )
+            records = stats.iter("records", pair_records(stats.iter("pair", pairs), args.id_width, scoped_dedupe=True))
+        elif catalogue_db.is_catalogue_db(args.catalogue):
+            # groups are read from the database as they are paired, so "pair" includes the reads
+            pairs = db_pairs(args.catalogue, ClipFactory(args.path_prefix), where, args.strategy, pivot_map, args.k, rng)
+            records = stats.iter("records", pair_records(stats.iter("pair", pairs), args.id_width))
+        else:
+            with stats.phase("load") as ph:
+                rows = load_catalogue(args.catalogue, ClipFactory(args.path_prefix), where)
+                ph.items = len(rows)
+            pairs = stats.iter("pair", build_pairs(rows, args.strategy, pivot_map, args.k, rng))
+            records = stats.iter("records", pair_records(pairs, args.id_width))
+
+        writer = write_jsonl if args.format == "jsonl" else write_json_array
+        with stats.phase("write") as ph:
+            count = ph.items = writer(records, args.out)
+    print(f"Wrote {count} pairs to {args.out}")
 
 if __name__ == "__main__":
     main()
@@ -4,15 +4,32 @@ pair_clips.py — walk a directory, pair video clips by common prefix and agent,
 
 Filename assumptions (customisable via regex below):
   <prefix>__<scenario>__tpre...tpost...__agent<NUM>_<ROUTE>.mp4
+
+Files are found with a scandir walk (directories listed on --jobs threads) that visits them
+in the same order as Path.rglob, and names are parsed with one compiled pattern.
+
+Pairs are generated lazily and streamed to --out. --max-pairs-per-group N caps large groups
+(e.g. all-vs-all with --no-require-same-route) with a seeded uniform sample of N pairs, drawn
+by pair index without building the group's full product.
+
+With --previous <pairs.json> the existing pairs (and their pair_ids) are kept and only
+pairs involving clips not referenced there are appended, numbered after the largest pair_id.
 """
 
 import argparse
 import json
+import os
+import random
 import re
+import textwrap
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from itertools import combinations
+from itertools import accumulate, chain, combinations
 from collections import defaultdict
 
+from json_io import atomic_write
+
 # ---------- Tunable patterns ----------
 RE_AGENT = re.compile(r"__agent(\d+)_")
 RE_ROUTE = re.compile(r"__agent\d+_(\d+)$")
@@ -20,6 +37,26 @@ RE_ROUTE = re.compile(r"__agent\d+_(\d+)$")
 RE_TBLOCK = re.compile(r"__(tpre|tpost)", re.IGNORECASE)
 RE_SCENARIO_TAIL = re.compile(r"([A-Za-z]+(?:_[A-Za-z]+)*)$")
 
+# Single-pass form of the patterns above for well-formed names: "__"-separated chunks without
+# stray underscores, no chunk but the last starting with "agent", the first tpre/tpost chunk
+# not first. parse_filename falls back to the step-by-step parser for anything else, so the
+# results are identical.
+_CHUNK = r"[^_\n]+(?:_[^_\n]+)*"
+_TPRE = r"[Tt][Pp](?:[Rr][Ee]|[Oo][Ss][Tt])"
+RE_CLIP_NAME = re.compile(rf"""
+    (?P<base>
+        (?:(?!agent|{_TPRE}){_CHUNK}__)*                           # chunks before the scenario chunk
+        (?:
+            (?=(?!agent|{_TPRE}){_CHUNK}__{_TPRE})                 # chunk right before the first tpre/tpost
+            (?:(?:[^_\n]+_)*[^_\n]*[^A-Za-z_\n]_?)?                # ...up to its trailing alpha/underscore run
+            (?P<scenario>[A-Za-z]+(?:_[A-Za-z]+)*)?__
+            (?={_TPRE}){_CHUNK}__
+            (?:(?!agent){_CHUNK}__)*
+        )?
+    )
+    agent(?P<agent>\d+)_(?P<route>\d+)\.[Mm][Pp]4
+""", re.VERBOSE)
+
 def extract_grouping_key_from_stem(stem: str) -> str | None:
     """
     Returns grouping key: everything before '__agent' including a trailing '__'.
@@ -53,6 +90,13 @@ def parse_filename(basename: str):
     """
     Returns (base_key, agent, route_id, scenario) or (None, None, None, None) on failure.
     """
+    m = RE_CLIP_NAME.fullmatch(basename) if "__agent" in basename else None
+    if m is not None and m.group("base"):
+        return (m.group("base"), "agent" + m.group("agent"), m.group("route"), m.group("scenario"))
+    return parse_filename_stepwise(basename)
+
+def parse_filename_stepwise(basename: str):
+    """parse_filename for names RE_CLIP_NAME does not cover: one regex per field."""
     if not basename.lower().endswith(".mp4"):
         return (None, None, None, None)
 
@@ -89,10 +133,147 @@ def parse_filename(basename: str):
 
     return (base_key, agent, route, scenario)
 
-def find_mp4s(root: Path):
-    for p in root.rglob("*.mp4"):
-        if p.is_file():
-            yield p
+def group_blocks(agent_map: dict, require_same_route: bool):
+    """
+    Yield the cartesian blocks of one base_key group as (lefts, rights, route_scenario):
+    every (path, scenario) in lefts pairs with every one in rights. route_scenario is the
+    scenario shared by a matched route, or None for all-vs-all blocks.
+    """
+    agents = sorted(agent_map.keys())
+    for a1, a2 in combinations(agents, 2):
+        left_list = agent_map[a1]
+        right_list = agent_map[a2]
+
+        if not require_same_route:
+            # all-vs-all across these two agents
+            yield [(p, s) for _r, p, s in left_list], [(p, s) for _r, p, s in right_list], None
+        else:
+            # match only when route ids are equal (and not None)
+            # Build dict from route -> list of paths for each agent
+            by_route_left = defaultdict(list)
+            by_route_right = defaultdict(list)
+            scen_for_route = {}
+
+            for (r, path, scen) in left_list:
+                if r:
+                    by_route_left[r].append((path, scen))
+                    scen_for_route.setdefault(r, scen)
+            for (r, path, scen) in right_list:
+                if r:
+                    by_route_right[r].append((path, scen))
+                    scen_for_route.setdefault(r, scen_for_route.get(r) or scen)
+
+            # For each route present in both agents, a Cartesian product
+            for r in sorted(set(by_route_left.keys()) & set(by_route_right.keys()), key=lambda x: (len(x), x)):
+                yield by_route_left[r], by_route_right[r], scen_for_route.get(r)
+
+def _block_pair(block, i: int, j: int):
+    lefts, rights, route_scen = block
+    lp, scen1 = lefts[i]
+    rp, scen2 = rights[j]
+    return lp, rp, route_scen or scen1 or scen2 or "unknown_scenario"
+
+def iter_group_pairs(agent_map: dict, require_same_route: bool,
+                     max_pairs: int | None = None, rng: random.Random | None = None):
+    """
+    Yield (left_path, right_path, scenario) for the cross-agent pairs within one base_key group.
+    With max_pairs, a group with more candidate pairs keeps a uniform random sample of
+    max_pairs of them (drawn from rng), still in generation order. The sample is drawn
+    from pair indices, so the full product is never built.
+    """
+    blocks = list(group_blocks(agent_map, require_same_route))
+    sizes = [len(lefts) * len(rights) for lefts, rights, _ in blocks]
+    total = sum(sizes)
+    if max_pairs is None or total <= max_pairs:
+        for block, size in zip(blocks, sizes):
+            width = len(block[1])
+            for k in range(size):
+                yield _block_pair(block, k // width, k % width)
+        return
+
+    ends = list(accumulate(sizes))
+    for k in sorted(rng.sample(range(total), max_pairs)):
+        b = bisect_right(ends, k)
+        k -= ends[b - 1] if b else 0
+        width = len(blocks[b][1])
+        yield _block_pair(blocks[b], k // width, k % width)
+
+def write_pairs(records, out_path: Path, pretty: bool) -> int:
+    """
+    Stream records as the same text json.dumps(list, indent=2 or compact) would produce,
+    into a temporary file that replaces out_path once complete (json_io.atomic_write).
+    """
+    def write(f) -> int:
+        n = 0
+        for rec in records:
+            if pretty:
+                f.write("[\n" if n == 0 else ",\n")
+                f.write(textwrap.indent(json.dumps(rec, indent=2), "  "))
+            else:
+                f.write("[" if n == 0 else ",")
+                f.write(json.dumps(rec, separators=(",", ":")))
+            n += 1
+        if n == 0:
+            f.write("[]")
+        else:
+            f.write("\n]" if pretty else "]")
+        return n
+    return atomic_write(out_path, write)
+
+def _list_dir(path: str) -> tuple[list[str], list[str]]:
+    """(*.mp4 file names, subdirectory names) of one directory, in scandir order."""
+    files, subdirs = [], []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.name.endswith(".mp4") and entry.is_file():
+                        files.append(entry.name)
+                    elif entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                except OSError:
+                    continue
+    except PermissionError:
+        pass
+    return files, subdirs
+
+def find_mp4s(root: Path, jobs: int = 1):
+    """
+    Yield (path relative to root, file name) for *.mp4 files in Path.rglob order: each
+    directory's files, then its subdirectories depth-first, in scandir order. With jobs > 1
+    directories are listed on worker threads, ahead of the consumer.
+    """
+    def visit(rel: str):
+        # rel is "" for root, else "<dir>/" (os.sep-terminated)
+        files, subdirs = _list_dir(os.path.join(root, rel))
+        return files, [rel + d + os.sep for d in subdirs]
+
+    if jobs <= 1:
+        stack = [""]
+        while stack:
+            rel = stack.pop()
+            files, children = visit(rel)
+            for name in files:
+                yield rel + name, name
+            stack.extend(reversed(children))
+        return
+
+    pool = ThreadPoolExecutor(max_workers=jobs)
+
+    def visit_ahead(rel: str):
+        files, children = visit(rel)
+        return files, [(c, pool.submit(visit_ahead, c)) for c in children]
+
+    try:
+        stack = [("", pool.submit(visit_ahead, ""))]
+        while stack:
+            rel, fut = stack.pop()
+            files, children = fut.result()
+            for name in files:
+                yield rel + name, name
+            stack.extend(reversed(children))
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
 
 def main():
     ap = argparse.ArgumentParser(description="Generate JSON pairs for clip files with agent variants.")
@@ -104,6 +285,13 @@ def main():
     ap.add_argument("--no-require-same-route", action="store_true",
                     help="Pair across agents even if the route ids differ")
     ap.add_argument("--pretty", action="store_true", help="Pretty-print JSON with indentation")
+    ap.add_argument("--previous", type=str,
+                    help="Existing pairs JSON to extend: keep its pairs and pair_ids, append only pairs involving new clips")
+    ap.add_argument("--max-pairs-per-group", type=int,
+                    help="Keep at most this many pairs per base_key group (seeded uniform sample, in generation order)")
+    ap.add_argument("--seed", type=int, default=42, help="Random seed for --max-pairs-per-group")
+    ap.add_argument("--jobs", type=int, default=min(32, os.cpu_count() or 1),
+                    help="Threads listing directories in parallel (1 = sequential walk)")
     ap.add_argument("--report-nonpaired", action="store_true",
                     help="Also print a summary of total one-to-one pairs and non-paired groups (agent1 vs agent2).")
     args = ap.parse_args()
@@ -115,19 +303,22 @@ def main():
     # Group structure: {(base_key): {agent: [(route, path, scenario), ...]}}
     groups: dict[str, dict[str, list[tuple[str | None, str, str | None]]]] = defaultdict(lambda: defaultdict(list))
 
+    # same strings as str(Path(args.prefix) / rel)
+    prefix = os.path.join(str(Path(args.prefix)), "") if args.prefix else ""
+    if prefix == os.curdir + os.sep:
+        prefix = ""
     total = 0
     skipped = 0
-    for p in find_mp4s(root):
+    for rel, name in find_mp4s(root, args.jobs):
         total += 1
-        base_key, agent, route, scenario = parse_filename(p.name)
+        base_key, agent, route, scenario = parse_filename(name)
         if not (base_key and agent):
             skipped += 1
             continue
         if args.abs_paths:
-            path_str = str(p.resolve())
+            path_str = str((root / rel).resolve())
         else:
-            rel = p.relative_to(root)
-            path_str = str(Path(args.prefix) / rel) if args.prefix else str(rel)
+            path_str = prefix + rel
         groups[base_key][agent].append((route, path_str, scenario))
 
     # summary
@@ -142,65 +333,43 @@ def main():
             print("All groups have both agent1 and agent2.")
 
     # Build pairs.json (existing behaviour preserved)
-    pairs = []
+    previous = []
     pair_counter = 1
+    known_paths = set()
+    if args.previous:
+        previous = json.loads(Path(args.previous).expanduser().read_text(encoding="utf-8"))
+        for rec in previous:
+            known_paths.add(rec["left_clip"])
+            known_paths.add(rec["right_clip"])
+            if str(rec.get("pair_id", "")).isdigit():
+                pair_counter = max(pair_counter, int(rec["pair_id"]) + 1)
+    rng = random.Random(args.seed)
 
-    # For each base_key, pair across agents
-    for base_key, agent_map in groups.items():
-        agents = sorted(agent_map.keys())
-        for a1, a2 in combinations(agents, 2):
-            left_list = agent_map[a1]
-            right_list = agent_map[a2]
-
-            if args.no_require_same_route:
-                # all-vs-all across these two agents
-                for (_r1, left_path, scen1) in left_list:
-                    for (_r2, right_path, scen2) in right_list:
-                        scenario = scen1 or scen2 or "unknown_scenario"
-                        pairs.append({
-                            "pair_id": f"{pair_counter:06d}",
-                            "left_clip": left_path,
-                            "right_clip": right_path,
-                            "description": scenario
-                        })
-                        pair_counter += 1
-            else:
-                # match only when route ids are equal (and not None)
-                # Build dict from route -> list of paths for each agent
-                by_route_left = defaultdict(list)
-                by_route_right = defaultdict(list)
-                scen_for_route = {}
-
-                for (r, path, scen) in left_list:
-                    if r:
-                        by_route_left[r].append((path, scen))
-                        scen_for_route.setdefault(r, scen)
-                for (r, path, scen) in right_list:
-                    if r:
-                        by_route_right[r].append((path, scen))
-                        scen_for_route.setdefault(r, scen_for_route.get(r) or scen)
-
-                # For each route present in both agents, do Cartesian product
-                for r in sorted(set(by_route_left.keys()) & set(by_route_right.keys()), key=lambda x: (len(x), x)):
-                    for (lp, scen1) in by_route_left[r]:
-                        for (rp, scen2) in by_route_right[r]:
-                            scenario = scen_for_route.get(r) or scen1 or scen2 or "unknown_scenario"
-                            pairs.append({
-                                "pair_id": f"{pair_counter:06d}",
-                                "left_clip": lp,
-                                "right_clip": rp,
-                                "description": scenario
-                            })
-                            pair_counter += 1
+    def new_pairs():
+        counter = pair_counter
+        # For each base_key, pair across agents
+        for base_key, agent_map in groups.items():
+            if known_paths and all(path in known_paths for clips in agent_map.values() for _r, path, _s in clips):
+                continue  # incremental: nothing new in this group
+            for left_path, right_path, scenario in iter_group_pairs(
+                    agent_map, not args.no_require_same_route, args.max_pairs_per_group, rng):
+                if left_path in known_paths and right_path in known_paths:
+                    continue
+                yield {
+                    "pair_id": f"{counter:06d}",
+                    "left_clip": left_path,
+                    "right_clip": right_path,
+                    "description": scenario
+                }
+                counter += 1
 
     out_path = Path(args.out).expanduser().resolve()
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    if args.pretty:
-        out_path.write_text(json.dumps(pairs, indent=2), encoding="utf-8")
-    else:
-        out_path.write_text(json.dumps(pairs, separators=(",", ":")), encoding="utf-8")
+    count = write_pairs(chain(previous, new_pairs()), out_path, args.pretty)
 
-    print(f"Scanned: {total} files; Skipped (unparsable): {skipped}; Groups: {len(groups)}; Pairs: {len(pairs)}")
+    print(f"Scanned: {total} files; Skipped (unparsable): {skipped}; Groups: {len(groups)}; Pairs: {count}")
+    if args.previous:
+        print(f"Kept {len(previous)} pairs from {args.previous}; added {count - len(previous)}")
     print(f"Wrote: {out_path}")
 
 if __name__ == "__main__":
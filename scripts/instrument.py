@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Per-phase timing and memory stats for the pipeline scripts (gen_catalogue.py, gen_pair.py).
+
+A script splits its work into named phases, either blocks (`with stats.phase("write")`)
+or lazily consumed iterators (`stats.iter("scan", scan(root))`). Most of the pipeline is
+streamed, so phases nest: while writing pulls an entry, which pulls a scanned path, the
+clock runs for the innermost phase only. Each phase therefore reports its own time:
+"write" is serialization alone, not the scanning and probing it waits on.
+
+Per phase: wall time, CPU time (process-wide, so worker threads count towards the phase
+running in the main thread), the number of items an iterator phase yielded (or that a
+block set), and the process's peak RSS (high-water mark) when the phase last ran; as the
+peak only grows, the phase where it jumps is the one that allocated.
+
+Flags added by add_stats_args():
+  --stats             print the phase table to stderr at the end
+  --stats-json FILE   write the stats as JSON for dashboards:
+                        {"script", "argv", "started", "python", "host", "status",
+                         "wall_s", "cpu_s", "peak_rss_mb", "counters": {...},
+                         "phases": [{"name", "wall_s", "cpu_s", "items", "peak_rss_mb"}, ...]}
+  --profile FILE      run under cProfile and dump its stats to FILE (main thread only;
+                      inspect with `python -m pstats FILE` or snakeviz)
+Without these the wrappers hand back their arguments untouched, at no cost.
+
+Usage:
+  python gen_catalogue.py --root video --out catalogue.json --stats --stats-json catalogue.stats.json
+  python gen_pair.py --catalogue catalogue.json --strategy A --profile gen_pair.prof
+  python instrument.py catalogue.stats.json pairs.stats.json   # print saved stats
+"""
+
+import argparse
+import cProfile
+import json
+import platform
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from json_io import atomic_write
+
+RSS_SAMPLE_EVERY = 1024  # items between peak-RSS samples in iterator phases
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1 << 20 if sys.platform == "darwin" else 1 << 10)
+
+class Phase:
+    __slots__ = ("name", "wall_s", "cpu_s", "items", "peak_rss_mb", "_t", "_c")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wall_s = 0.0
+        self.cpu_s = 0.0
+        self.items = None
+        self.peak_rss_mb = 0.0
+        self._t = self._c = 0.0
+
+    def as_dict(self) -> dict:
+        return {"name": self.name, "wall_s": round(self.wall_s, 4), "cpu_s": round(self.cpu_s, 4),
+                "items": self.items, "peak_rss_mb": round(self.peak_rss_mb, 1)}
+
+class Stats:
+    """Phase timings of one script run; use as a context manager around the work."""
+
+    def __init__(self, script: str, show: bool = False, json_path: Optional[Path] = None,
+                 profile_path: Optional[Path] = None):
+        self.script = script
+        self.show = show
+        self.json_path = json_path
+        self.profile_path = profile_path
+        self.enabled = show or json_path is not None
+        self.phases: dict[str, Phase] = {}
+        self.counters: dict[str, int] = {}
+        self._stack: list[Phase] = []
+        self._profiler = None
+
+    @classmethod
+    def from_args(cls, script: str, args: argparse.Namespace) -> "Stats":
+        return cls(script, args.stats, args.stats_json, args.profile)
+
+    def __enter__(self) -> "Stats":
+        self._started = datetime.now(timezone.utc)
+        self._t0, self._c0 = time.perf_counter(), time.process_time()
+        if self.profile_path is not None:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.profile_path)
+            print(f"Profile written to {self.profile_path} (python -m pstats {self.profile_path})", file=sys.stderr)
+        if not self.enabled:
+            return
+        report = self.report("ok" if exc_type is None else f"error: {exc_type.__name__}")
+        if self.show:
+            print_report(report)
+        if self.json_path is not None:
+            atomic_write(self.json_path, lambda f: f.write(json.dumps(report, indent=2) + "\n"))
+
+    def _get(self, name: str) -> Phase:
+        ph = self.phases.get(name)
+        if ph is None:
+            ph = self.phases[name] = Phase(name)
+        return ph
+
+    def _enter(self, ph: Phase) -> None:
+        t, c = time.perf_counter(), time.process_time()
+        if self._stack:
+            outer = self._stack[-1]
+            outer.wall_s += t - outer._t
+            outer.cpu_s += c - outer._c
+        ph._t, ph._c = t, c
+        self._stack.append(ph)
+
+    def _exit(self, ph: Phase) -> None:
+        t, c = time.perf_counter(), time.process_time()
+        ph.wall_s += t - ph._t
+        ph.cpu_s += c - ph._c
+        self._stack.pop()
+        if self._stack:
+            outer = self._stack[-1]
+            outer._t, outer._c = t, c
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[Phase]:
+        """Time a block; set .items on the yielded Phase to record a count."""
+        if not self.enabled:
+            yield Phase(name)
+            return
+        ph = self._get(name)
+        self._enter(ph)
+        try:
+            yield ph
+        finally:
+            self._exit(ph)
+            ph.peak_rss_mb = peak_rss_mb()
+
+    def iter(self, name: str, iterable: Iterable) -> Iterable:
+        """Time the work of producing each item of iterable, and count the items."""
+        if not self.enabled:
+            return iterable
+        return self._timed(self._get(name), iterable)
+
+    def _timed(self, ph: Phase, iterable: Iterable) -> Iterator:
+        ph.items = ph.items or 0
+        it = iter(iterable)
+        try:
+            while True:
+                self._enter(ph)
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+                finally:
+                    self._exit(ph)
+                ph.items += 1
+                if ph.items % RSS_SAMPLE_EVERY == 0:
+                    ph.peak_rss_mb = peak_rss_mb()
+                yield item
+        finally:
+            ph.peak_rss_mb = peak_rss_mb()
+
+    def count(self, name: str, n: int = 1) -> None:
+        """Add to a named counter (e.g. cache hits) reported next to the phases."""
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def report(self, status: str = "ok") -> dict:
+        return {
+            "script": self.script,
+            "argv": sys.argv[1:],
+            "started": self._started.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "python": platform.python_version(),
+            "host": platform.node(),
+            "status": status,
+            "wall_s": round(time.perf_counter() - self._t0, 4),
+            "cpu_s": round(time.process_time() - self._c0, 4),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "counters": self.counters,
+            "phases": [ph.as_dict() for ph in self.phases.values()],
+        }
+
+def add_stats_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--stats", action="store_true", help="Print per-phase wall/CPU time, items and peak RSS to stderr")
+    ap.add_argument("--stats-json", type=Path, help="Write the per-phase stats as JSON to this file")
+    ap.add_argument("--profile", type=Path, help="Run under cProfile and write the profile dump to this file")
+
+def print_report(report: dict, file=sys.stderr) -> None:
+    print(f"{report['script']} ({report['status']}): {report['wall_s']:.2f}s wall, {report['cpu_s']:.2f}s CPU,"
+          f" peak RSS {report['peak_rss_mb']:.1f} MB", file=file)
+    print(f"  {'phase':<14} {'wall s':>9} {'cpu s':>9} {'items':>10} {'peak RSS MB':>12}", file=file)
+    for ph in report["phases"]:
+        items = "-" if ph["items"] is None else ph["items"]
+        print(f"  {ph['name']:<14} {ph['wall_s']:>9.3f} {ph['cpu_s']:>9.3f} {items:>10} {ph['peak_rss_mb']:>12.1f}",
+              file=file)
+    for name, n in report["counters"].items():
+        print(f"  {name}: {n}", file=file)
+
+def main():
+    ap = argparse.ArgumentParser(description="Print stats files written with --stats-json")
+    ap.add_argument("files", type=Path, nargs="+")
+    args = ap.parse_args()
+    for path in args.files:
+        try:
+            report = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"[SKIP] {path}: {e}", file=sys.stderr)
+            continue
+        print_report(report, file=sys.stdout)
+
+if __name__ == "__main__":
+    main()
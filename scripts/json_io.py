@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+JSON / JSONL file helpers shared by the pipeline scripts (catalogue, pairs, plans, stats).
+
+Output files are replaced atomically: atomic_write() writes a temporary file next to the
+target and renames it over the target only once complete, so a reader (the backend
+reloads its data files when they change, scripts read the catalogue they rewrite) never
+sees a half-written file. write_json_array() and write_jsonl() stream records through it:
+the array bytes are exactly those of json.dumps(list, indent=2) + newline, without
+building the list or the whole string.
+
+This module only depends on the standard library, so any script can import it.
+"""
+
+import json
+import os
+import textwrap
+from json.encoder import encode_basestring_ascii
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+def atomic_write(out, write: Callable[..., T], mode: str = "w") -> T:
+    """
+    Call write(f) on a temporary file next to out and rename it over out once write
+    returns. On error out is left as it was and the temporary file is removed.
+    Returns write's result.
+    """
+    out = Path(out)
+    tmp = out.with_name(out.name + ".tmp")
+    try:
+        with tmp.open(mode, encoding=None if "b" in mode else "utf-8") as f:
+            result = write(f)
+        os.replace(tmp, out)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return result
+
+def _json_scalar(v) -> str:
+    return encode_basestring_ascii(v) if isinstance(v, str) else json.dumps(v)
+
+def format_record(rec: dict) -> str:
+    """A record laid out exactly as json.dumps(list, indent=2) lays out its items."""
+    if not rec:
+        return "  {}"
+    if any(isinstance(v, (dict, list)) for v in rec.values()):
+        return textwrap.indent(json.dumps(rec, indent=2), "  ")
+    body = ",\n".join(f"    {_json_scalar(k)}: {_json_scalar(v)}" for k, v in rec.items())
+    return "  {\n" + body + "\n  }"
+
+def write_json_array(records: Iterable[dict], out: Path) -> int:
+    """Stream records as the same bytes json.dumps(list, indent=2) + newline would produce."""
+    def write(f) -> int:
+        n = 0
+        for rec in records:
+            f.write("[\n" if n == 0 else ",\n")
+            f.write(format_record(rec))
+            n += 1
+        f.write("\n]\n" if n else "[]\n")
+        return n
+    return atomic_write(out, write)
+
+def write_jsonl(records: Iterable[dict], out: Path) -> int:
+    def write(f) -> int:
+        n = 0
+        for rec in records:
+            f.write(json.dumps(rec) + "\n")
+            n += 1
+        return n
+    return atomic_write(out, write)
+
+def iter_records(path: Path) -> Iterator[dict]:
+    """
+    Yield the objects of a JSON array or JSONL file. JSONL is read line by line;
+    a JSON array is loaded whole and then iterated.
+    """
+    with path.open("r", encoding="utf-8") as f:
+        head = f.read(1)
+        while head and head.isspace():
+            head = f.read(1)
+        f.seek(0)
+        if head == "[":
+            yield from json.load(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
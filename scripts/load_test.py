@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Load-test the backend with a cohort of simulated annotators (asyncio, stdlib only).
+
+Each virtual annotator loops like the frontend: GET /clip-pairs, "watch" for a think time
+drawn from a log-normal (median --think-median seconds, shape --think-sigma, divided
+by --speedup), then POST /annotate with left/right/cant_tell, surprise ratings, stage
+durations and, when the pair asks for a region, a pause-sampling attention payload (one
+sample every --sample-ms over the clip, 0-3 points each). Golds are answered correctly
+with probability --gold-accuracy, and repeats are answered like the first time with
+probability --repeat-consistency, with the isGold/isRepeat/repeatOf fields the frontend
+sends. Every annotator keeps one keep-alive HTTP/1.1 connection.
+
+Throughput and p50/p95/p99 latency are reported per endpoint (--json writes them too).
+
+Tokens come from --tokens (backend/data/tokens.json). When there are fewer than
+--annotators, the rest are created through /admin/add-annotator (--admin-token, default
+$ADMIN_TOKEN).
+
+--spawn-server runs everything offline. It starts backend/loadtest_server.js (the API on
+in-memory stand-ins for the MongoDB models) on a free port, over a scratch copy of
+backend/data, and stops it afterwards. The backend's node_modules must be installed.
+
+Usage:
+  python load_test.py --spawn-server --annotators 200 --duration 60 --speedup 50
+  python load_test.py --url http://localhost:3000/api --annotators 20 --trials 30 --json load.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from json_io import atomic_write
+
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+RESPONSES = (("left", 0.45), ("right", 0.45), ("cant_tell", 0.10))
+
+class HttpClient:
+    """One keep-alive HTTP/1.1 connection; reconnects once if the server closed it."""
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.host, self.port, self.timeout = host, port, timeout
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def request(self, method: str, target: str, body: Optional[dict] = None) -> tuple[int, bytes]:
+        data = json.dumps(body).encode() if body is not None else b""
+        head = f"{method} {target} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nAccept: application/json\r\n"
+        if body is not None:
+            head += f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+        payload = head.encode() + b"\r\n" + data
+        for attempt in (0, 1):
+            reused = self.writer is not None
+            if not reused:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                self.writer.write(payload)
+                await self.writer.drain()
+                return await asyncio.wait_for(self._response(), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                if attempt or not reused:
+                    raise
+        raise AssertionError("unreachable")
+
+    async def _response(self) -> tuple[int, bytes]:
+        status = int((await self.reader.readuntil(b"\r\n")).split()[1])
+        headers = {}
+        while (line := await self.reader.readuntil(b"\r\n")) != b"\r\n":
+            k, _, v = line.decode("latin-1").partition(":")
+            headers[k.strip().lower()] = v.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            parts = []
+            while (size := int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16)):
+                parts.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+            await self.reader.readuntil(b"\r\n")
+            body = b"".join(parts)
+        else:
+            body = await self.reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, body
+
+class Stats:
+    def __init__(self):
+        self.latency: dict[str, list] = {}
+        self.status: dict[str, dict] = {}
+        self.counts = {"trials": 0, "gold": 0, "repeat": 0, "finished": 0}
+
+    def record(self, endpoint: str, seconds: float, status: int) -> None:
+        self.latency.setdefault(endpoint, []).append(seconds)
+        by_status = self.status.setdefault(endpoint, {})
+        by_status[status] = by_status.get(status, 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        out = {}
+        for endpoint, lat in self.latency.items():
+            lat = sorted(lat)
+            errors = sum(n for s, n in self.status[endpoint].items() if not 200 <= s < 300)
+            out[endpoint] = {
+                "requests": len(lat), "errors": errors, "status": {str(s): n for s, n in self.status[endpoint].items()},
+                "rps": len(lat) / elapsed if elapsed else 0.0,
+                **{f"p{q}_ms": 1000 * percentile(lat, q) for q in (50, 95, 99)},
+                "max_ms": 1000 * lat[-1],
+            }
+        return out
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(q / 100 * len(sorted_values)) - 1)]
+
+def think_time(rng: random.Random, median: float, sigma: float) -> float:
+    return median * math.exp(sigma * rng.gauss(0, 1))
+
+def pause_sampling(rng: random.Random, side: str, sample_ms: int, decision_ms: int) -> dict:
+    """Attention payload as the frontend's pause-sampling replay sends it."""
+    clip_ms = rng.randint(4000, 12000)
+    samples = [{"tsMs": t, "points": [{"x": rng.random(), "y": rng.random()} for _ in range(rng.randint(0, 3))]}
+               for t in range(sample_ms, clip_ms + 50, sample_ms)]
+    return {"type": "pause-sampling", "side": side, "coordSpace": "normalised",
+            "samples": samples, "decisionAtMs": decision_ms}
+
+def choose_response(rng: random.Random, pair: dict, meta: dict, answers: dict, args) -> str:
+    if meta.get("isGold") and meta.get("expected") in ("left", "right"):
+        if rng.random() < args.gold_accuracy:
+            return meta["expected"]
+        return "right" if meta["expected"] == "left" else "left"
+    if meta.get("isRepeat") and pair["pair_id"] in answers and rng.random() < args.repeat_consistency:
+        return answers[pair["pair_id"]]
+    return rng.choices([r for r, _w in RESPONSES], weights=[w for _r, w in RESPONSES])[0]
+
+async def annotator(client: HttpClient, base: str, token: str, rng: random.Random, stats: Stats,
+                    deadline: float, args) -> None:
+    answers: dict = {}
+    trials = 0
+    while time.monotonic() < deadline and (not args.trials or trials < args.trials):
+        t0 = time.perf_counter()
+        status, body = await client.request("GET", f"{base}/clip-pairs?token={urllib.parse.quote(token)}")
+        stats.record("GET /clip-pairs", time.perf_counter() - t0, status)
+        if status != 200:
+            await asyncio.sleep(1 / args.speedup)
+            continue
+        pair = json.loads(body)
+        if pair is None:
+            stats.counts["finished"] += 1
+            return
+        meta = pair.get("_meta") or {}
+        presented = datetime.now(timezone.utc)
+
+        think = think_time(rng, args.think_median, args.think_sigma)
+        await asyncio.sleep(think / args.speedup)
+
+        response = choose_response(rng, pair, meta, answers, args)
+        think_ms = int(think * 1000)
+        cant_tell = response == "cant_tell"
+        attention = None
+        if meta.get("requireRegion") and not cant_tell:
+            attention = pause_sampling(rng, response, args.sample_ms, int(think_ms * 0.6))
+        doc = {
+            "token": token,
+            "pairId": pair["pair_id"],
+            "response": response,
+            "surpriseChoice": None if cant_tell else rng.choice(["left", "right", "none"]),
+            "left": {"url": pair.get("left_clip"), "surprise": None if cant_tell else rng.randint(1, 5)},
+            "right": {"url": pair.get("right_clip"), "surprise": None if cant_tell else rng.randint(1, 5)},
+            "presentedTime": presented.isoformat().replace("+00:00", "Z"),
+            "responseTimeMs": think_ms,
+            "isGold": bool(meta.get("isGold")),
+            "isRepeat": bool(meta.get("isRepeat")),
+            "repeatOf": meta.get("repeatOf"),
+            "attention": attention,
+            "stageDurations": {"0": int(think_ms * 0.6), "1": int(think_ms * 0.1), "2": int(think_ms * 0.3)},
+        }
+        t0 = time.perf_counter()
+        status, _body = await client.request("POST", f"{base}/annotate", doc)
+        stats.record("POST /annotate", time.perf_counter() - t0, status)
+        if status == 200:
+            trials += 1
+            stats.counts["trials"] += 1
+            stats.counts["gold"] += bool(meta.get("isGold"))
+            stats.counts["repeat"] += bool(meta.get("isRepeat"))
+            if not meta.get("isGold") and not meta.get("isRepeat"):
+                answers[pair["pair_id"]] = response
+
+async def get_tokens(host: str, port: int, base: str, args) -> list:
+    tokens = []
+    if args.tokens.exists():
+        with args.tokens.open("r", encoding="utf-8") as f:
+            tokens = [t["token"] for t in json.load(f)][: args.annotators]
+    missing = args.annotators - len(tokens)
+    if missing <= 0:
+        return tokens
+    if not args.admin_token:
+        raise SystemExit(f"[ERROR] {len(tokens)} tokens in {args.tokens}, {args.annotators} annotators wanted, "
+                         "and no --admin-token to create the rest")
+    client = HttpClient(host, port, args.timeout)
+    run = f"{os.getpid()}-{int(time.time())}"
+    try:
+        for n in range(missing):
+            status, body = await client.request(
+                "POST", f"{base}/admin/add-annotator?token={urllib.parse.quote(args.admin_token)}",
+                {"annotatorId": f"loadtest-{run}-{n:05d}"})
+            if status != 200:
+                raise SystemExit(f"[ERROR] /admin/add-annotator returned {status}: {body[:200]!r}")
+            tokens.append(json.loads(body)["token"])
+    finally:
+        await client.close()
+    return tokens
+
+async def run(host: str, port: int, base: str, args) -> tuple[Stats, float]:
+    tokens = await get_tokens(host, port, base, args)
+    stats = Stats()
+    clients = [HttpClient(host, port, args.timeout) for _ in tokens]
+    start = time.monotonic()
+    deadline = start + args.duration
+    master = random.Random(args.seed)
+    tasks = []
+    for client, token in zip(clients, tokens):
+        rng = random.Random(master.random())
+        tasks.append(annotator(client, base, token, rng, stats, deadline, args))
+
+    async def staggered(n: int, task):
+        await asyncio.sleep(n * args.ramp_up / max(1, len(tasks)))
+        return await task
+
+    results = await asyncio.gather(*(staggered(n, t) for n, t in enumerate(tasks)), return_exceptions=True)
+    elapsed = time.monotonic() - start
+    for client in clients:
+        await client.close()
+    failed = [r for r in results if isinstance(r, BaseException)]
+    if failed:
+        print(f"[WARN] {len(failed)} annotators stopped on an error, e.g. {failed[0]!r}", file=sys.stderr)
+    return stats, elapsed
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def spawn_server(node: str, data_dir: Path, scratch: Path) -> tuple[subprocess.Popen, int]:
+    """backend/loadtest_server.js over a copy of data_dir; returns (process, port) once it answers."""
+    for f in data_dir.glob("*.json"):
+        shutil.copy2(f, scratch / f.name)
+    port = free_port()
+    env = dict(os.environ, DATA_DIR=str(scratch), PORT=str(port),
+               ADMIN_TOKEN="loadtest", ADMIN_PASSWORD="loadtest")
+    proc = subprocess.Popen([node, str(BACKEND / "loadtest_server.js")], env=env, cwd=BACKEND,
+                            stdout=subprocess.DEVNULL)
+    for _ in range(100):
+        if proc.poll() is not None:
+            raise SystemExit(f"[ERROR] loadtest_server.js exited with {proc.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return proc, port
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise SystemExit("[ERROR] loadtest_server.js did not start listening")
+
+def main():
+    ap = argparse.ArgumentParser(description="Simulate concurrent annotators against the backend")
+    ap.add_argument("--url", default="http://127.0.0.1:3000/api", help="API base URL")
+    ap.add_argument("--spawn-server", action="store_true",
+                    help="Run backend/loadtest_server.js (in-memory db, scratch data dir) and test that")
+    ap.add_argument("--node", default="node")
+    ap.add_argument("--data-dir", type=Path, default=BACKEND / "data", help="Data files copied for --spawn-server")
+    ap.add_argument("--tokens", type=Path, help="tokens.json to use (default: the server's data dir)")
+    ap.add_argument("--admin-token", default=os.environ.get("ADMIN_TOKEN"), help="For creating missing annotators")
+    ap.add_argument("--annotators", type=int, default=20)
+    ap.add_argument("--duration", type=float, default=60.0, help="Seconds to run")
+    ap.add_argument("--trials", type=int, default=0, help="Stop each annotator after this many answers (0: no limit)")
+    ap.add_argument("--ramp-up", type=float, default=5.0, help="Seconds over which annotators start")
+    ap.add_argument("--think-median", type=float, default=20.0, help="Median seconds per trial")
+    ap.add_argument("--think-sigma", type=float, default=0.5, help="Log-normal shape of think times")
+    ap.add_argument("--speedup", type=float, default=1.0, help="Divide think times by this")
+    ap.add_argument("--sample-ms", type=int, default=1000, help="Pause-sampling interval (frontend ?ps=)")
+    ap.add_argument("--gold-accuracy", type=float, default=0.9)
+    ap.add_argument("--repeat-consistency", type=float, default=0.8)
+    ap.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout (s)")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--json", type=Path, help="Write the results as JSON")
+    args = ap.parse_args()
+
+    proc = None
+    scratch = None
+    try:
+        if args.spawn_server:
+            scratch = tempfile.TemporaryDirectory(prefix="loadtest-data-")
+            proc, port = spawn_server(args.node, args.data_dir, Path(scratch.name))
+            host, base = "127.0.0.1", "/api"
+            args.admin_token = "loadtest"
+            args.tokens = args.tokens or Path(scratch.name) / "tokens.json"
+        else:
+            u = urllib.parse.urlsplit(args.url)
+            if u.scheme != "http":
+                print("[ERROR] Only http:// URLs are supported", file=sys.stderr)
+                sys.exit(1)
+            host, port, base = u.hostname, u.port or 80, u.path.rstrip("/")
+            args.tokens = args.tokens or args.data_dir / "tokens.json"
+        stats, elapsed = asyncio.run(run(host, port, base, args))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+        if scratch is not None:
+            scratch.cleanup()
+
+    summary = stats.summary(elapsed)
+    c = stats.counts
+    print(f"{args.annotators} annotators for {elapsed:.1f}s: {c['trials']} answers "
+          f"({c['trials'] / elapsed:.1f}/s; {c['gold']} gold, {c['repeat']} repeat), "
+          f"{c['finished']} ran out of pairs")
+    print(f"{'endpoint':<18} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for endpoint, s in summary.items():
+        print(f"{endpoint:<18} {s['requests']:>8} {s['errors']:>6} {s['rps']:>8.1f} {s['p50_ms']:>8.1f} "
+              f"{s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f} {s['max_ms']:>8.1f}")
+    for endpoint, s in summary.items():
+        bad = {k: v for k, v in s["status"].items() if not k.startswith("2")}
+        if bad:
+            print(f"[WARN] {endpoint}: " + ", ".join(f"{v}x {k}" for k, v in sorted(bad.items())), file=sys.stderr)
+
+    if args.json:
+        doc = {"annotators": args.annotators, "elapsed_s": round(elapsed, 3), "counts": c, "endpoints": summary,
+               "config": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()
+                          if k not in ("admin_token",)}}
+        atomic_write(args.json, lambda f: json.dump(doc, f, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Minimal MP4/MOV header reader: duration, frame count and FPS without decoding.
+
+The file is memory-mapped and only the box headers on the path
+  moov -> mvhd
+  moov -> trak -> mdia -> {hdlr, mdhd, minf -> stbl -> stts}
+are touched, so mdat payloads are skipped whether moov sits before them
+(faststart, as written by vid_conv.sh) or after them (default ffmpeg/camera output).
+
+Usage:
+  python mp4_header.py clip_001.mp4 [...]
+"""
+
+import mmap
+import struct
+import sys
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional, Tuple
+
+CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+
+class Mp4Info(NamedTuple):
+    duration_s: float   # movie duration (mvhd), matches ffprobe format=duration
+    frames: int         # video samples (sum of stts counts)
+    fps: float          # frames / summed sample durations (stts), matches ffprobe avg_frame_rate
+    moov_offset: int    # byte offset of the moov box
+    mdat_offset: int    # byte offset of the first mdat box (-1 if absent)
+    cfr: bool           # every video sample has the same duration (a shorter last sample is allowed)
+    width: int          # video track display size (tkhd), 0 if unknown
+    height: int
+
+    @property
+    def faststart(self) -> bool:
+        """moov precedes mdat, so playback can start before the whole file is downloaded."""
+        return self.mdat_offset < 0 or self.moov_offset < self.mdat_offset
+
+def iter_boxes(buf, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """Yield (type, payload_start, box_end) for each box in buf[start:end]."""
+    pos = start
+    while pos + 8 <= end:
+        size, btype = struct.unpack_from(">I4s", buf, pos)
+        header = 8
+        if size == 1:
+            if pos + 16 > end:
+                return
+            size = struct.unpack_from(">Q", buf, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            return  # truncated or corrupt box; stop rather than guess
+        yield btype, pos + header, pos + size
+        pos += size
+
+def find_box(buf, start: int, end: int, btype: bytes) -> Optional[Tuple[int, int]]:
+    for t, p, e in iter_boxes(buf, start, end):
+        if t == btype:
+            return p, e
+    return None
+
+def read_timescale_duration(buf, payload: int) -> Tuple[int, int]:
+    """Parse the (timescale, duration) pair shared by mvhd and mdhd (full box, v0 or v1)."""
+    version = buf[payload]
+    if version == 1:
+        timescale, duration = struct.unpack_from(">IQ", buf, payload + 4 + 16)
+    else:
+        timescale, duration = struct.unpack_from(">II", buf, payload + 4 + 8)
+    return timescale, duration
+
+def read_track_size(buf, trak: Tuple[int, int]) -> Tuple[int, int]:
+    """(width, height) from the track header (16.16 fixed point), (0, 0) if absent."""
+    tkhd = find_box(buf, *trak, b"tkhd")
+    if tkhd is None:
+        return 0, 0
+    offset = tkhd[0] + (88 if buf[tkhd[0]] == 1 else 76)
+    if offset + 8 > tkhd[1]:
+        return 0, 0
+    width, height = struct.unpack_from(">II", buf, offset)
+    return width >> 16, height >> 16
+
+def read_video_track(buf, trak: Tuple[int, int]) -> Optional[Tuple[int, int, int, int, bool]]:
+    """
+    Return (timescale, duration, frames, sample_ticks, cfr) if trak is a video track, else None.
+    sample_ticks is the sum of all sample durations (stts), which can differ from the mdhd
+    duration (e.g. 41 x 1024 ticks in a 43008-tick track).
+    """
+    mdia = find_box(buf, *trak, b"mdia")
+    if mdia is None:
+        return None
+    hdlr = find_box(buf, *mdia, b"hdlr")
+    if hdlr is None or bytes(buf[hdlr[0] + 8:hdlr[0] + 12]) != b"vide":
+        return None
+    mdhd = find_box(buf, *mdia, b"mdhd")
+    minf = find_box(buf, *mdia, b"minf")
+    stbl = find_box(buf, *minf, b"stbl") if minf else None
+    stts = find_box(buf, *stbl, b"stts") if stbl else None
+    if mdhd is None or stts is None:
+        return None
+    timescale, duration = read_timescale_duration(buf, mdhd[0])
+    count = struct.unpack_from(">I", buf, stts[0] + 4)[0]
+    if stts[0] + 8 + count * 8 > stts[1]:
+        return None
+    runs = struct.unpack_from(f">{count * 2}I", buf, stts[0] + 8)
+    counts, deltas = runs[0::2], runs[1::2]
+    frames = sum(counts)
+    sample_ticks = sum(c * d for c, d in zip(counts, deltas))
+    if count > 1 and counts[-1] == 1:
+        deltas = deltas[:-1]  # muxers often shorten the final sample
+    cfr = len({d for c, d in zip(counts, deltas) if c}) <= 1
+    return timescale, duration, frames, sample_ticks, cfr
+
+def parse_mp4(buf) -> Optional[Mp4Info]:
+    moov = None
+    moov_offset = -1
+    mdat_offset = -1
+    for t, p, e in iter_boxes(buf, 0, len(buf)):
+        if t == b"moov" and moov is None:
+            moov = (p, e)
+            moov_offset = p - 8
+        elif t == b"mdat" and mdat_offset < 0:
+            mdat_offset = p - 8
+    if moov is None:
+        return None
+    mvhd = find_box(buf, *moov, b"mvhd")
+    if mvhd is None:
+        return None
+    mv_timescale, mv_duration = read_timescale_duration(buf, mvhd[0])
+    for t, p, e in iter_boxes(buf, *moov):
+        if t != b"trak":
+            continue
+        track = read_video_track(buf, (p, e))
+        if track is None:
+            continue
+        timescale, duration, frames, sample_ticks, cfr = track
+        if not (timescale and duration and frames and sample_ticks):
+            return None  # fragmented or empty track; defer to ffprobe
+        track_s = duration / timescale
+        movie_s = mv_duration / mv_timescale if mv_timescale and mv_duration else track_s
+        width, height = read_track_size(buf, (p, e))
+        # same as ffprobe's avg_frame_rate: frames over the summed sample durations, not mdhd
+        fps = frames * timescale / sample_ticks
+        return Mp4Info(movie_s, frames, fps, moov_offset, mdat_offset, cfr, width, height)
+    return None
+
+def probe_mp4(path: Path) -> Optional[Mp4Info]:
+    """Read container metadata from an MP4 file, or None if it cannot be parsed."""
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            return parse_mp4(buf)
+    except (OSError, ValueError, struct.error, IndexError):
+        return None
+
+def main():
+    status = 0
+    for arg in sys.argv[1:]:
+        info = probe_mp4(Path(arg))
+        if info is None:
+            print(f"[FAIL] {arg}", file=sys.stderr)
+            status = 1
+            continue
+        print(f"{arg}: {info.width}x{info.height} duration={info.duration_s:.6f}s frames={info.frames}"
+              f" fps={info.fps:.6f} faststart={info.faststart} cfr={info.cfr}")
+    sys.exit(status)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Perceptual hashes of the clips in a catalogue, and near-duplicate checks for pair lists.
+
+Hashing: ffmpeg decodes --frames evenly spaced frames of each clip, downscaled to 32x32
+grey, and each frame gets a 64-bit DCT hash (the signs of its 8x8 lowest frequencies
+against their median). A clip's hash is its frame hashes concatenated, so the Hamming
+distance between two clips is the sum over aligned frames; re-encodes, renditions and
+identical rollouts from two checkpoints land within a few bits. Clips are hashed on a
+pool of --jobs worker processes, and results are cached next to the catalogue
+(<catalogue>.phashcache.jsonl) keyed by rel_path, size and mtime, so only new or
+modified clips are decoded again. The catalogue (json, jsonl or sqlite) is rewritten in
+place with the hash next to rel_path:
+  "rel_path": "scen/variant/agent/1/clip_001.mp4",
+  "phash": "c3a1...",          (16 hex digits per frame)
+
+Pairs: --pairs clip_pairs.json checks every pair before it is published. A pair is a
+near duplicate when its two clips are the same file or their hashes differ in at most
+--max-distance bits per frame. --report writes the flagged pairs as JSON
+  [{"pair_id", "left_clip", "right_clip", "distance", "reason": "same clip"|"near duplicate"}, ...]
+and --drop writes the pairs without them to --out (default: over --pairs, in the same
+format; the other pair_ids are unchanged). Pair clip paths are matched to catalogue
+rel_paths through --path-prefix, as gen_pair.py writes them.
+
+Clusters: --clusters FILE groups all catalogue clips into near-duplicate sets. The hashes
+go into a multi-index (one exact-match table per hash substring, see MultiIndex), so each
+clip is compared only with the few clips sharing part of its hash rather than with every
+other clip:
+  [{"clips": ["scen/v/actorA/1/clip_001.mp4", "scen/v/actorB/1/clip_001.mp4"], "max_distance": 3}, ...]
+
+--no-hash skips decoding and uses the hashes already in the catalogue, e.g. to prune
+pairs on a machine without the videos.
+
+Usage:
+  python near_duplicates.py --catalogue clip_paris.json --root video
+  python near_duplicates.py --catalogue clip_paris.json --root video --pairs clip_pairs.json --report dupes.json
+  python near_duplicates.py --catalogue clip_paris.json --no-hash --pairs clip_pairs.json --drop --out clip_pairs.clean.json
+  python near_duplicates.py --catalogue catalogue.sqlite --no-hash --clusters clusters.json --max-distance 2
+"""
+
+import argparse
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import catalogue_db
+from gen_catalogue import ProbeCache
+from gen_pair import norm_path
+from json_io import atomic_write, iter_records, write_json_array, write_jsonl
+from mp4_header import probe_mp4
+from thumbnails import catalogue_format, with_outputs
+
+SAMPLE_SIZE = 32  # frames are hashed from a SAMPLE_SIZE x SAMPLE_SIZE grey image
+HASH_SIZE = 8     # HASH_SIZE x HASH_SIZE low DCT frequencies -> 64 bits per frame
+FRAME_HEX = HASH_SIZE * HASH_SIZE // 4
+
+# DCT-II basis, only the HASH_SIZE lowest frequencies: _COS[u][x]
+_COS = [[math.cos(math.pi * (2 * x + 1) * u / (2 * SAMPLE_SIZE)) for x in range(SAMPLE_SIZE)]
+        for u in range(HASH_SIZE)]
+
+def frame_hash(pixels: bytes) -> int:
+    """64-bit DCT hash of one SAMPLE_SIZE x SAMPLE_SIZE 8-bit grey frame."""
+    n = SAMPLE_SIZE
+    # separable DCT: rows first (n x HASH_SIZE), then columns of the low frequencies only
+    rows = [[sum(c * p for c, p in zip(basis, pixels[y * n:(y + 1) * n])) for basis in _COS] for y in range(n)]
+    coeffs = [sum(_COS[v][y] * rows[y][u] for y in range(n)) for v in range(HASH_SIZE) for u in range(HASH_SIZE)]
+    median = statistics.median(coeffs[1:])  # the DC term is just brightness
+    bits = 0
+    for c in coeffs:
+        bits = (bits << 1) | (c > median)
+    return bits
+
+def sample_frames(src: Path, frames: int, duration: float) -> list[bytes]:
+    """Decode `frames` evenly spaced grey SAMPLE_SIZE^2 frames of src in one ffmpeg run."""
+    rate = frames / duration if duration > 0 else 1.0
+    cmd = ["ffmpeg", "-v", "error", "-i", str(src),
+           "-vf", f"fps={rate:.6f},scale={SAMPLE_SIZE}:{SAMPLE_SIZE}:flags=area,format=gray",
+           "-frames:v", str(frames), "-f", "rawvideo", "pipe:"]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        err = proc.stderr.decode(errors="replace").strip().splitlines()
+        raise RuntimeError(err[-1] if err else f"ffmpeg exited with {proc.returncode}")
+    size = SAMPLE_SIZE * SAMPLE_SIZE
+    return [proc.stdout[i:i + size] for i in range(0, len(proc.stdout) - size + 1, size)]
+
+def clip_hash(frame_hashes: list[int], frames: int) -> str:
+    """Concatenated frame hashes as hex; short clips repeat their last frame to fill `frames`."""
+    hashes = (frame_hashes + frame_hashes[-1:] * frames)[:frames]
+    return "".join(f"{h:0{FRAME_HEX}x}" for h in hashes)
+
+def phash_job(job: tuple) -> tuple:
+    """Worker: (rel_path, root, duration, frames) -> (rel_path, phash or None, error or None)."""
+    rel_path, root, duration, frames = job
+    src = root / rel_path
+    try:
+        info = probe_mp4(src)
+        if info is not None and info.duration_s > 0:
+            duration = info.duration_s
+        pixels = sample_frames(src, frames, duration)
+        if not pixels:
+            return rel_path, None, "no frames decoded"
+        return rel_path, clip_hash([frame_hash(p) for p in pixels], frames), None
+    except (OSError, RuntimeError) as e:
+        return rel_path, None, str(e)
+
+class PhashCache(ProbeCache):
+    """ProbeCache's sidecar format with the clip's perceptual hash as the cached value."""
+
+    def __init__(self, path: Path, frames: int, refresh: bool = False):
+        super().__init__(path, refresh)
+        self.frames = frames
+
+    def get(self, rel_path: str, sig) -> Optional[str]:
+        rec = self.records.get(rel_path)
+        if (rec is None or (rec["size"], rec["mtime_ns"]) != sig or rec.get("frames") != self.frames
+                or "phash" not in rec):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.live[rel_path] = rec
+        return rec["phash"]
+
+    def put(self, rel_path: str, sig, phash: str) -> None:
+        self.live[rel_path] = {"rel_path": rel_path, "size": sig[0], "mtime_ns": sig[1],
+                               "frames": self.frames, "phash": phash}
+
+def annotate(entries: Iterable[dict], root: Path, frames: int, jobs: int, cache: PhashCache,
+             stats: dict) -> Iterator[dict]:
+    """Yield entries, in order, with "phash" added; clips that fail keep their entry as is."""
+    window = max(1, jobs) * 4
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=max(1, jobs)) as pool:
+        def drain_one():
+            e, sig, phash = pending.popleft()
+            if not isinstance(phash, str):
+                rel_path, phash, err = phash.result()
+                if err:
+                    print(f"[WARN] {rel_path}: {err}", file=sys.stderr)
+                    stats["failed"] += 1
+                    return e
+                if sig is not None:
+                    cache.put(rel_path, sig, phash)
+            stats["done"] += 1
+            return with_outputs(e, {"phash": phash})
+
+        for e in entries:
+            try:
+                sig = ProbeCache.signature(root / e["rel_path"])
+            except OSError:
+                sig = None
+            phash = cache.get(e["rel_path"], sig) if sig else None
+            if phash is None:
+                phash = pool.submit(phash_job, (e["rel_path"], root, float(e.get("duration_s") or 0.0), frames))
+            pending.append((e, sig, phash))
+            if len(pending) >= window:
+                yield drain_one()
+        while pending:
+            yield drain_one()
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+class MultiIndex:
+    """
+    Multi-index hashing over `bits`-wide integer hashes. Each hash is cut into radius + 1
+    substrings with an exact-match table each: two hashes within radius bits differ in
+    at most radius substrings, so they agree on at least one, and a search only verifies
+    the hashes sharing some substring with the query instead of every hash.
+    """
+
+    def __init__(self, bits: int, radius: int):
+        m = max(1, min(radius + 1, bits))
+        bounds = [bits * i // m for i in range(m + 1)]
+        self.slices = [(lo, (1 << (hi - lo)) - 1) for lo, hi in zip(bounds, bounds[1:])]
+        self.tables = [defaultdict(list) for _ in self.slices]
+        self.radius = radius
+        self.hashes = []
+        self.items = []
+
+    def add(self, h: int, item) -> None:
+        i = len(self.hashes)
+        self.hashes.append(h)
+        self.items.append(item)
+        for table, (shift, mask) in zip(self.tables, self.slices):
+            table[(h >> shift) & mask].append(i)
+
+    def search(self, h: int) -> list[tuple[int, object]]:
+        """(distance, item) for every added item within radius of h."""
+        seen = set()
+        found = []
+        for table, (shift, mask) in zip(self.tables, self.slices):
+            for i in table.get((h >> shift) & mask, ()):
+                if i in seen:
+                    continue
+                seen.add(i)
+                d = hamming(h, self.hashes[i])
+                if d <= self.radius:
+                    found.append((d, self.items[i]))
+        return found
+
+def clusters(hashes: dict[str, int], bits: int, radius: int) -> list[dict]:
+    """Near-duplicate sets of rel_paths (transitively linked within radius), largest first."""
+    parent = {}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    index = MultiIndex(bits, radius)
+    linked = {}  # cluster root -> largest linking distance
+    for rel_path, h in hashes.items():
+        parent[rel_path] = rel_path
+        for d, other in index.search(h):
+            a, b = find(rel_path), find(other)
+            worst = max(d, linked.pop(a, 0), linked.pop(b, 0) if a != b else 0)
+            parent[a] = b
+            linked[b] = worst
+        index.add(h, rel_path)
+    groups = {}
+    for rel_path in hashes:
+        groups.setdefault(find(rel_path), []).append(rel_path)
+    out = [{"clips": sorted(g), "max_distance": linked.get(r, 0)} for r, g in groups.items() if len(g) > 1]
+    out.sort(key=lambda c: (-len(c["clips"]), c["clips"][0]))
+    return out
+
+def check_pairs(pairs: Iterable[dict], by_path: dict[str, int], radius: int, flagged: list,
+                stats: dict) -> Iterator[dict]:
+    """Yield the pairs that are not near duplicates; append the others' reports to flagged."""
+    for rec in pairs:
+        left, right = rec.get("left_clip"), rec.get("right_clip")
+        reason, d = None, None
+        if left == right:
+            reason, d = "same clip", 0
+        elif left in by_path and right in by_path:
+            d = hamming(by_path[left], by_path[right])
+            if d <= radius:
+                reason = "near duplicate"
+        else:
+            stats["unhashed"] += 1
+        if reason is None:
+            yield rec
+            continue
+        flagged.append({"pair_id": rec.get("pair_id"), "left_clip": left, "right_clip": right,
+                        "distance": d, "reason": reason})
+
+def main():
+    ap = argparse.ArgumentParser(description="Hash clips perceptually and flag or drop near-duplicate pairs")
+    ap.add_argument("--catalogue", type=Path, default=Path("clip_paris.json"),
+                    help="Catalogue to hash (updated in place; json, jsonl or sqlite)")
+    ap.add_argument("--root", type=Path, default=Path("video"), help="Dataset root the rel_paths are relative to")
+    ap.add_argument("--frames", type=int, default=5, help="Frames sampled per clip")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    ap.add_argument("--cache", type=Path, help="Hash cache file (default: <catalogue>.phashcache.jsonl)")
+    ap.add_argument("--refresh-cache", action="store_true", help="Ignore cached hashes and decode every clip")
+    ap.add_argument("--no-hash", action="store_true", help="Use the hashes already in the catalogue; decode nothing")
+    ap.add_argument("--max-distance", type=int, default=4,
+                    help="Near duplicate: at most this many differing bits per frame (of 64)")
+    ap.add_argument("--pairs", type=Path, help="Pair list (clip_pairs.json or .jsonl) to check")
+    ap.add_argument("--path-prefix", type=str, default="video",
+                    help="Prefix gen_pair.py put in front of rel_path in --pairs ('' for none)")
+    ap.add_argument("--report", type=Path, help="Write the flagged pairs as JSON")
+    ap.add_argument("--drop", action="store_true", help="Write the pairs without near duplicates to --out")
+    ap.add_argument("--out", type=Path, help="Output for --drop (default: overwrite --pairs)")
+    ap.add_argument("--clusters", type=Path, help="Write near-duplicate sets of catalogue clips as JSON")
+    args = ap.parse_args()
+
+    if not args.catalogue.exists():
+        print(f"[ERROR] Catalogue not found: {args.catalogue}", file=sys.stderr)
+        sys.exit(1)
+    if args.frames < 1:
+        ap.error("--frames must be at least 1")
+    if args.drop and not args.pairs:
+        ap.error("--drop needs --pairs")
+    fmt = catalogue_format(args.catalogue)
+
+    if not args.no_hash:
+        cache = PhashCache(args.cache or args.catalogue.with_name(args.catalogue.name + ".phashcache.jsonl"),
+                           args.frames, refresh=args.refresh_cache)
+        stats = {"done": 0, "failed": 0}
+        if fmt == "sqlite":
+            entries = catalogue_db.iter_entries(args.catalogue)
+            n = catalogue_db.write_db(annotate(entries, args.root, args.frames, args.jobs, cache, stats),
+                                      args.catalogue)
+        else:
+            # the writers replace the catalogue only once complete, so it can be streamed from meanwhile
+            writer = write_json_array if fmt == "json" else write_jsonl
+            n = writer(annotate(iter_records(args.catalogue), args.root, args.frames, args.jobs, cache, stats),
+                       args.catalogue)
+        cache.save()
+        print(f"Hashed {stats['done']}/{n} clips ({stats['failed']} failed, {cache.hits} cached); updated {args.catalogue}")
+
+    if not (args.pairs or args.clusters):
+        return
+    entries = catalogue_db.iter_entries(args.catalogue) if fmt == "sqlite" else iter_records(args.catalogue)
+    hashes = {}
+    for e in entries:
+        phash = e.get("phash")
+        if isinstance(phash, str) and len(phash) == args.frames * FRAME_HEX:
+            hashes[e["rel_path"]] = int(phash, 16)
+    if not hashes:
+        print(f"[WARN] No {args.frames}-frame hashes in {args.catalogue}; only identical paths are flagged",
+              file=sys.stderr)
+    radius = args.max_distance * args.frames
+
+    if args.clusters:
+        found = clusters(hashes, args.frames * HASH_SIZE * HASH_SIZE, radius)
+        atomic_write(args.clusters, lambda f: f.write(json.dumps(found, indent=2) + "\n"))
+        print(f"{len(found)} near-duplicate sets covering {sum(len(c['clips']) for c in found)} clips -> {args.clusters}")
+
+    if args.pairs:
+        by_path = {norm_path(rel_path, args.path_prefix): h for rel_path, h in hashes.items()}
+        flagged = []
+        stats = {"unhashed": 0}
+        kept = check_pairs(iter_records(args.pairs), by_path, radius, flagged, stats)
+        if args.drop:
+            out = args.out or args.pairs
+            writer = write_jsonl if catalogue_format(args.pairs) == "jsonl" else write_json_array
+            n = writer(kept, out)
+        else:
+            n = sum(1 for _ in kept)
+        total = n + len(flagged)
+        same = sum(1 for f in flagged if f["reason"] == "same clip")
+        print(f"Flagged {len(flagged)} of {total} pairs ({same} same clip, {len(flagged) - same} near duplicate);"
+              f" {stats['unhashed']} pairs had an unhashed clip")
+        if args.drop:
+            print(f"Wrote {n} pairs to {out}")
+        if args.report:
+            atomic_write(args.report, lambda f: f.write(json.dumps(flagged, indent=2) + "\n"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Columnar pair-generation engine for gen_pair.py (--engine columnar). Requires NumPy.
+
+The catalogue is encoded once into integer columns (scenario, variant, agent, rel_path
+codes numbered in string order, plus route_id and clip_idx), groups are found by
+sorting instead of dicts, and pair indices are generated per group size with
+np.triu_indices. The result is identical to the dict-based strategies in gen_pair.py,
+including group order (first appearance in the catalogue), pair order within a group,
+"last row wins" for duplicate members, left/right ordering and dedupe.
+"""
+
+import random
+
+import numpy as np
+
+from gen_pair import add_media
+
+def _encode(values: list) -> tuple[np.ndarray, list]:
+    """Integer codes for values, numbered so that code order == string order."""
+    names = sorted(set(values))
+    index = {v: i for i, v in enumerate(names)}
+    return np.fromiter((index[v] for v in values), dtype=np.int64, count=len(values)), names
+
+def _run_starts(*sorted_cols: np.ndarray) -> np.ndarray:
+    """Boolean mask of positions where the (already sorted) key tuple changes."""
+    n = len(sorted_cols[0])
+    start = np.zeros(n, dtype=bool)
+    if n:
+        start[0] = True
+        for c in sorted_cols:
+            start[1:] |= c[1:] != c[:-1]
+    return start
+
+class ClipTable:
+    """Integer-coded catalogue columns; <col>_names[code] maps a code back to its string."""
+
+    def __init__(self, clips: list):
+        # clips: gen_pair.Clip records (output path already has --path-prefix applied)
+        self.n = len(clips)
+        self.scenario, self.scenario_names = _encode([c.scenario for c in clips])
+        self.variant, self.variant_names = _encode([c.variant for c in clips])
+        self.agent, self.agent_names = _encode([c.agent for c in clips])
+        self.rel, _ = _encode([c.rel_path for c in clips])
+        self.path, self.path_names = _encode([c.path for c in clips])
+        # output path -> player media (gen_pair.ClipFactory.media), for clips that have any
+        self.path_media = {c.path: c.media for c in clips if c.media}
+        try:
+            self.route_id = np.fromiter((c.route_id for c in clips), dtype=np.int64, count=self.n)
+            self.clip_idx = np.fromiter((c.clip_idx for c in clips), dtype=np.int64, count=self.n)
+        except (TypeError, ValueError):
+            raise ValueError("columnar engine needs integer route_id/clip_idx; use --engine dict")
+
+    def group_ids(self, *cols: np.ndarray) -> np.ndarray:
+        """Group id per row for the distinct tuples of cols, numbered by first appearance."""
+        if not self.n:
+            return np.zeros(0, dtype=np.int64)
+        order = np.lexsort((np.arange(self.n),) + cols[::-1])  # equal keys keep row order
+        start = _run_starts(*(c[order] for c in cols))
+        sorted_ids = np.cumsum(start) - 1
+        first = order[start]  # smallest row index of each distinct key
+        rank = np.empty(len(first), dtype=np.int64)
+        rank[np.argsort(first, kind="stable")] = np.arange(len(first))
+        ids = np.empty(self.n, dtype=np.int64)
+        ids[order] = rank[sorted_ids]
+        return ids
+
+    def order_rank(self) -> np.ndarray:
+        """Dense rank of each row by gen_pair's left/right key (variant, agent, route_id, clip_idx, rel_path)."""
+        cols = (self.variant, self.agent, self.route_id, self.clip_idx, self.rel)
+        order = np.lexsort(cols[::-1])
+        start = _run_starts(*(c[order] for c in cols))
+        rank = np.empty(self.n, dtype=np.int64)
+        rank[order] = np.cumsum(start) - 1
+        return rank
+
+def _members(gid: np.ndarray, member: np.ndarray):
+    """
+    Distinct (group, member) entries, laid out group by group in first-appearance order.
+    Returns (member_gid, member_code, row) where row is the member's last row in the
+    catalogue, mirroring `by_member[r[...]] = r` in the dict implementation.
+    """
+    n = len(gid)
+    if not n:
+        return gid, member, gid
+    order = np.lexsort((np.arange(n), member, gid))
+    g, m = gid[order], member[order]
+    start = _run_starts(g, m)
+    starts = np.flatnonzero(start)
+    ends = np.append(starts[1:], n)
+    first, last = order[starts], order[ends - 1]
+    mg, mm = g[starts], m[starts]
+    o = np.lexsort((first, mg))
+    return mg[o], mm[o], last[o]
+
+def _offsets(member_gid: np.ndarray, n_groups: int) -> tuple[np.ndarray, np.ndarray]:
+    sizes = np.bincount(member_gid, minlength=n_groups)
+    offsets = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64)
+    return sizes, offsets
+
+def _combinations(sizes: np.ndarray, offsets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Member index pairs (i, j), i < j, for every group: groups in order and pairs in
+    itertools.combinations order within each group.
+    """
+    parts_i, parts_j = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+    for size in np.unique(sizes):
+        if size < 2:
+            continue
+        ti, tj = np.triu_indices(int(size), 1)  # row-major == combinations order
+        base = offsets[sizes == size][:, None]
+        parts_i.append((base + ti).ravel())
+        parts_j.append((base + tj).ravel())
+    i, j = np.concatenate(parts_i), np.concatenate(parts_j)
+    o = np.lexsort((j, i))
+    return i[o], j[o]
+
+def _pairs_within(t: ClipTable, gid: np.ndarray, member: np.ndarray):
+    """Strategies A/B: all unordered member pairs per group, each ordered by member name."""
+    mg, mm, mrow = _members(gid, member)
+    n_groups = int(gid.max()) + 1 if len(gid) else 0
+    i, j = _combinations(*_offsets(mg, n_groups))
+    swap = mm[i] > mm[j]
+    return np.where(swap, mrow[j], mrow[i]), np.where(swap, mrow[i], mrow[j])
+
+def pairs_strategy_A(t: ClipTable):
+    return _pairs_within(t, t.group_ids(t.scenario, t.variant, t.route_id, t.clip_idx), t.agent)
+
+def pairs_strategy_B(t: ClipTable):
+    return _pairs_within(t, t.group_ids(t.scenario, t.agent, t.route_id, t.clip_idx), t.variant)
+
+def pairs_strategy_C(t: ClipTable, pivot_map: dict | None):
+    gid = t.group_ids(t.scenario, t.variant, t.route_id, t.clip_idx)
+    if not t.n:
+        return gid, gid
+    mg, ma, mrow = _members(gid, t.agent)
+    n_groups = int(gid.max()) + 1
+
+    # pivot per (scenario, variant): mapped agent if present there, else smallest agent
+    sv = t.group_ids(t.scenario, t.variant)
+    n_sv = int(sv.max()) + 1
+    pivot = np.full(n_sv, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(pivot, sv, t.agent)
+    if pivot_map:
+        agent_index = {a: c for c, a in enumerate(t.agent_names)}
+        present = set(zip(sv.tolist(), t.agent.tolist()))
+        sv_variant = np.zeros(n_sv, dtype=np.int64)
+        sv_variant[sv] = t.variant
+        for s in range(n_sv):
+            code = agent_index.get(pivot_map.get(t.variant_names[sv_variant[s]]))
+            if code is not None and (s, code) in present:
+                pivot[s] = code
+
+    group_sv = np.zeros(n_groups, dtype=np.int64)
+    group_sv[gid] = sv
+    group_pivot = pivot[group_sv]
+    is_pivot = ma == group_pivot[mg]
+    pivot_row = np.full(n_groups, -1, dtype=np.int64)
+    pivot_row[mg[is_pivot]] = mrow[is_pivot]
+    keep = ~is_pivot & (pivot_row[mg] >= 0)
+    return pivot_row[mg[keep]], mrow[keep]
+
+def pairs_strategy_D(t: ClipTable, k: int, rng: random.Random):
+    gid = t.group_ids(t.scenario, t.variant, t.route_id, t.clip_idx)
+    mg, ma, mrow = _members(gid, t.agent)
+    n_groups = int(gid.max()) + 1 if len(gid) else 0
+    sizes, offsets = _offsets(mg, n_groups)
+
+    # rng.sample only depends on the population size, so drawing positions consumes the
+    # generator exactly as sampling agent names in the dict implementation does
+    keep = np.ones(len(mg), dtype=bool)
+    for g in np.flatnonzero((sizes >= 2) & (sizes > k)).tolist():
+        off, size = int(offsets[g]), int(sizes[g])
+        chosen = rng.sample(range(size), k)
+        keep[off:off + size] = False
+        keep[[off + c for c in chosen]] = True
+    mg, ma, mrow = mg[keep], ma[keep], mrow[keep]
+
+    # pairs among the kept agents in sorted-name order
+    o = np.lexsort((ma, mg))
+    mg, ma, mrow = mg[o], ma[o], mrow[o]
+    i, j = _combinations(*_offsets(mg, n_groups))
+    return mrow[i], mrow[j]
+
+def build_pairs(t: ClipTable, strategy: str, pivot_map: dict | None, k: int, rng: random.Random):
+    """Return (r1, r2) row-index arrays in the same order as gen_pair.build_pairs yields pairs."""
+    if strategy == "A":
+        return pairs_strategy_A(t)
+    if strategy == "B":
+        return pairs_strategy_B(t)
+    if strategy == "C":
+        return pairs_strategy_C(t, pivot_map)
+    if strategy == "D":
+        return pairs_strategy_D(t, k, rng)
+    raise ValueError(f"Unknown strategy: {strategy}")
+
+def ordered_pairs(t: ClipTable, r1: np.ndarray, r2: np.ndarray):
+    """
+    Apply gen_pair's left/right ordering and (left_path, right_path, scenario) dedupe.
+    Returns (left_path, right_path, scenario) code arrays in output order.
+    """
+    rank = t.order_rank()
+    r1_left = rank[r1] <= rank[r2]
+    left = np.where(r1_left, r1, r2)
+    right = np.where(r1_left, r2, r1)
+    lp, rp, sc = t.path[left], t.path[right], t.scenario[left]
+
+    # keep the first occurrence of each (left_path, right_path, scenario)
+    order = np.lexsort((np.arange(len(lp)), sc, rp, lp))
+    start = _run_starts(lp[order], rp[order], sc[order])
+    kept = np.sort(order[start])
+    return lp[kept], rp[kept], sc[kept]
+
+def pair_records(t: ClipTable, lp: np.ndarray, rp: np.ndarray, sc: np.ndarray, id_width: int):
+    """Number the output of ordered_pairs into clip_pairs.json records."""
+    paths, scenarios, media = t.path_names, t.scenario_names, t.path_media
+    for counter, (a, b, s) in enumerate(zip(lp.tolist(), rp.tolist(), sc.tolist()), start=1):
+        rec = {
+            "pair_id": str(counter).zfill(id_width),
+            "left_clip": paths[a],
+            "right_clip": paths[b],
+            "description": scenarios[s],
+        }
+        if media and (paths[a] in media or paths[b] in media):
+            add_media(rec, media.get(paths[a]), media.get(paths[b]))
+        yield rec
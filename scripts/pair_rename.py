@@ -1,5 +1,7 @@
 import json
 
+from json_io import atomic_write
+
 filename = "backend/data/clip_pairs.json"
 with open(filename, "r") as f:
     data = json.load(f)
@@ -8,7 +10,7 @@ for item in data:
     item["left_clip"] = "videos/" + item["left_clip"]
     item["right_clip"] = "videos/" + item["right_clip"]
 
-with open(filename, "w") as f:
-    json.dump(data, f, indent=2)
+# write next to it and rename, so the backend never reads a half-written file
+atomic_write(filename, lambda f: json.dump(data, f, indent=2))
 
 print(f"Updated file saved in-place: {filename}")
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Precompute per-annotator assignment plans for the backend.
+
+Every pair (in serving order: --order from schedule_pairs.py, else file order) goes to
+--k distinct annotators, each time to the k with the fewest pairs so far, so loads differ
+by at most one and the first pairs in the order collect their k labels first. About half
+of each pair's showings have left and right swapped, given to the annotators whose own
+plans lean most towards unswapped, which keeps every annotator near 50/50 as well.
+Gold and repeat slots are placed ahead of time at the backend's rates: golds (each at most
+once per annotator, never swapped) at random positions, repeats --repeat-gap new pairs
+after the first showing, in the same orientation.
+
+The plan is one compact JSON file the backend keeps in memory:
+  {"version": 1, "k": 3, "plan_id": "<hash of the rest>",
+   "pairs": [<clip_pairs.json records referenced by the plan>],
+   "gold":  [<gold_pairs.json records>],
+   "annotators": {"<annotatorId>": [slot, ...]}}
+  slot = index << 3 | kind << 1 | swapped, kind 0 new pair, 1 repeat (index into pairs),
+         2 gold (index into gold)
+Annotators missing from the plan are served the old way (serving order, random golds).
+
+The backend stores each annotator's cursor together with plan_id. When the plan is
+regenerated (e.g. after adding annotators), cursors from the old plan are not reused:
+an annotator restarts at the top of their new slot list, passing over the golds and
+repeats ahead of their first unanswered pair, and new-pair slots whose pair they have
+already answered are always skipped (that answer stands for the slot). So regenerating
+never leaves a pair short of its k labels; pairs labelled under the old plan by
+annotators the new one does not give them to end up with extra labels.
+
+Usage:
+  python plan_assignments.py --pairs backend/data/clip_pairs.json --tokens backend/data/tokens.json --out backend/data/plan.json
+  python plan_assignments.py --order backend/data/serving_order.json --k 5 --annotators a1 a2 a3 a4 a5 a6
+"""
+
+import argparse
+import hashlib
+import heapq
+import json
+import random
+import sys
+from pathlib import Path
+
+from json_io import atomic_write, iter_records
+
+# backend/routes/api.js defaults
+GOLD_RATE = 0.07
+REPEAT_RATE = 0.05
+REPEAT_GAP = 10
+
+NEW, REPEAT, GOLD = 0, 1, 2
+
+def slot(index: int, kind: int, swapped: bool = False) -> int:
+    return index << 3 | kind << 1 | int(swapped)
+
+def plan_id(doc: dict) -> str:
+    """Short content hash; annotators' cursors are only valid for the plan with this id."""
+    canonical = json.dumps(doc, separators=(",", ":"), sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+def assign(n_pairs: int, annotators: list, k: int, rng: random.Random) -> dict:
+    """annotator -> [(pair index, swapped)] in pair order; each pair to k least-loaded annotators."""
+    plans = {a: [] for a in annotators}
+    bias = dict.fromkeys(annotators, 0)  # swapped - unswapped so far
+    # (load, random tiebreak, annotator)
+    heap = [(0, rng.random(), a) for a in annotators]
+    heapq.heapify(heap)
+    for p in range(n_pairs):
+        chosen = [heapq.heappop(heap) for _ in range(k)]
+        # alternate which side of an odd k gets the extra swapped showing
+        n_swapped = k // 2 + (p % 2 if k % 2 else 0)
+        by_bias = sorted(range(k), key=lambda c: bias[chosen[c][2]])
+        swapped = set(by_bias[:n_swapped])
+        for c, (load, _tie, a) in enumerate(chosen):
+            plans[a].append((p, c in swapped))
+            bias[a] += 1 if c in swapped else -1
+            heapq.heappush(heap, (load + 1, rng.random(), a))
+    return plans
+
+def with_extras(new: list, n_gold: int, gold_rate: float, repeat_rate: float, repeat_gap: int,
+                rng: random.Random) -> list:
+    """Interleave one annotator's new pairs with gold and repeat slots."""
+    after: dict[int, list] = {}  # new-pair position -> slots placed right after it
+    if new and n_gold and gold_rate > 0:
+        want = min(n_gold, round(len(new) * gold_rate / (1 - gold_rate)))
+        golds = rng.sample(range(n_gold), want)
+        for g, pos in zip(golds, sorted(rng.randrange(len(new)) for _ in golds)):
+            after.setdefault(pos, []).append(slot(g, GOLD))
+    for pos, (p, swapped) in enumerate(new):
+        if rng.random() < repeat_rate:
+            after.setdefault(min(pos + repeat_gap, len(new) - 1), []).append(slot(p, REPEAT, swapped))
+    slots = []
+    for pos, (p, swapped) in enumerate(new):
+        slots.append(slot(p, NEW, swapped))
+        slots.extend(after.get(pos, ()))
+    return slots
+
+def main():
+    ap = argparse.ArgumentParser(description="Precompute per-annotator assignment plans")
+    ap.add_argument("--pairs", type=Path, default=Path("backend/data/clip_pairs.json"))
+    ap.add_argument("--gold", type=Path, default=Path("backend/data/gold_pairs.json"))
+    ap.add_argument("--order", type=Path, help="serving_order.json from schedule_pairs.py (default: file order)")
+    ap.add_argument("--tokens", type=Path, default=Path("backend/data/tokens.json"), help="Annotators to plan for")
+    ap.add_argument("--annotators", nargs="+", help="Annotator ids (instead of --tokens)")
+    ap.add_argument("--k", type=int, default=3, help="Labels per pair")
+    ap.add_argument("--gold-rate", type=float, default=GOLD_RATE)
+    ap.add_argument("--repeat-rate", type=float, default=REPEAT_RATE)
+    ap.add_argument("--repeat-gap", type=int, default=REPEAT_GAP)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--out", type=Path, default=Path("backend/data/plan.json"))
+    args = ap.parse_args()
+
+    if args.annotators:
+        annotators = list(dict.fromkeys(args.annotators))
+    elif args.tokens.exists():
+        with args.tokens.open("r", encoding="utf-8") as f:
+            annotators = list(dict.fromkeys(t["annotatorId"] for t in json.load(f)))
+    else:
+        annotators = []
+    if not annotators:
+        print("[ERROR] No annotators (--annotators or --tokens)", file=sys.stderr)
+        sys.exit(1)
+    if not args.pairs.exists():
+        print(f"[ERROR] Not found: {args.pairs}", file=sys.stderr)
+        sys.exit(1)
+    pairs = list(iter_records(args.pairs))
+    gold = list(iter_records(args.gold)) if args.gold.exists() else []
+
+    if args.order:
+        with args.order.open("r", encoding="utf-8") as f:
+            rank = {pid: n for n, pid in enumerate(json.load(f)["order"])}
+        pairs.sort(key=lambda r: rank.get(r["pair_id"], len(rank)))  # stable: unlisted keep file order
+    k = args.k
+    if k > len(annotators):
+        print(f"[WARN] --k {k} > {len(annotators)} annotators; each pair goes to all of them", file=sys.stderr)
+        k = len(annotators)
+
+    rng = random.Random(args.seed)
+    assigned = assign(len(pairs), annotators, k, rng)
+    plans = {a: with_extras(assigned[a], len(gold), args.gold_rate, args.repeat_rate, args.repeat_gap, rng)
+             for a in annotators}
+
+    doc = {"version": 1, "k": k, "pairs": pairs, "gold": gold, "annotators": plans}
+    doc["plan_id"] = plan_id(doc)
+    atomic_write(args.out, lambda f: f.write(json.dumps(doc, separators=(",", ":")) + "\n"))
+
+    loads = [len(v) for v in assigned.values()]
+    swapped = sum(s for v in assigned.values() for _p, s in v)
+    n_gold = sum(1 for v in plans.values() for s in v if s >> 1 & 3 == GOLD)
+    n_rep = sum(1 for v in plans.values() for s in v if s >> 1 & 3 == REPEAT)
+    print(f"{len(pairs)} pairs x {k} labels over {len(annotators)} annotators: "
+          f"{min(loads)}-{max(loads)} new pairs each, {swapped} of {sum(loads)} showings swapped, "
+          f"{n_gold} gold and {n_rep} repeat slots -> {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Rank agents / checkpoints from the left/right/cant_tell labels. Requires NumPy.
+
+Each vote is attributed to the clips it compared, as shown: its own left/right URLs
+(plan_assignments.py plans show some pairs swapped), or for votes without them the
+left/right clips of its pair_id in clip_pairs.json. Each clip path is looked up in
+the catalogue (rel_path with --path-prefix, as gen_pair.py writes it) for its agent and
+variant. Clips not in the catalogue are parsed by name as gen_pair2.py does, or for
+their last agent<N> token (agent only).
+--by picks what is ranked: agent, variant (e.g. early vs late checkpoint) or agent,variant.
+Votes between two clips of the same item say nothing about it and are skipped, as are
+gold pairs (not in clip_pairs.json) and repeats (unless --include-repeats).
+
+The model is Bradley-Terry with Davidson ties:
+  P(i > j) = p_i / D,  P(tie) = nu * sqrt(p_i p_j) / D,  D = p_i + p_j + nu * sqrt(p_i p_j)
+fitted by fixed-point (MM) iterations over the edge list of distinct item pairs, each one
+a handful of vectorised array operations and np.bincount sums, so the cost per iteration
+is linear in the number of distinct pairs however many votes there are. Each item also
+plays --prior virtual games (one win, one loss) against an average item, which keeps
+unbeaten or winless items finite.
+
+--out writes the ranking (log-strength, Elo-scaled score, record per item, nu). When
+--out already exists it is used as the starting point of the next fit, so refitting after
+new labels arrive takes a few iterations.
+
+Usage:
+  python rank_agents.py --annotations annotations_export.json --pairs backend/data/clip_pairs.json
+  python rank_agents.py --annotations annotations_store --catalogue catalogue.sqlite --by variant --out ranking.json
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+
+import gen_pair
+import gen_pair2
+from json_io import atomic_write, iter_records
+
+ELO_SCALE = 400 / math.log(10)
+# agent token of clip names gen_pair2.parse_filename does not cover, e.g. ..._tpost2_60_293_agent1.mp4
+RE_AGENT_TOKEN = re.compile(r"(?:^|_)agent(\d+)(?=_|\.mp4$)", re.IGNORECASE)
+OUTCOMES = {"left": 0, "right": 1, "cant_tell": 2}
+
+def iter_votes(path: Path) -> Iterator[tuple]:
+    """(pair_id, response, left_url, right_url, is_gold, is_repeat) from an export file or sync store."""
+    if path.is_dir():
+        import sync_annotations
+
+        cols = sync_annotations.load_store(path)
+        yield from zip(cols["pair_id"].tolist(), cols["response"].tolist(), cols["left_url"].tolist(),
+                       cols["right_url"].tolist(), cols["is_gold"].tolist(), cols["is_repeat"].tolist())
+        return
+    for rec in iter_records(path):
+        left, right = rec.get("left") or {}, rec.get("right") or {}
+        yield (rec.get("pair_id", rec.get("pairId")), rec.get("response"),
+               rec.get("left_url") or left.get("url"), rec.get("right_url") or right.get("url"),
+               bool(rec.get("is_gold", rec.get("isGold"))), bool(rec.get("is_repeat", rec.get("isRepeat"))))
+
+class Attribution:
+    """Clip path -> (agent, variant), from the catalogue or, failing that, the file name."""
+
+    def __init__(self, catalogue: Optional[Path], path_prefix: Optional[str]):
+        self.by_path = {}
+        if catalogue is not None:
+            factory = gen_pair.ClipFactory(path_prefix)
+            for e in gen_pair.iter_catalogue(catalogue):
+                self.by_path[factory.output_path(e["rel_path"])] = (e["agent"], e["variant"])
+
+    def __call__(self, path: Optional[str]) -> tuple[Optional[str], Optional[str]]:
+        if not path:
+            return (None, None)
+        hit = self.by_path.get(path)
+        if hit is not None:
+            return hit
+        name = os.path.basename(path)
+        agent = gen_pair2.parse_filename(name)[1]
+        if agent is None:
+            m = RE_AGENT_TOKEN.search(name)
+            agent = f"agent{m.group(1)}" if m else None
+        return (agent, None)
+
+def item_key(by: str, agent: Optional[str], variant: Optional[str]) -> Optional[str]:
+    if by == "agent":
+        return agent
+    if by == "variant":
+        return variant
+    return f"{agent}@{variant}" if agent is not None and variant is not None else None
+
+def comparisons(votes, pairs: dict, attribute: Attribution, by: str, include_repeats: bool):
+    """Encode usable votes as (items, left item index, right item index, outcome) arrays and skip counts."""
+    index: dict[str, int] = {}
+    left, right, outcome = [], [], []
+    skipped = {"gold": 0, "repeat": 0, "unattributed": 0, "same item": 0, "no response": 0}
+    for pair_id, response, left_url, right_url, is_gold, is_repeat in votes:
+        if is_gold:
+            skipped["gold"] += 1
+            continue
+        if is_repeat and not include_repeats:
+            skipped["repeat"] += 1
+            continue
+        if response not in OUTCOMES:
+            skipped["no response"] += 1
+            continue
+        pair = pairs.get(pair_id)
+        if left_url and right_url:
+            lpath, rpath = left_url, right_url
+        else:
+            lpath, rpath = (pair["left_clip"], pair["right_clip"]) if pair else (None, None)
+        a, b = item_key(by, *attribute(lpath)), item_key(by, *attribute(rpath))
+        if a is None or b is None:
+            skipped["unattributed"] += 1
+            continue
+        if a == b:
+            skipped["same item"] += 1
+            continue
+        left.append(index.setdefault(a, len(index)))
+        right.append(index.setdefault(b, len(index)))
+        outcome.append(OUTCOMES[response])
+    items = sorted(index, key=index.get)
+    return items, np.array(left, dtype=np.int64), np.array(right, dtype=np.int64), np.array(outcome, dtype=np.int8), skipped
+
+def edge_counts(n_items: int, left: np.ndarray, right: np.ndarray, outcome: np.ndarray):
+    """
+    Collapse votes onto distinct item pairs i < j: (i, j, wins of i, wins of j, ties).
+    One np.unique over packed pair keys plus three weighted bincounts.
+    """
+    i, j = np.minimum(left, right), np.maximum(left, right)
+    winner = np.where(outcome == 0, left, right)
+    keys, edge = np.unique(i * n_items + j, return_inverse=True)
+    n_edges = len(keys)
+    tie = outcome == 2
+    wi = np.bincount(edge, weights=(~tie) & (winner == i), minlength=n_edges)
+    wj = np.bincount(edge, weights=(~tie) & (winner == j), minlength=n_edges)
+    t = np.bincount(edge, weights=tie, minlength=n_edges)
+    return keys // n_items, keys % n_items, wi, wj, t
+
+def fit_davidson(n_items: int, ei, ej, wi, wj, t, init: Optional[np.ndarray] = None, nu: float = 0.5,
+                 prior: float = 0.5, tol: float = 1e-9, max_iter: int = 10_000):
+    """
+    MM / fixed-point fit of Bradley-Terry-Davidson strengths over an edge list.
+    Returns (log-strengths centred on 0, nu, iterations).
+    """
+    n = wi + wj + t
+    # numerator per item: wins + half of ties (+ the prior's virtual win)
+    num = np.bincount(ei, weights=wi + t / 2, minlength=n_items) + np.bincount(ej, weights=wj + t / 2, minlength=n_items)
+    num = num + prior
+    total_ties = t.sum()
+    p = np.ones(n_items) if init is None else np.exp(init - init.mean())
+    it = 0
+    for it in range(1, max_iter + 1):
+        pi, pj = p[ei], p[ej]
+        root = np.sqrt(pi * pj)
+        d = pi + pj + nu * root
+        # d(log-likelihood)/d p_i denominators: n_ij * (1 + nu/2 * sqrt(p_j/p_i)) / D_ij
+        den = (np.bincount(ei, weights=n * (1 + nu / 2 * np.sqrt(pj / pi)) / d, minlength=n_items)
+               + np.bincount(ej, weights=n * (1 + nu / 2 * np.sqrt(pi / pj)) / d, minlength=n_items))
+        den = den + 2 * prior / (p + 1)  # one win and one loss against an item of strength 1
+        new = num / den
+        new /= np.exp(np.log(new).mean())
+        if total_ties > 0:
+            root = np.sqrt(new[ei] * new[ej])
+            nu = total_ties / (n * root / (new[ei] + new[ej] + nu * root)).sum()
+        delta = np.abs(np.log(new) - np.log(p)).max() if n_items else 0.0
+        p = new
+        if delta < tol:
+            break
+    return np.log(p), (nu if total_ties > 0 else 0.0), it
+
+def record(n_items: int, ei, ej, wi, wj, t) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    wins = np.bincount(ei, weights=wi, minlength=n_items) + np.bincount(ej, weights=wj, minlength=n_items)
+    losses = np.bincount(ei, weights=wj, minlength=n_items) + np.bincount(ej, weights=wi, minlength=n_items)
+    ties = np.bincount(ei, weights=t, minlength=n_items) + np.bincount(ej, weights=t, minlength=n_items)
+    return wins, losses, ties
+
+def load_previous(path: Path, by: str) -> tuple[dict, Optional[float]]:
+    """item -> previous log-strength, and nu, from an earlier --out (same --by), or ({}, None)."""
+    if not path or not path.exists():
+        return {}, None
+    with path.open("r", encoding="utf-8") as f:
+        prev = json.load(f)
+    if prev.get("by") != by:
+        return {}, None
+    return {r["item"]: r["log_strength"] for r in prev["items"]}, prev.get("nu")
+
+def main():
+    ap = argparse.ArgumentParser(description="Rank agents/checkpoints with a Bradley-Terry (Davidson ties) fit")
+    ap.add_argument("--annotations", type=Path, default=Path("annotations_export.json"),
+                    help="export_annotations.js / /admin/export output, or a sync_annotations.py store")
+    ap.add_argument("--pairs", type=Path, default=Path("backend/data/clip_pairs.json"))
+    ap.add_argument("--catalogue", type=Path, help="Catalogue the pairs were generated from (json, jsonl or sqlite)")
+    ap.add_argument("--path-prefix", type=str, default="video", help="gen_pair.py --path-prefix used for the pairs")
+    ap.add_argument("--by", choices=["agent", "variant", "agent,variant"], default="agent")
+    ap.add_argument("--include-repeats", action="store_true", help="Count repeat votes as extra comparisons")
+    ap.add_argument("--prior", type=float, default=0.5, help="Virtual win+loss per item against an average item")
+    ap.add_argument("--out", type=Path, help="Write the ranking as JSON (and warm-start from it if it exists)")
+    args = ap.parse_args()
+
+    for p in (args.annotations, args.pairs):
+        if not p.exists():
+            print(f"[ERROR] Not found: {p}", file=sys.stderr)
+            sys.exit(1)
+    pairs = {r["pair_id"]: r for r in iter_records(args.pairs)}
+    attribute = Attribution(args.catalogue, args.path_prefix or None)
+    items, left, right, outcome, skipped = comparisons(iter_votes(args.annotations), pairs, attribute,
+                                                       args.by, args.include_repeats)
+    if not items:
+        print("[ERROR] No usable comparisons", file=sys.stderr)
+        sys.exit(1)
+    k = len(items)
+    ei, ej, wi, wj, t = edge_counts(k, left, right, outcome)
+
+    prev, prev_nu = load_previous(args.out, args.by)
+    init = None
+    if prev:
+        # known items start where they were; new ones at the average
+        init = np.array([prev.get(item, 0.0) for item in items])
+    log_p, nu, iterations = fit_davidson(k, ei, ej, wi, wj, t, init=init, nu=prev_nu or 0.5, prior=args.prior)
+    wins, losses, ties = record(k, ei, ej, wi, wj, t)
+
+    order = np.argsort(-log_p, kind="stable")
+    rows = [{
+        "item": items[i],
+        "log_strength": round(float(log_p[i]), 6),
+        "elo": round(1500 + ELO_SCALE * float(log_p[i]), 1),
+        "wins": int(wins[i]), "losses": int(losses[i]), "ties": int(ties[i]),
+    } for i in order]
+
+    print(f"{len(left)} comparisons over {len(ei)} item pairs; fit in {iterations} iterations"
+          f"{' (warm start)' if prev else ''}, tie parameter nu={nu:.3f}")
+    if any(skipped.values()):
+        print("[SKIP] " + ", ".join(f"{v} {k_}" for k_, v in skipped.items() if v), file=sys.stderr)
+    width = max(len(r["item"]) for r in rows)
+    print(f"{'rank':>4}  {'item':<{width}}  {'elo':>7}  {'W':>6} {'L':>6} {'T':>6}")
+    for rank, r in enumerate(rows, start=1):
+        print(f"{rank:>4}  {r['item']:<{width}}  {r['elo']:>7.1f}  {r['wins']:>6} {r['losses']:>6} {r['ties']:>6}")
+
+    if args.out:
+        doc = {"by": args.by, "nu": nu, "comparisons": int(len(left)), "items": rows}
+        atomic_write(args.out, lambda f: json.dump(doc, f, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Order candidate pairs by how much a label would tell us about the ranking. Requires NumPy.
+
+The candidates are an existing clip_pairs.json (e.g. a generous gen_pair.py strategy D
+list); pair_ids are kept, so annotations already stored against them stay valid. Current
+votes are fitted exactly as rank_agents.py does (Bradley-Terry with Davidson ties, same
+--by / attribution options), then pairs are ordered greedily by expected information gain:
+
+  I(i, j)  Fisher information of one vote about theta_i - theta_j,
+           (P(i wins) + P(j wins)) / 4 - (P(i wins) - P(j wins))^2 / 4
+  F_i      precision of item i: the prior's virtual games plus sum of n_ij * I(i, j)
+  gain     0.5 * log(1 + I(i, j) * (1/F_i + 1/F_j))
+
+A pair whose outcome is already clear (large strength gap) or whose items are already
+well measured scores low. Each scheduled pair counts as one expected label, so the
+precisions of its two items go up and the next pair between them is worth less; the
+greedy loop is a lazy max-heap over item pairs (gains only ever drop). Within one item
+pair, clip pairs with fewer existing labels go first, then file order. Pairs that say
+nothing about the ranking (same item, or unattributed) go last, in file order.
+
+Outputs (at least one):
+  --order  serving-order file {"by", "comparisons", "order": [pair_id, ...]}; the backend
+           serves new pairs in this order when backend/data/serving_order.json exists
+  --out    the candidate list itself, reordered (same records, same bytes per record)
+
+Usage:
+  python schedule_pairs.py --annotations annotations_store --order backend/data/serving_order.json
+  python schedule_pairs.py --annotations annotations_export.json --catalogue catalogue.sqlite --by variant --out clip_pairs_prioritized.json
+"""
+
+import argparse
+import heapq
+import json
+import math
+import sys
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+import rank_agents
+from json_io import atomic_write, iter_records, write_json_array, write_jsonl
+
+def outcome_probs(x, nu: float):
+    """P(i wins), P(j wins) for log-strength difference x = theta_i - theta_j (Davidson ties)."""
+    a, b = np.exp(x / 2), np.exp(-x / 2)
+    z = a + b + nu
+    return a / z, b / z
+
+def information(x, nu: float):
+    """Fisher information of one vote about the log-strength difference x."""
+    pw, pl = outcome_probs(x, nu)
+    return (pw + pl) / 4 - (pw - pl) ** 2 / 4
+
+def item_precision(log_p: np.ndarray, ei, ej, n, nu: float, prior: float) -> np.ndarray:
+    """Observed precision of each log-strength: prior games against an average item plus the votes."""
+    info = n * information(log_p[ei] - log_p[ej], nu)
+    k = len(log_p)
+    return (2 * prior * information(log_p, nu)
+            + np.bincount(ei, weights=info, minlength=k) + np.bincount(ej, weights=info, minlength=k))
+
+def schedule(groups: dict, log_p: np.ndarray, precision: np.ndarray, nu: float) -> list:
+    """
+    Greedy order of candidate indices. groups maps (i, j) -> candidate indices in serving
+    order; each pick raises F_i and F_j by I(i, j), and stale heap entries are rescored
+    when they surface.
+    """
+    precision = precision.astype(float)
+    version = [0] * len(precision)
+    info = {g: float(information(log_p[g[0]] - log_p[g[1]], nu)) for g in groups}
+    pos = dict.fromkeys(groups, 0)
+
+    def gain(g):
+        i, j = g
+        return 0.5 * math.log1p(info[g] * (1 / precision[i] + 1 / precision[j]))
+
+    # (-gain, first pending candidate, item pair, versions of both items when scored)
+    heap = [(-gain(g), idx[0], g, 0, 0) for g, idx in groups.items()]
+    heapq.heapify(heap)
+    order = []
+    while heap:
+        _neg, _first, g, vi, vj = heapq.heappop(heap)
+        i, j = g
+        if (vi, vj) != (version[i], version[j]):
+            heapq.heappush(heap, (-gain(g), groups[g][pos[g]], g, version[i], version[j]))
+            continue
+        order.append(groups[g][pos[g]])
+        pos[g] += 1
+        precision[i] += info[g]
+        precision[j] += info[g]
+        version[i] += 1
+        version[j] += 1
+        if pos[g] < len(groups[g]):
+            heapq.heappush(heap, (-gain(g), groups[g][pos[g]], g, version[i], version[j]))
+    return order
+
+def main():
+    ap = argparse.ArgumentParser(description="Order candidate pairs by expected information gain")
+    ap.add_argument("--annotations", type=Path, default=Path("annotations_export.json"),
+                    help="export_annotations.js / /admin/export output, or a sync_annotations.py store")
+    ap.add_argument("--pairs", type=Path, default=Path("backend/data/clip_pairs.json"), help="Candidate pairs")
+    ap.add_argument("--catalogue", type=Path, help="Catalogue the pairs were generated from (json, jsonl or sqlite)")
+    ap.add_argument("--path-prefix", type=str, default="video", help="gen_pair.py --path-prefix used for the pairs")
+    ap.add_argument("--by", choices=["agent", "variant", "agent,variant"], default="agent")
+    ap.add_argument("--include-repeats", action="store_true", help="Count repeat votes as extra comparisons")
+    ap.add_argument("--prior", type=float, default=0.5, help="Virtual win+loss per item against an average item")
+    ap.add_argument("--order", type=Path, help="Write the serving order (pair_ids) as JSON")
+    ap.add_argument("--out", type=Path, help="Write the candidate pairs reordered")
+    args = ap.parse_args()
+
+    if not args.order and not args.out:
+        print("[ERROR] Nothing to write (--order and/or --out)", file=sys.stderr)
+        sys.exit(1)
+    if not args.pairs.exists():
+        print(f"[ERROR] Not found: {args.pairs}", file=sys.stderr)
+        sys.exit(1)
+    records = list(iter_records(args.pairs))
+    pairs = {r["pair_id"]: r for r in records}
+    attribute = rank_agents.Attribution(args.catalogue, args.path_prefix or None)
+
+    votes = list(rank_agents.iter_votes(args.annotations)) if args.annotations.exists() else []
+    if not votes:
+        print(f"[WARN] No annotations in {args.annotations}; ordering by coverage alone", file=sys.stderr)
+    labels = Counter(v[0] for v in votes if not v[4])
+    items, left, right, outcome, _skipped = rank_agents.comparisons(votes, pairs, attribute, args.by,
+                                                                     args.include_repeats)
+
+    # every item a candidate touches gets an index, voted on or not
+    index = {item: i for i, item in enumerate(items)}
+    keys = []
+    for rec in records:
+        a = rank_agents.item_key(args.by, *attribute(rec["left_clip"]))
+        b = rank_agents.item_key(args.by, *attribute(rec["right_clip"]))
+        if a is None or b is None or a == b:
+            keys.append(None)
+            continue
+        i, j = index.setdefault(a, len(index)), index.setdefault(b, len(index))
+        keys.append((min(i, j), max(i, j)))
+    k = len(index)
+
+    ei, ej, wi, wj, t = rank_agents.edge_counts(k, left, right, outcome)
+    if len(left):
+        log_p, nu, _it = rank_agents.fit_davidson(k, ei, ej, wi, wj, t, prior=args.prior)
+    else:
+        log_p, nu = np.zeros(k), 0.5
+    precision = item_precision(log_p, ei, ej, wi + wj + t, nu, args.prior)
+
+    groups: dict[tuple, list] = {}
+    for n, key in enumerate(keys):
+        if key is not None:
+            groups.setdefault(key, []).append(n)
+    for idx in groups.values():
+        idx.sort(key=lambda n: (labels.get(records[n]["pair_id"], 0), n))
+    ordered = schedule(groups, log_p, precision, nu)
+    uninformative = [n for n, key in enumerate(keys) if key is None]
+    ordered += uninformative
+
+    print(f"{len(votes)} annotations, {len(left)} comparisons over {k} items (by {args.by}); "
+          f"{len(records)} candidates in {len(groups)} item pairs")
+    if uninformative:
+        print(f"[SKIP] {len(uninformative)} candidates compare the same item or are unattributed; scheduled last",
+              file=sys.stderr)
+    for n in ordered[:5]:
+        rec = records[n]
+        print(f"  {rec['pair_id']}  {rec['left_clip']}  vs  {rec['right_clip']}")
+
+    if args.order:
+        doc = {"by": args.by, "comparisons": int(len(left)), "order": [records[n]["pair_id"] for n in ordered]}
+        atomic_write(args.order, lambda f: f.write(json.dumps(doc, indent=2) + "\n"))
+        print(f"Wrote serving order of {len(ordered)} pairs to {args.order}")
+    if args.out:
+        write = write_jsonl if args.out.suffix == ".jsonl" else write_json_array
+        write((records[n] for n in ordered), args.out)
+        print(f"Wrote {len(ordered)} prioritized pairs to {args.out}")
+
+if __name__ == "__main__":
+    main()
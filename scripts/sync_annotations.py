@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Incrementally mirror the annotations collection into a local columnar store.
+
+Pages of GET <api>/admin/export.ndjson (NDJSON, _id order) are pulled after the last
+_id already held, flattened into columns and appended to --store as one part file per
+page:
+  <store>/part-000001.npz      NumPy arrays, one per column (default; needs NumPy)
+  <store>/part-000001.parquet  with --format parquet (needs pyarrow)
+  <store>/checkpoint.json      {"after": <last _id>, "parts": n, "records": n, "format": ...}
+A part is written before the checkpoint that counts it, so an interrupted sync (including
+a page cut off mid-body, which the server does when a query fails mid-stream) just
+re-fetches (and overwrites) its last page. The server holds back the last few seconds of
+inserts, so advancing the watermark never skips a record.
+
+Columns follow the flat export layout (annotator_id, pair_id, left_url, attention_x, ...);
+attention.samples and stageDurations are kept as JSON strings. Text columns are
+unicode arrays ("" for missing), numbers float64 (NaN for missing).
+
+  import sync_annotations
+  cols = sync_annotations.load_store("annotations_store")   # column name -> array
+
+Usage:
+  python sync_annotations.py --api https://host/api --token $ADMIN_TOKEN --store annotations_store
+  python sync_annotations.py --api http://localhost:3000/api --since 2026-01-01 --format parquet
+"""
+
+import argparse
+import http.client
+import json
+import os
+import sys
+import urllib.parse
+import urllib.request
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+from json_io import atomic_write
+
+# (column, kind); kind: "str" (unicode, "" if missing), "float" (NaN if missing), "bool"
+COLUMNS = [
+    ("_id", "str"),
+    ("annotator_id", "str"),
+    ("pair_id", "str"),
+    ("response", "str"),
+    ("surprise_choice", "str"),
+    ("left_url", "str"),
+    ("right_url", "str"),
+    ("left_surprise", "float"),
+    ("right_surprise", "float"),
+    ("is_gold", "bool"),
+    ("gold_expected", "str"),
+    ("gold_correct", "float"),
+    ("is_repeat", "bool"),
+    ("repeat_of", "str"),
+    ("presented_time", "str"),
+    ("timestamp", "str"),
+    ("response_time_ms", "float"),
+    ("attention_type", "str"),
+    ("attention_side", "str"),
+    ("attention_x", "float"),
+    ("attention_y", "float"),
+    ("attention_coord_space", "str"),
+    ("attention_decision_ms", "float"),
+    ("attention_samples", "str"),
+    ("stage_durations", "str"),
+]
+
+def flatten(doc: dict) -> dict:
+    """One exported annotation document as a flat row of COLUMNS."""
+    att = doc.get("attention") or {}
+    left, right = doc.get("left") or {}, doc.get("right") or {}
+    gold_correct = doc.get("goldCorrect")
+    return {
+        "_id": doc["_id"],
+        "annotator_id": doc.get("annotatorId"),
+        "pair_id": doc.get("pairId"),
+        "response": doc.get("response"),
+        "surprise_choice": doc.get("surpriseChoice"),
+        "left_url": left.get("url"),
+        "right_url": right.get("url"),
+        "left_surprise": left.get("surprise"),
+        "right_surprise": right.get("surprise"),
+        "is_gold": bool(doc.get("isGold")),
+        "gold_expected": doc.get("goldExpected"),
+        "gold_correct": None if gold_correct is None else float(gold_correct),
+        "is_repeat": bool(doc.get("isRepeat")),
+        "repeat_of": doc.get("repeatOf"),
+        "presented_time": doc.get("presentedTime"),
+        "timestamp": doc.get("timestamp"),
+        "response_time_ms": doc.get("responseTimeMs"),
+        "attention_type": att.get("type"),
+        "attention_side": att.get("side"),
+        "attention_x": att.get("x"),
+        "attention_y": att.get("y"),
+        "attention_coord_space": att.get("coordSpace"),
+        "attention_decision_ms": att.get("decisionAtMs"),
+        "attention_samples": json.dumps(att["samples"], separators=(",", ":")) if att.get("samples") else None,
+        "stage_durations": json.dumps(doc["stageDurations"], separators=(",", ":")) if doc.get("stageDurations") else None,
+    }
+
+def write_npz(rows: list[dict], path: Path) -> None:
+    import numpy as np
+
+    cols = {}
+    for name, kind in COLUMNS:
+        values = [r[name] for r in rows]
+        if kind == "str":
+            cols[name] = np.array(["" if v is None else str(v) for v in values], dtype=str)
+        elif kind == "bool":
+            cols[name] = np.array(values, dtype=bool)
+        else:
+            cols[name] = np.array([float("nan") if v is None else float(v) for v in values], dtype=np.float64)
+    atomic_write(path, lambda f: np.savez(f, **cols), "wb")
+
+def write_parquet(rows: list[dict], path: Path) -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.table({name: [r[name] for r in rows] for name, _kind in COLUMNS})
+    tmp = path.with_name(path.name + ".tmp")
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+
+WRITERS = {"npz": write_npz, "parquet": write_parquet}
+
+# The server caps a page at this many records (EXPORT_MAX_LIMIT in backend/routes/api.js).
+# sync() stops at the first page shorter than it asked for, so it must never ask for more.
+MAX_PAGE_SIZE = 100000
+
+class Checkpoint:
+    def __init__(self, store: Path, fmt: str):
+        self.path = store / "checkpoint.json"
+        self.state = {"after": None, "parts": 0, "records": 0, "format": fmt}
+        if self.path.exists():
+            with self.path.open("r", encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def save(self) -> None:
+        atomic_write(self.path, lambda f: json.dump(self.state, f, indent=2))
+
+def http_lines(url: str, token: str, timeout: float = 300.0) -> Iterator[bytes]:
+    """Lines of an HTTP response body, read as they arrive."""
+    req = urllib.request.Request(url, headers={"x-admin-token": token, "Accept": "application/x-ndjson"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        yield from resp
+
+def sync(api: str, token: str, store: Path, fmt: str = "npz", page_size: int = 10000,
+         since: Optional[str] = None, fetch: Callable[[str, str], Iterator[bytes]] = http_lines) -> int:
+    """
+    Pull every page after the checkpoint into store; returns the number of new records.
+    `fetch(url, token)` yields the response lines (swap it out to sync from a test server).
+    """
+    store.mkdir(parents=True, exist_ok=True)
+    cp = Checkpoint(store, fmt)
+    if cp.state["format"] != fmt:
+        raise ValueError(f"{store} holds {cp.state['format']} parts; sync it with --format {cp.state['format']}")
+    write = WRITERS[fmt]
+    page_size = min(page_size, MAX_PAGE_SIZE)
+    added = 0
+    while True:
+        params = {"limit": page_size}
+        if cp.state["after"]:
+            params["after"] = cp.state["after"]
+        elif since:
+            params["since"] = since
+        url = f"{api.rstrip('/')}/admin/export.ndjson?{urllib.parse.urlencode(params)}"
+        rows = [flatten(json.loads(line)) for line in fetch(url, token) if line.strip()]
+        if not rows:
+            break
+        part = store / f"part-{cp.state['parts'] + 1:06d}.{fmt}"
+        write(rows, part)
+        cp.state.update(after=rows[-1]["_id"], parts=cp.state["parts"] + 1, records=cp.state["records"] + len(rows))
+        cp.save()
+        added += len(rows)
+        print(f"[{cp.state['parts']}] +{len(rows)} records (through {rows[-1]['timestamp']})")
+        if len(rows) < page_size:
+            break
+    return added
+
+def load_store(store) -> dict:
+    """All parts of a store as column name -> NumPy array, in _id order."""
+    import numpy as np
+
+    store = Path(store)
+    fmt = Checkpoint(store, "npz").state["format"]
+    parts = sorted(store.glob(f"part-*.{fmt}"))
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.concat_tables([pq.read_table(p) for p in parts]) if parts else None
+        return {name: (table.column(name).to_numpy(zero_copy_only=False) if table is not None else np.array([]))
+                for name, _kind in COLUMNS}
+    loaded = [np.load(p) for p in parts]
+    return {name: np.concatenate([z[name] for z in loaded]) if loaded else np.array([]) for name, _kind in COLUMNS}
+
+def main():
+    ap = argparse.ArgumentParser(description="Pull new annotations into a local columnar store")
+    ap.add_argument("--api", default=os.environ.get("ANNOTATOR_API", "http://localhost:3000/api"),
+                    help="API base URL (default: $ANNOTATOR_API or http://localhost:3000/api)")
+    ap.add_argument("--token", default=os.environ.get("ADMIN_TOKEN"), help="Admin token (default: $ADMIN_TOKEN)")
+    ap.add_argument("--store", type=Path, default=Path("annotations_store"))
+    ap.add_argument("--format", choices=sorted(WRITERS), default="npz")
+    ap.add_argument("--page-size", type=int, default=10000, help=f"Records per request (1..{MAX_PAGE_SIZE})")
+    ap.add_argument("--since", help="ISO time to start from on the first sync (default: everything)")
+    args = ap.parse_args()
+
+    if not 1 <= args.page_size <= MAX_PAGE_SIZE:
+        ap.error(f"--page-size must be between 1 and {MAX_PAGE_SIZE} (the server's page limit)")
+    if not args.token:
+        print("[ERROR] No admin token (--token or $ADMIN_TOKEN)", file=sys.stderr)
+        sys.exit(1)
+    try:
+        added = sync(args.api, args.token, args.store, args.format, args.page_size, args.since)
+    except ValueError as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        sys.exit(1)
+    except (OSError, http.client.HTTPException) as e:
+        # URLError, timeouts, resets and IncompleteRead (a page cut off mid-body): the page
+        # being fetched is dropped whole, the checkpoint still ends at the last complete one
+        cp = Checkpoint(args.store, args.format).state
+        print(f"[ERROR] {args.api}: {e}", file=sys.stderr)
+        print(f"[ERROR] Checkpoint intact ({cp['records']} records in {cp['parts']} parts, after {cp['after']});"
+              f" re-run to resume", file=sys.stderr)
+        sys.exit(1)
+    cp = Checkpoint(args.store, args.format).state
+    print(f"Synced {added} new annotations; {cp['records']} in {cp['parts']} parts -> {args.store}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic clip datasets at a given scale, for benchmarks (bench_suite.py) and
+for trying the pipeline without real videos.
+
+Layouts:
+  tree  <root>/<scenario>/<variant>/<agent>/<route_id>/clip_###.mp4   (gen_catalogue.py)
+  flat  <root>/<scenario>/<variant>__<scenario>__tpre2_tpost2_<a>_<b>__agent<N>_<route>.mp4
+                                                                      (gen_pair2.py)
+Clips fill scenarios x variants x agents x routes x --clips-per-route in catalogue
+order until --clips are written; --density < 1 leaves random holes (sparse folders).
+
+File contents (--file):
+  empty   zero-byte files
+  sparse  --size bytes that take no disk space (truncate)
+  mp4     a header-only MP4 (moov with duration/fps/size, mdat padded sparsely to --size)
+          that mp4_header.py, and so gen_catalogue.py --probe, can read
+--link hard-links every clip to one file, which makes million-clip trees fast to create.
+
+In memory, synthetic_catalogue() gives the catalogue rows gen_catalogue.py would write
+for a tree layout, without touching the disk.
+
+Usage:
+  python synth_dataset.py --root /tmp/synth --clips 100000
+  python synth_dataset.py --root /tmp/synth_flat --layout flat --clips 1000000 --link
+  python synth_dataset.py --root /tmp/synth_mp4 --clips 1000 --file mp4 --duration 4 --fps 10
+"""
+
+import argparse
+import os
+import random
+import struct
+import sys
+from pathlib import Path
+from typing import Iterator
+
+SCENARIOS = ["car_following", "lane_change", "cut_in", "pedestrian_crossing", "roundabout",
+             "unprotected_left", "merge", "overtake"]
+
+def scenario_name(s: int) -> str:
+    """Alphabetic scenario names (gen_pair2.py reads the scenario as the trailing letters)."""
+    if s < len(SCENARIOS):
+        return SCENARIOS[s]
+    letters = ""
+    n = s
+    while True:
+        n, r = divmod(n, 26)
+        letters = chr(ord("a") + r) + letters
+        if n == 0:
+            return f"scenario_{letters}"
+
+def iter_clips(n_clips: int, scenarios: int, variants: int, agents: int, clips_per_route: int,
+               density: float, seed: int) -> Iterator[tuple]:
+    """(scenario, variant, agent number, route_id, clip_idx) in catalogue order, n_clips of them."""
+    rng = random.Random(seed)
+    cell = scenarios * variants * agents * clips_per_route
+    # enough routes per agent for n_clips (with a margin for the holes); the last ones stay empty
+    routes = -(-n_clips // cell) if density >= 1 else int(n_clips / (cell * density) * 1.05) + 2
+    written = 0
+    for s in range(scenarios):
+        for v in range(variants):
+            for a in range(agents):
+                for r in range(1, routes + 1):
+                    for c in range(1, clips_per_route + 1):
+                        if density < 1 and rng.random() >= density:
+                            continue
+                        yield scenario_name(s), f"variant{v}", a, r, c
+                        written += 1
+                        if written == n_clips:
+                            return
+
+def synthetic_catalogue(scenarios: int, variants: int, agents: int, routes: int, clips: int,
+                        density: float, seed: int) -> list[dict]:
+    """Catalogue rows of a full scenarios x variants x agents x routes x clips grid (minus holes)."""
+    rng = random.Random(seed)
+    rows = []
+    for s in range(scenarios):
+        for v in range(variants):
+            for a in range(agents):
+                for r in range(1, routes + 1):
+                    for c in range(1, clips + 1):
+                        if rng.random() >= density:
+                            continue
+                        scen, variant, agent = f"scenario{s}", f"variant{v}", f"actor{a:04d}"
+                        rows.append({
+                            "scenario": scen, "variant": variant, "agent": agent,
+                            "route_id": r, "clip_idx": c,
+                            "rel_path": f"{scen}/{variant}/{agent}/{r}/clip_{c:03d}.mp4",
+                        })
+    return rows
+
+def tree_path(scenario: str, variant: str, agent: int, route: int, clip: int) -> str:
+    return f"{scenario}/{variant}/actor{agent:04d}/{route}/clip_{clip:03d}.mp4"
+
+def flat_path(scenario: str, variant: str, agent: int, route: int, clip: int) -> str:
+    start = clip * 40
+    return f"{scenario}/{variant}__{scenario}__tpre2_tpost2_{start}_{start + 39}__agent{agent + 1}_{route}.mp4"
+
+def _box(btype: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), btype) + payload
+
+def _full_box(btype: bytes, payload: bytes) -> bytes:
+    return _box(btype, b"\0\0\0\0" + payload)  # version 0, no flags
+
+def mp4_header(duration_s: float, fps: float, width: int, height: int) -> bytes:
+    """ftyp + moov of a constant-frame-rate video track, as far as mp4_header.py reads it."""
+    timescale = 1000 * round(fps) if fps == round(fps) else 90000
+    frames = max(1, round(duration_s * fps))
+    delta = round(timescale / fps)
+    track_duration = frames * delta
+    movie_duration = round(duration_s * 1000)
+    mvhd = _full_box(b"mvhd", struct.pack(">IIII", 0, 0, 1000, movie_duration) + b"\0" * 80)
+    tkhd = _full_box(b"tkhd", b"\0" * 72 + struct.pack(">II", width << 16, height << 16))
+    mdhd = _full_box(b"mdhd", struct.pack(">IIII", 0, 0, timescale, track_duration) + b"\0" * 4)
+    hdlr = _full_box(b"hdlr", b"\0" * 4 + b"vide" + b"\0" * 12 + b"video\0")
+    stts = _full_box(b"stts", struct.pack(">III", 1, frames, delta))
+    trak = _box(b"trak", tkhd + _box(b"mdia", mdhd + hdlr + _box(b"minf", _box(b"stbl", stts))))
+    return _box(b"ftyp", b"isom\0\0\2\0isomiso2mp41") + _box(b"moov", mvhd + trak)
+
+def write_clip(path: Path, mode: str, size: int, header: bytes) -> None:
+    with open(path, "wb") as f:
+        if mode == "mp4":
+            f.write(header)
+            f.write(struct.pack(">I4s", max(8, size - len(header)), b"mdat"))
+            f.truncate(max(size, len(header) + 8))
+        elif mode == "sparse":
+            f.truncate(size)
+
+def generate(root: Path, layout: str, n_clips: int, scenarios: int, variants: int, agents: int,
+             clips_per_route: int, density: float, seed: int, mode: str, size: int, link: bool,
+             duration_s: float, fps: float, width: int, height: int) -> int:
+    """Write the dataset; returns the number of clips."""
+    name = tree_path if layout == "tree" else flat_path
+    header = mp4_header(duration_s, fps, width, height) if mode == "mp4" else b""
+    template = None
+    if link:
+        root.mkdir(parents=True, exist_ok=True)
+        template = root.parent / f".{root.name}.template.mp4"  # outside root, so no scanner sees it
+        write_clip(template, mode, size, header)
+    made_dirs = set()
+    n = 0
+    for clip in iter_clips(n_clips, scenarios, variants, agents, clips_per_route, density, seed):
+        path = root / name(*clip)
+        parent = path.parent
+        if parent not in made_dirs:
+            parent.mkdir(parents=True, exist_ok=True)
+            made_dirs.add(parent)
+        if template is not None:
+            if path.exists():
+                path.unlink()
+            os.link(template, path)
+        else:
+            write_clip(path, mode, size, header)
+        n += 1
+    return n
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate a synthetic clip dataset")
+    ap.add_argument("--root", type=Path, required=True)
+    ap.add_argument("--layout", choices=["tree", "flat"], default="tree")
+    ap.add_argument("--clips", type=int, default=1000, help="Number of clips")
+    ap.add_argument("--scenarios", type=int, default=4)
+    ap.add_argument("--variants", type=int, default=3)
+    ap.add_argument("--agents", type=int, default=8)
+    ap.add_argument("--clips-per-route", type=int, default=20)
+    ap.add_argument("--density", type=float, default=1.0, help="Fraction of grid slots filled")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--file", choices=["empty", "sparse", "mp4"], default="empty", help="Clip file contents")
+    ap.add_argument("--size", type=int, default=1 << 20, help="Apparent file size for sparse/mp4 (bytes)")
+    ap.add_argument("--link", action="store_true", help="Hard-link all clips to one file")
+    ap.add_argument("--duration", type=float, default=4.0, help="Clip duration in the mp4 header (s)")
+    ap.add_argument("--fps", type=float, default=10.0, help="Frame rate in the mp4 header")
+    ap.add_argument("--width", type=int, default=1280)
+    ap.add_argument("--height", type=int, default=720)
+    args = ap.parse_args()
+
+    if not 0 < args.density <= 1:
+        ap.error("--density must be in (0, 1]")
+    if args.root.exists() and any(args.root.iterdir()):
+        print(f"[WARN] {args.root} is not empty; clips are added to it", file=sys.stderr)
+    n = generate(args.root, args.layout, args.clips, args.scenarios, args.variants, args.agents,
+                 args.clips_per_route, args.density, args.seed, args.file, args.size, args.link,
+                 args.duration, args.fps, args.width, args.height)
+    print(f"Wrote {n} {args.layout} clips ({args.file}{', hard-linked' if args.link else ''}) under {args.root}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Poster frames and scrub-preview sprite sheets for the clips of a catalogue.
+
+Each clip is decoded once: a single ffmpeg process splits the video stream into
+  - a poster frame (JPEG, the frame at --poster-at seconds, at most --poster-width wide)
+  - a sprite sheet of --count evenly spaced thumbnails, --tile-width wide, tiled --cols
+    per row
+Clips are processed on a pool of --jobs worker processes.
+
+Outputs are cached by clip content: they are named after the clip's SHA-256 and a hash
+of the settings, under <root>/thumbnails/<xx>/, so unchanged, renamed or duplicated clips
+are not decoded again. Clip hashes are kept in <root>/thumbnails/hashes.jsonl keyed by
+rel_path, size and mtime, so unchanged clips are not re-hashed either.
+
+The catalogue (json, jsonl or sqlite, as written by gen_catalogue.py) is rewritten in
+place, in the same format, with the outputs recorded next to rel_path:
+  "rel_path": "scen/variant/agent/1/clip_001.mp4",
+  "poster": "thumbnails/3f/3fa2...-1c9e.poster.jpg",
+  "sprite": {"rel_path": "thumbnails/3f/3fa2...-1c9e.sprite.jpg", "cols": 5, "rows": 4,
+             "count": 20, "interval_s": 0.2},
+Paths are relative to --root like rel_path, so gen_pair.py --path-prefix applies to them
+and it passes them on to the player as left_poster/left_sprite (right_...).
+
+Usage:
+  python thumbnails.py --catalogue clip_paris.json --root video
+  python thumbnails.py --catalogue catalogue.sqlite --root video --count 30 --cols 6 --jobs 8
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import subprocess
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import catalogue_db
+from gen_catalogue import THUMBNAILS_DIR, ProbeCache
+from json_io import iter_records, write_json_array, write_jsonl
+from mp4_header import probe_mp4
+from transcode import sha256_file
+
+class ThumbSettings:
+    def __init__(self, count: int = 20, cols: int = 5, tile_width: int = 160,
+                 poster_width: int = 640, poster_at: float = 0.0):
+        self.count = count
+        self.cols = cols
+        self.rows = math.ceil(count / cols)
+        self.tile_width = tile_width
+        self.poster_width = poster_width
+        self.poster_at = poster_at
+
+    def key(self) -> str:
+        """Short hash of everything that changes the output images."""
+        s = json.dumps([self.count, self.cols, self.tile_width, self.poster_width, self.poster_at])
+        return hashlib.sha256(s.encode()).hexdigest()[:8]
+
+def filter_graph(s: ThumbSettings, duration: float) -> str:
+    interval = duration / s.count if duration > 0 else 1.0
+    return (
+        "[0:v]split=2[p][s];"
+        f"[p]trim=start={s.poster_at},setpts=PTS-STARTPTS,scale='min({s.poster_width},iw)':-2[poster];"
+        f"[s]fps=1/{interval:.6f},scale={s.tile_width}:-2,tile={s.cols}x{s.rows}[sprite]"
+    )
+
+def render(src: Path, poster: Path, sprite: Path, s: ThumbSettings, duration: float) -> Optional[str]:
+    """Decode src once into poster and sprite (via temporary files); return an error message or None."""
+    poster.parent.mkdir(parents=True, exist_ok=True)
+    tmp_poster = poster.with_name(f".{poster.name}.{os.getpid()}.part")
+    tmp_sprite = sprite.with_name(f".{sprite.name}.{os.getpid()}.part")
+    jpeg = ["-frames:v", "1", "-f", "image2", "-c:v", "mjpeg", "-update", "1"]
+    cmd = ["ffmpeg", "-y", "-v", "error", "-i", str(src),
+           "-filter_complex", filter_graph(s, duration),
+           "-map", "[poster]", *jpeg, "-q:v", "3", str(tmp_poster),
+           "-map", "[sprite]", *jpeg, "-q:v", "5", str(tmp_sprite)]
+    try:
+        proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if proc.returncode != 0:
+            return (proc.stderr.strip().splitlines() or [f"ffmpeg exited with {proc.returncode}"])[-1]
+        if not (tmp_poster.exists() and tmp_poster.stat().st_size and tmp_sprite.exists() and tmp_sprite.stat().st_size):
+            return "ffmpeg produced no image"
+        # the same clip content may be rendered by two workers at once; either result is fine
+        os.replace(tmp_poster, poster)
+        os.replace(tmp_sprite, sprite)
+        return None
+    except OSError as e:
+        return str(e)
+    finally:
+        tmp_poster.unlink(missing_ok=True)
+        tmp_sprite.unlink(missing_ok=True)
+
+def thumb_job(job: tuple) -> tuple:
+    """
+    Worker: (rel_path, root, digest or None, duration, settings) ->
+    (rel_path, digest, outputs or None, error or None). Runs in a pool process.
+    """
+    rel_path, root, digest, duration, s = job
+    src = root / rel_path
+    try:
+        if digest is None:
+            digest = sha256_file(src)
+        name = f"{digest[:16]}-{s.key()}"
+        rel_dir = f"{THUMBNAILS_DIR}/{digest[:2]}"
+        poster, sprite = f"{rel_dir}/{name}.poster.jpg", f"{rel_dir}/{name}.sprite.jpg"
+        info = probe_mp4(src)
+        if info is not None and info.duration_s > 0:
+            duration = info.duration_s
+        if not ((root / poster).exists() and (root / sprite).exists()):
+            err = render(src, root / poster, root / sprite, s, duration)
+            if err:
+                return rel_path, digest, None, err
+        outputs = {
+            "poster": poster,
+            "sprite": {"rel_path": sprite, "cols": s.cols, "rows": s.rows, "count": s.count,
+                       "interval_s": round(duration / s.count, 6) if duration > 0 else None},
+        }
+        return rel_path, digest, outputs, None
+    except OSError as e:
+        return rel_path, digest, None, str(e)
+
+def with_outputs(e: dict, outputs: dict) -> dict:
+    """e with poster/sprite inserted right after rel_path (replacing earlier ones)."""
+    out = {}
+    for k, v in e.items():
+        if k in outputs:
+            continue
+        out[k] = v
+        if k == "rel_path":
+            out.update(outputs)
+    return out
+
+class HashCache(ProbeCache):
+    """ProbeCache's sidecar format with the clip's SHA-256 as the cached value."""
+
+    def get(self, rel_path: str, sig) -> Optional[str]:
+        rec = self.records.get(rel_path)
+        if rec is None or (rec["size"], rec["mtime_ns"]) != sig or "sha256" not in rec:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.live[rel_path] = rec
+        return rec["sha256"]
+
+    def put(self, rel_path: str, sig, digest: str) -> None:
+        self.live[rel_path] = {"rel_path": rel_path, "size": sig[0], "mtime_ns": sig[1], "sha256": digest}
+
+def annotate(entries: Iterable[dict], root: Path, s: ThumbSettings, jobs: int, cache: HashCache,
+             stats: dict) -> Iterator[dict]:
+    """Yield entries, in order, with poster/sprite added; clips that fail keep their entry as is."""
+    def jobs_for(entries):
+        for e in entries:
+            src = root / e["rel_path"]
+            try:
+                sig = ProbeCache.signature(src)
+            except OSError:
+                sig = None
+            digest = cache.get(e["rel_path"], sig) if sig else None
+            yield e, sig, (e["rel_path"], root, digest, float(e.get("duration_s") or 0.0), s)
+
+    window = max(1, jobs) * 4
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=max(1, jobs)) as pool:
+        def drain_one():
+            e, sig, fut = pending.popleft()
+            rel_path, digest, outputs, err = fut.result()
+            if err:
+                print(f"[WARN] {rel_path}: {err}", file=sys.stderr)
+                stats["failed"] += 1
+                return e
+            if sig is not None:
+                cache.put(rel_path, sig, digest)
+            stats["done"] += 1
+            return with_outputs(e, outputs)
+
+        for e, sig, job in jobs_for(entries):
+            pending.append((e, sig, pool.submit(thumb_job, job)))
+            if len(pending) >= window:
+                yield drain_one()
+        while pending:
+            yield drain_one()
+
+def catalogue_format(path: Path) -> str:
+    if catalogue_db.is_catalogue_db(path):
+        return "sqlite"
+    with path.open("r", encoding="utf-8") as f:
+        head = f.read(64).lstrip()
+    return "json" if head.startswith("[") else "jsonl"
+
+def main():
+    ap = argparse.ArgumentParser(description="Write poster frames and sprite sheets and record them in the catalogue")
+    ap.add_argument("--catalogue", type=Path, default=Path("clip_paris.json"),
+                    help="Catalogue to update in place (json, jsonl or sqlite)")
+    ap.add_argument("--root", type=Path, default=Path("video"), help="Dataset root the rel_paths are relative to")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    ap.add_argument("--count", type=int, default=20, help="Thumbnails per sprite sheet")
+    ap.add_argument("--cols", type=int, default=5, help="Thumbnails per sprite sheet row")
+    ap.add_argument("--tile-width", type=int, default=160, help="Thumbnail width in pixels")
+    ap.add_argument("--poster-width", type=int, default=640, help="Maximum poster width in pixels")
+    ap.add_argument("--poster-at", type=float, default=0.0, help="Poster frame time in seconds")
+    args = ap.parse_args()
+
+    if not args.catalogue.exists():
+        print(f"[ERROR] Catalogue not found: {args.catalogue}", file=sys.stderr)
+        sys.exit(1)
+    if args.count < 1 or args.cols < 1:
+        ap.error("--count and --cols must be at least 1")
+    settings = ThumbSettings(args.count, args.cols, args.tile_width, args.poster_width, args.poster_at)
+    (args.root / THUMBNAILS_DIR).mkdir(parents=True, exist_ok=True)
+    cache = HashCache(args.root / THUMBNAILS_DIR / "hashes.jsonl")
+    stats = {"done": 0, "failed": 0}
+
+    fmt = catalogue_format(args.catalogue)
+    if fmt == "sqlite":
+        entries = catalogue_db.iter_entries(args.catalogue)
+        n = catalogue_db.write_db(annotate(entries, args.root, settings, args.jobs, cache, stats), args.catalogue)
+    else:
+        # the writers replace the catalogue only once complete, so it can be streamed from meanwhile
+        writer = write_json_array if fmt == "json" else write_jsonl
+        n = writer(annotate(iter_records(args.catalogue), args.root, settings, args.jobs, cache, stats), args.catalogue)
+    cache.save()
+    print(f"Thumbnails for {stats['done']}/{n} clips ({stats['failed']} failed, {cache.hits} hashes cached)"
+          f" -> {args.root / THUMBNAILS_DIR}; updated {args.catalogue}")
+
+if __name__ == "__main__":
+    main()
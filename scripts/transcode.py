@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Parallel replacement for vid_conv.sh: re-encode clips for the web player with ffmpeg.
+
+Every *.mp4 in --input-dir is encoded to --output-dir with the same settings as
+vid_conv.sh (H.264 high@4.0, yuv420p, CRF 20, constant frame rate, faststart, no audio),
+on --jobs concurrent ffmpeg processes.
+
+A manifest (<output-dir>/transcode_manifest.jsonl) records, per output file, the
+SHA-256 of its source, a hash of the encode settings (ffmpeg arguments + ffmpeg
+version) and the output's size/mtime. A clip is skipped when all of these still match,
+so re-running over a growing folder only encodes new or changed clips. Sources are only
+re-hashed when their size or mtime changed since the manifest entry was written.
+
+Each encode goes to a temporary file and is checked before it replaces the output and
+is recorded in the manifest:
+  - moov box before mdat (faststart) and constant frame durations, read from the MP4
+    header (mp4_header.py)
+  - pix_fmt yuv420p (ffprobe)
+
+Usage:
+  python transcode.py --input-dir frontend/videos/early_late_mi_training
+  python transcode.py --input-dir new_batch --output-dir frontend/videos/new_batch --jobs 8
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Optional
+
+from json_io import atomic_write
+from mp4_header import probe_mp4
+
+def encode_args(crf: int, preset: str, threads: int) -> list[str]:
+    """ffmpeg output options (vid_conv.sh settings)."""
+    return [
+        "-c:v", "libx264", "-pix_fmt", "yuv420p", "-profile:v", "high", "-level", "4.0",
+        "-movflags", "+faststart",
+        "-preset", preset, "-crf", str(crf),
+        "-vsync", "cfr",
+        "-an",
+        "-threads", str(threads),
+    ]
+
+def rendition_args(height: int, kbps: int, preset: str, threads: int) -> list[str]:
+    """ffmpeg output options for a lower-bitrate rendition: scaled to height, capped bitrate."""
+    return [
+        "-vf", f"scale=-2:{height}",
+        "-c:v", "libx264", "-pix_fmt", "yuv420p", "-profile:v", "high", "-level", "4.0",
+        "-movflags", "+faststart",
+        "-preset", preset, "-b:v", f"{kbps}k", "-maxrate", f"{kbps * 3 // 2}k", "-bufsize", f"{kbps * 2}k",
+        "-vsync", "cfr",
+        "-an",
+        "-threads", str(threads),
+    ]
+
+def ffmpeg_version() -> str:
+    try:
+        out = subprocess.check_output(["ffmpeg", "-version"], stderr=subprocess.DEVNULL, text=True)
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+    return out.splitlines()[0] if out else ""
+
+def settings_hash(args: list[str], version: str) -> str:
+    # -threads does not change the encoded output
+    key = [a for i, a in enumerate(args) if a != "-threads" and (i == 0 or args[i - 1] != "-threads")]
+    return hashlib.sha256(json.dumps({"args": key, "ffmpeg": version}).encode()).hexdigest()[:16]
+
+def sha256_file(path: Path, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        while True:
+            b = f.read(chunk)
+            if not b:
+                break
+            h.update(b)
+    return h.hexdigest()
+
+class Manifest:
+    """
+    JSONL manifest, one record per output file:
+      {"name": "...", "source_sha256": "...", "source_size": <bytes>, "source_mtime_ns": <int>,
+       "settings": "...", "output_size": <bytes>, "output_mtime_ns": <int>}
+    Records are appended as encodes finish (an interrupted run keeps its progress; the
+    last record for a name wins) and compacted by save().
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.records: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        if path.exists():
+            with path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        rec = json.loads(line)
+                        self.records[rec["name"]] = rec
+                    except (ValueError, KeyError):
+                        continue  # truncated line from an interrupted run; that clip is re-encoded
+        self._log = path.open("a", encoding="utf-8")
+
+    def source_hash(self, name: str, src: Path) -> str:
+        """SHA-256 of src, reusing the recorded hash while size and mtime are unchanged."""
+        st = src.stat()
+        rec = self.records.get(name)
+        if rec and (rec["source_size"], rec["source_mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+            return rec["source_sha256"]
+        return sha256_file(src)
+
+    def is_current(self, name: str, digest: str, settings: str, out: Path) -> bool:
+        rec = self.records.get(name)
+        if rec is None or rec["source_sha256"] != digest or rec["settings"] != settings:
+            return False
+        try:
+            st = out.stat()
+        except OSError:
+            return False
+        return (rec["output_size"], rec["output_mtime_ns"]) == (st.st_size, st.st_mtime_ns)
+
+    def put(self, name: str, src: Path, digest: str, settings: str, out: Path) -> None:
+        s, o = src.stat(), out.stat()
+        rec = {
+            "name": name, "source_sha256": digest, "source_size": s.st_size, "source_mtime_ns": s.st_mtime_ns,
+            "settings": settings, "output_size": o.st_size, "output_mtime_ns": o.st_mtime_ns,
+        }
+        with self._lock:
+            self.records[name] = rec
+            self._log.write(json.dumps(rec, separators=(",", ":")) + "\n")
+            self._log.flush()
+
+    def save(self) -> None:
+        self._log.close()
+        atomic_write(self.path, lambda f: f.writelines(json.dumps(self.records[key], separators=(",", ":")) + "\n"
+                                                       for key in sorted(self.records)))
+
+def probe_pix_fmt(path: Path) -> Optional[str]:
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=pix_fmt",
+           "-of", "json", str(path)]
+    try:
+        out = json.loads(subprocess.check_output(cmd, stderr=subprocess.DEVNULL, text=True))
+        return out["streams"][0]["pix_fmt"]
+    except Exception:
+        return None
+
+def verify_output(path: Path) -> Optional[str]:
+    """Return why path is not a valid web encode, or None if it passes."""
+    info = probe_mp4(path)
+    if info is None:
+        return "unreadable MP4 header"
+    if not info.faststart:
+        return "moov box after mdat (not faststart)"
+    if not info.cfr:
+        return "variable frame durations (not cfr)"
+    pix_fmt = probe_pix_fmt(path)
+    if pix_fmt != "yuv420p":
+        return f"pix_fmt {pix_fmt or 'unknown'}, expected yuv420p"
+    return None
+
+def transcode(src: Path, out: Path, args: list[str]) -> Optional[str]:
+    """Encode src to out via a temporary file; return an error message or None."""
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_name(f".{out.name}.part")
+    cmd = ["ffmpeg", "-y", "-v", "error", "-i", str(src), *args, "-f", "mp4", str(tmp)]
+    try:
+        proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if proc.returncode != 0:
+            return (proc.stderr.strip().splitlines() or [f"ffmpeg exited with {proc.returncode}"])[-1]
+        problem = verify_output(tmp)
+        if problem:
+            return problem
+        os.replace(tmp, out)
+        return None
+    finally:
+        tmp.unlink(missing_ok=True)
+
+def main():
+    ap = argparse.ArgumentParser(description="Re-encode clips for the web player in parallel, skipping unchanged ones")
+    ap.add_argument("--input-dir", type=Path, default=Path("frontend/videos/early_late_mi_training"))
+    ap.add_argument("--output-dir", type=Path, help="Default: <input-dir>/converted")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Concurrent ffmpeg processes")
+    ap.add_argument("--threads", type=int,
+                    help="x264 threads per ffmpeg process (default: cores / jobs, at least 1)")
+    ap.add_argument("--crf", type=int, default=20)
+    ap.add_argument("--preset", default="veryfast")
+    ap.add_argument("--manifest", type=Path, help="Default: <output-dir>/transcode_manifest.jsonl")
+    ap.add_argument("--force", action="store_true", help="Re-encode every clip, ignoring the manifest")
+    args = ap.parse_args()
+
+    if not args.input_dir.is_dir():
+        print(f"[ERROR] Input dir not found: {args.input_dir}", file=sys.stderr)
+        sys.exit(1)
+    out_dir = args.output_dir or args.input_dir / "converted"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    threads = args.threads or max(1, (os.cpu_count() or 1) // max(1, args.jobs))
+    ff_args = encode_args(args.crf, args.preset, threads)
+    version = ffmpeg_version()
+    if not version:
+        print("[ERROR] ffmpeg not found on PATH", file=sys.stderr)
+        sys.exit(1)
+    settings = settings_hash(ff_args, version)
+    manifest = Manifest(args.manifest or out_dir / "transcode_manifest.jsonl")
+
+    sources = sorted(p for p in args.input_dir.glob("*.mp4") if p.is_file())
+    encoded = skipped = failed = 0
+    t0 = time.perf_counter()
+
+    def work(src: Path):
+        out = out_dir / src.name
+        digest = manifest.source_hash(src.name, src)
+        if not args.force and manifest.is_current(src.name, digest, settings, out):
+            if manifest.records[src.name]["source_mtime_ns"] != src.stat().st_mtime_ns:
+                manifest.put(src.name, src, digest, settings, out)  # touched but unchanged: skip re-hashing next time
+            return src, None, True
+        err = transcode(src, out, ff_args)
+        if err is None:
+            manifest.put(src.name, src, digest, settings, out)
+        return src, err, False
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+            futures = [pool.submit(work, src) for src in sources]
+            for fut in as_completed(futures):
+                try:
+                    src, err, up_to_date = fut.result()
+                except OSError as e:
+                    print(f"[ERROR] {e}", file=sys.stderr)
+                    failed += 1
+                    continue
+                if up_to_date:
+                    skipped += 1
+                elif err:
+                    print(f"[ERROR] {src.name}: {err}", file=sys.stderr)
+                    failed += 1
+                else:
+                    encoded += 1
+                    print(f"[{encoded + skipped + failed}/{len(sources)}] {src.name}")
+    finally:
+        manifest.save()
+
+    print(f"Encoded {encoded}, up to date {skipped}, failed {failed} in {time.perf_counter() - t0:.1f}s -> {out_dir}")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 #!/bin/bash
+# Sequential reference version; transcode.py runs the same encode in parallel and skips unchanged clips.
 INPUT_DIR="frontend/videos/early_late_mi_training"
 OUTPUT_DIR="$INPUT_DIR/converted"
 